@@ -0,0 +1,65 @@
+"""
+meei 設定快取 microbenchmark
+
+比較每次請求讀取 API key 的成本：
+- 冷讀取：每次都讀檔 + 載入 .key + Fernet 解密（舊行為）
+- 快取：stat 檢查 mtime/size 後直接 dict 讀取
+
+用法:
+    python bench_config.py [次數]
+
+會在暫存目錄建立獨立的 ~/.meei，不會動到你的設定。
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# 使用暫存 HOME，必須在 import meei 之前設定
+os.environ["HOME"] = os.environ["USERPROFILE"] = tempfile.mkdtemp(prefix="meei-bench-")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python", "src"))
+
+from meei.crypto import init_encryption
+from meei.config import config
+
+
+def bench(label: str, n: int, fn):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed / n * 1e6:10.2f} µs/次")
+    return elapsed / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    init_encryption("bench-password")
+    for pv in ("deepseek", "openai", "gemini", "qwen", "groq"):
+        config.set(f"{pv}.api_key", f"sk-{pv}-xxxxxxxxxxxxxxxx")
+        config.set(f"{pv}.base_url", f"https://{pv}.example.com/v1")
+
+    # 每次請求約會查詢 api_key + base_url
+    def lookup():
+        config.get("deepseek.api_key")
+        config.get("deepseek.base_url")
+
+    def cold_lookup():
+        config.reload()
+        config.get("deepseek.api_key")
+        config.reload()
+        config.get("deepseek.base_url")
+
+    print(f"每次請求的設定查詢成本（{n} 次）")
+    print("-" * 40)
+    cold = bench("冷讀取", n, cold_lookup)
+    warm = bench("快取", n, lookup)
+    print("-" * 40)
+    print(f"加速: {cold / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+meei 離線壓測（本地假 provider 伺服器）
+
+用 meei.testing.FakeServer 模擬 provider，量測 meei 本身的部分：
+- 固定開銷：零延遲伺服器上，meei 每次呼叫比直接用 httpx 多花的時間
+- 並行：batch 在固定延遲下的總時間 vs 理論值
+- 重試：週期性 429 爆發下的成功率與實際送出的請求數
+- 串流：首 token 時間與總時間 vs 伺服器設定的延遲與 tokens/sec
+
+用法:
+    python bench_fake.py           # 預設每項 200 次
+    python bench_fake.py 1000
+
+不需要 API key，只連到本機的假伺服器；結果不會寫進 ~/.meei 的用量紀錄。
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python", "src"))
+
+import httpx
+
+from meei import tracker
+from meei.chat import Chat
+from meei.testing import FakeServer
+
+PV = "openai"
+CONCURRENCY = 16
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def bench_overhead(server: FakeServer, chat: Chat, n: int):
+    server.latency = 0.0
+    server.tokens_per_sec = None
+    url = server.base_url(PV) + "/chat/completions"
+    payload = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}]}
+
+    with httpx.Client() as client:
+        raw = []
+        for _ in range(n):
+            start = time.perf_counter()
+            client.post(url, json=payload, headers={"Authorization": "Bearer fake-key"}).json()
+            raw.append(time.perf_counter() - start)
+
+    timed = []
+    for _ in range(n):
+        start = time.perf_counter()
+        chat.ask("hi", pv=PV)
+        timed.append(time.perf_counter() - start)
+
+    raw_ms, meei_ms = percentile(raw, 50) * 1000, percentile(timed, 50) * 1000
+    print(f"固定開銷   httpx p50 {raw_ms:6.2f} ms   meei p50 {meei_ms:6.2f} ms   差 {meei_ms - raw_ms:+.2f} ms")
+
+
+def bench_concurrency(server: FakeServer, chat: Chat, n: int):
+    server.latency = 0.2
+    prompts = [f"問題 {i}" for i in range(n)]
+    start = time.perf_counter()
+    results = chat.batch(prompts, pv=PV, concurrency=CONCURRENCY)
+    elapsed = time.perf_counter() - start
+    ideal = -(-n // CONCURRENCY) * server.latency
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    print(f"並行       {n} 筆 / {CONCURRENCY} 並行   {elapsed:6.2f} s（理論 {ideal:.2f} s）   失敗 {failed}")
+
+
+def bench_retry(server: FakeServer, chat: Chat, n: int):
+    server.latency = 0.0
+    server.burst_every, server.burst_length, server.retry_after = 10, 3, 0.05
+    server.reset_stats()
+    ok = 0
+    start = time.perf_counter()
+    for i in range(n):
+        try:
+            chat.ask(f"重試 {i}", pv=PV)
+            ok += 1
+        except Exception:
+            pass
+    elapsed = time.perf_counter() - start
+    stats = server.stats()
+    server.burst_length = 0
+    print(
+        f"重試       成功 {ok}/{n}   上游請求 {stats['requests']}（429: {stats['rate_limited']}）"
+        f"   {elapsed:6.2f} s"
+    )
+
+
+def bench_stream(server: FakeServer, chat: Chat, n: int):
+    server.latency, server.tokens_per_sec, server.output_tokens = 0.1, 200, 40
+    ttfts, totals = [], []
+    for _ in range(n):
+        start = time.perf_counter()
+        first = None
+        for _chunk in chat.ask("串流", pv=PV, stream=True):
+            if first is None:
+                first = time.perf_counter() - start
+        ttfts.append(first)
+        totals.append(time.perf_counter() - start)
+    ideal_total = server.latency + (server.output_tokens - 1) / server.tokens_per_sec
+    print(
+        f"串流       首 token p50 {percentile(ttfts, 50) * 1000:6.1f} ms（設定 {server.latency * 1000:.0f} ms）"
+        f"   總時間 p50 {percentile(totals, 50) * 1000:6.1f} ms（理論 {ideal_total * 1000:.0f} ms）"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    # 壓測的假請求不寫進真正的用量紀錄
+    tracker.DB_FILE = Path(tempfile.mkdtemp()) / "bench.db"
+
+    with FakeServer() as server:
+        server.install([PV])
+        with Chat() as chat:
+            print(f"假伺服器: {server.url}")
+            print("-" * 70)
+            bench_overhead(server, chat, n)
+            bench_concurrency(server, chat, min(n, 128))
+            bench_retry(server, chat, min(n, 50))
+            bench_stream(server, chat, min(n, 20))
+
+
+if __name__ == "__main__":
+    main()
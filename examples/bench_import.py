@@ -0,0 +1,88 @@
+"""
+meei 冷啟動 import 時間 benchmark（python -X importtime）
+
+用法:
+    python bench_import.py                 # 顯示各情境的 import 時間
+    python bench_import.py --max-ms 50     # 超過門檻時 exit 1（給 CI 用）
+
+`import meei` 不應載入 httpx / cryptography，否則也視為退化。
+"""
+
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "python", "src"))
+
+# (情境, 程式碼, 不應被載入的模組)
+CASES = [
+    ("import meei", "import meei; meei.__version__", ["httpx", "cryptography", "meei.chat"]),
+    ("import meei.chat", "import meei.chat", ["meei.chat.openai", "meei.chat.gemini"]),
+    ("單一 provider", "from meei.chat.deepseek import DeepSeekChat", ["meei.chat.openai"]),
+]
+
+# 取多次最小值，降低雜訊
+RUNS = 5
+
+
+def measure(code: str):
+    """回傳 (總 import 時間 ms, 已載入模組集合)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": SRC},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # 格式: "import time:   self |  cumulative | 模組名（以縮排表示層級）"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # 只加總最上層的模組，避免重複計算
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative_us)
+    return total_us / 1000, modules
+
+
+def main():
+    max_ms = None
+    if "--max-ms" in sys.argv:
+        max_ms = float(sys.argv[sys.argv.index("--max-ms") + 1])
+
+    # 直譯器啟動本身的 import（site、encodings...）不算在內
+    baseline = min(measure("pass")[0] for _ in range(RUNS))
+
+    failed = False
+    print(f"{'情境':<20} {'import 時間':>12}")
+    print("-" * 40)
+    for label, code, forbidden in CASES:
+        try:
+            samples = [measure(code) for _ in range(RUNS)]
+        except RuntimeError as e:
+            print(f"{label:<20} {'跳過':>12}  ({e})")
+            continue
+
+        ms = min(s[0] for s in samples) - baseline
+        modules = samples[0][1]
+        leaked = [m for m in forbidden if m in modules]
+
+        status = ""
+        if leaked:
+            status = f"  ❌ 載入了 {', '.join(leaked)}"
+            failed = True
+        elif max_ms is not None and label == "import meei" and ms > max_ms:
+            status = f"  ❌ 超過 {max_ms} ms"
+            failed = True
+        print(f"{label:<20} {ms:>9.2f} ms{status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
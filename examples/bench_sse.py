@@ -0,0 +1,129 @@
+"""
+meei SSE 解析 benchmark
+
+重播一段 10k chunk 的串流，比較每個 chunk 的解析成本：
+- 舊版：iter_lines 解碼成 str、每行 json.loads、字串累加
+- 新版：SSEDecoder 直接處理 bytes（標準 json / orjson）
+
+用法:
+    python bench_sse.py                 # 使用內建的模擬錄製串流
+    python bench_sse.py stream.txt      # 重播自己錄下的原始 SSE 回應
+
+不需要 API key，不會發出任何網路請求。
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python", "src"))
+
+from meei.chat.sse import DONE, SSEDecoder
+
+CHUNKS = 10000
+# 模擬網路讀取的切割大小（httpx iter_bytes 大約也是這個量級）
+READ_SIZE = 4096
+ROUNDS = 5
+
+
+def record_stream(n: int) -> bytes:
+    """產生 OpenAI 格式的串流回應（最後附 usage chunk）"""
+    lines = []
+    for i in range(n):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    usage = {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": n}}
+    lines.append(f"data: {json.dumps(usage)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+def split(raw: bytes):
+    return [raw[i : i + READ_SIZE] for i in range(0, len(raw), READ_SIZE)]
+
+
+def legacy(pieces) -> int:
+    """舊版 _stream_response 的迴圈"""
+    text = b"".join(pieces).decode()
+    total_content = ""
+    count = 0
+    for line in text.splitlines():
+        if line.startswith("data: "):
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            try:
+                import json
+
+                chunk = json.loads(data)
+                delta = chunk.get("choices", [{}])[0].get("delta", {})
+                content = delta.get("content", "")
+                if content:
+                    total_content += content
+                    count += 1
+            except Exception:
+                continue
+    return count
+
+
+def decoder(loads):
+    def run(pieces) -> int:
+        dec = SSEDecoder()
+        count = 0
+        for piece in pieces:
+            for data in dec.feed(piece):
+                if data == DONE:
+                    return count
+                try:
+                    chunk = loads(data)
+                except ValueError:
+                    continue
+                choices = chunk.get("choices")
+                if choices:
+                    delta = choices[0].get("delta")
+                    if delta and delta.get("content"):
+                        count += 1
+        return count
+
+    return run
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            raw = f.read()
+    else:
+        raw = record_stream(CHUNKS)
+    pieces = split(raw)
+
+    cases = [("舊版 (iter_lines)", legacy), ("SSEDecoder + json", decoder(json.loads))]
+    try:
+        import orjson
+
+        cases.append(("SSEDecoder + orjson", decoder(orjson.loads)))
+    except ImportError:
+        print("（未安裝 orjson，略過 orjson 測試）")
+
+    print(f"串流大小: {len(raw) / 1024:.0f} KB, 讀取切割: {len(pieces)} 段")
+    print("-" * 50)
+    baseline = None
+    for label, fn in cases:
+        best = float("inf")
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            count = fn(pieces)
+            best = min(best, time.perf_counter() - start)
+        per_chunk = best / count * 1e6
+        baseline = baseline or per_chunk
+        print(f"{label:<22} {per_chunk:6.2f} µs/chunk  ({baseline / per_chunk:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
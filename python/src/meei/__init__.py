@@ -5,37 +5,39 @@ Unified interface for multiple AI providers
 
 __version__ = "0.1.0"
 
-# 自動載入 .env 文件
-import os
-from pathlib import Path
-
-def _load_env():
-    """載入 .env 文件（優先級：系統環境變數 > 專案 .env > ~/.meei/.env）"""
-    current = Path(__file__).resolve()
-
-    # 搜索順序：專案目錄優先，全局 ~/.meei/ 最後
-    env_locations = [
-        current.parent.parent.parent.parent.parent / ".env",  # meei/
-        current.parent.parent.parent.parent / ".env",          # meei/python/
-        Path.cwd() / ".env",                                   # 當前目錄
-        Path.home() / ".meei" / ".env",                        # 全局設定
-    ]
-
-    for env_file in env_locations:
-        if env_file.exists():
-            with open(env_file) as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith("#") and "=" in line:
-                        key, value = line.split("=", 1)
-                        # 不覆蓋已存在的環境變數
-                        if key and value and key not in os.environ:
-                            os.environ[key] = value
-
-_load_env()
-
-from meei.chat import chat
-from meei.image import image
-from meei.config import config
+# 子模組延遲載入（PEP 562），`import meei` 不會載入 httpx / cryptography
+# .env 也延後到第一次查詢 API key 時才載入，見 meei.env
+import sys
+from importlib import import_module
+from types import ModuleType
+
+_LAZY_ATTRS = {
+    "chat": "meei.chat",
+    "image": "meei.image",
+    "config": "meei.config",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        module = import_module(_LAZY_ATTRS[name])
+        return getattr(module, name)
+    raise AttributeError(f"module 'meei' has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRS))
+
+
+class _MeeiModule(ModuleType):
+    def __setattr__(self, name, value):
+        # 載入子模組時 import 系統會把 meei.chat 設為模組本身，
+        # 這裡換成同名實例，維持 meei.chat / meei.config 是實例的行為
+        if name in _LAZY_ATTRS and isinstance(value, ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _MeeiModule
 
 __all__ = ["chat", "image", "config", "__version__"]
@@ -0,0 +1,168 @@
+"""
+憑證代理模組 - 類似 ssh-agent
+
+`meei unlock` 啟動一個背景 agent：只衍生一次金鑰，把 Fernet 與解密後的
+provider 設定留在記憶體中（有 TTL），透過本機 Unix socket 提供給其他
+SDK process。短命的 worker 因此不必重跑 PBKDF2，也不必讀取磁碟上的金鑰。
+
+通訊協定：每個連線送一行 JSON 請求，回一行 JSON 回應
+    {"op": "ping"}    -> {"ok": true, "expires_at": ...}
+    {"op": "config"}  -> {"ok": true, "data": {...}}
+    {"op": "lock"}    -> {"ok": true}，agent 隨即結束
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from meei.crypto import MEEI_DIR, get_fernet
+
+AGENT_SOCKET = Path(os.environ.get("MEEI_AGENT_SOCK", str(MEEI_DIR / "agent.sock")))
+
+# 預設金鑰保留時間（秒）
+DEFAULT_TTL = 15 * 60
+
+# 客戶端連線逾時（秒）
+CLIENT_TIMEOUT = 2.0
+
+
+def is_supported() -> bool:
+    """目前平台是否支援 Unix socket"""
+    return hasattr(socket, "AF_UNIX")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """處理單一請求"""
+
+    def handle(self):
+        agent: "Agent" = self.server.agent
+        try:
+            request = json.loads(self.rfile.readline())
+            response = agent.handle(request.get("op"))
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Agent:
+    """憑證代理"""
+
+    def __init__(self, password: str = None, ttl: int = DEFAULT_TTL):
+        # 在這裡衍生一次金鑰，之後全部從記憶體提供
+        self._fernet = get_fernet(password)
+        self._ttl = ttl
+        self._expires_at = time.time() + ttl if ttl else None
+        self._data: Dict[str, Any] = {"providers": {}}
+        self._stamp: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+
+    def _config_data(self) -> Dict[str, Any]:
+        """解密後的設定（設定檔變動時重新解密）"""
+        from meei.config import CONFIG_FILE
+
+        try:
+            st = CONFIG_FILE.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return {"providers": {}}
+
+        with self._lock:
+            if stamp != self._stamp:
+                decrypted = self._fernet.decrypt(CONFIG_FILE.read_bytes()).decode()
+                self._data = json.loads(decrypted)
+                self._stamp = stamp
+            return self._data
+
+    def handle(self, op: str) -> Dict[str, Any]:
+        """處理一個操作"""
+        if op == "ping":
+            return {"ok": True, "expires_at": self._expires_at}
+        if op == "config":
+            return {"ok": True, "data": self._config_data()}
+        if op == "lock":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True}
+        return {"ok": False, "error": f"未知的操作: {op}"}
+
+    def serve_forever(self):
+        """啟動服務，直到 TTL 到期或收到 lock"""
+        if not is_supported():
+            raise RuntimeError("此平台不支援 Unix socket，無法啟動 meei agent")
+
+        if AGENT_SOCKET.exists():
+            if ping():
+                raise RuntimeError(f"meei agent 已在執行中: {AGENT_SOCKET}")
+            AGENT_SOCKET.unlink()
+
+        # 先收緊 umask，避免 socket 建立瞬間被其他使用者連上
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(str(AGENT_SOCKET), _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.agent = self
+
+        if self._expires_at:
+            timer = threading.Timer(self._ttl, self.shutdown)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._fernet = None
+            self._data = {}
+            try:
+                AGENT_SOCKET.unlink()
+            except FileNotFoundError:
+                pass
+
+    def shutdown(self):
+        """停止服務並清除記憶體中的金鑰"""
+        if self._server:
+            self._server.shutdown()
+
+
+def _request(op: str) -> Optional[Dict[str, Any]]:
+    """送出請求，agent 不存在或失敗時回傳 None"""
+    if not is_supported() or not AGENT_SOCKET.exists():
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(str(AGENT_SOCKET))
+            sock.sendall(json.dumps({"op": op}).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+    return response if response.get("ok") else None
+
+
+def ping() -> bool:
+    """agent 是否在執行中"""
+    return _request("ping") is not None
+
+
+def fetch_config() -> Optional[Dict[str, Any]]:
+    """從 agent 取得解密後的設定，agent 不存在時回傳 None"""
+    response = _request("config")
+    return response["data"] if response else None
+
+
+def lock() -> bool:
+    """要求 agent 清除金鑰並結束"""
+    return _request("lock") is not None
@@ -0,0 +1,270 @@
+"""
+回應快取模組 - 記憶體 LRU + SQLite 持久層
+
+給相同 prompt 重複呼叫的確定性請求（例如 temperature=0）使用，預設關閉：
+    from meei.cache import response_cache
+    response_cache.enable(ttl=86400)
+
+或單次請求開啟：
+    chat.ask("...", cache=True)
+
+快取 key 是 (provider, 解析後的 model, messages, temperature, max_tokens)
+的正規化 JSON 雜湊。
+
+非同步請求只在 event loop 中查記憶體層，SQLite 層在 thread 中讀寫（get_async / set_async）。
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, NamedTuple
+
+from meei.crypto import MEEI_DIR
+
+CACHE_DB_FILE = MEEI_DIR / "cache.db"
+
+# 預設值
+DEFAULT_TTL = 7 * 24 * 3600  # 秒
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_DISK_ENTRIES = 100000
+
+
+class CachedResponse(NamedTuple):
+    """快取的回應"""
+
+    content: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+
+
+def make_key(
+    provider: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+) -> str:
+    """計算請求的正規化雜湊"""
+    canonical = json.dumps(
+        [provider, model, messages, temperature, max_tokens],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """兩層回應快取"""
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        disk_entries: int = DEFAULT_DISK_ENTRIES,
+        persist: bool = True,
+    ):
+        self.enabled = False
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.persist = persist
+
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (expires_at, CachedResponse)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # SQLite 層另外加鎖，event loop 查記憶體層時不必等磁碟 I/O
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def enable(
+        self,
+        ttl: float = None,
+        memory_entries: int = None,
+        disk_entries: int = None,
+        persist: bool = None,
+    ):
+        """開啟快取（可同時調整設定）"""
+        if ttl is not None:
+            self.ttl = ttl
+        if memory_entries is not None:
+            self.memory_entries = memory_entries
+        if disk_entries is not None:
+            self.disk_entries = disk_entries
+        if persist is not None:
+            self.persist = persist
+        self.enabled = True
+
+    def disable(self):
+        """關閉快取"""
+        self.enabled = False
+
+    def _db(self) -> sqlite3.Connection:
+        """取得 SQLite 連線（呼叫端需持有 self._db_lock）"""
+        if self._conn is None:
+            MEEI_DIR.mkdir(exist_ok=True)
+            conn = sqlite3.connect(CACHE_DB_FILE, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    model TEXT,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expires_at ON responses(expires_at)
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _get_memory(self, key: str, now: float) -> Optional[CachedResponse]:
+        """查記憶體層（命中時計數，未命中不計）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._memory[key]
+        return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[CachedResponse]:
+        """查 SQLite 層（命中時放回記憶體層），並計數"""
+        row = None
+        if self.persist:
+            with self._db_lock:
+                try:
+                    row = self._db().execute(
+                        """
+                        SELECT content, model, input_tokens, output_tokens, expires_at
+                        FROM responses WHERE key = ? AND expires_at > ?
+                        """,
+                        (key, now),
+                    ).fetchone()
+                except sqlite3.Error:
+                    pass
+
+        with self._lock:
+            if row:
+                response = CachedResponse(*row[:4])
+                self._remember(key, row[4], response)
+                self.hits += 1
+                return response
+
+            self.misses += 1
+            return None
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """查詢快取，未命中或已過期時回傳 None"""
+        now = time.time()
+        hit = self._get_memory(key, now)
+        if hit is not None:
+            return hit
+        return self._get_disk(key, now)
+
+    async def get_async(self, key: str) -> Optional[CachedResponse]:
+        """get() 的非同步版本：記憶體層直接查，SQLite 層在 thread 中查"""
+        now = time.time()
+        hit = self._get_memory(key, now)
+        if hit is not None:
+            return hit
+        if not self.persist:
+            return self._get_disk(key, now)
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def _set_disk(self, key: str, response: CachedResponse, expires_at: float):
+        """寫入 SQLite 層"""
+        with self._db_lock:
+            try:
+                with self._db() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, *response, expires_at),
+                    )
+                self._writes += 1
+                # 不必每次都檢查容量
+                if self._writes % 100 == 0:
+                    self._evict_disk()
+            except sqlite3.Error:
+                pass
+
+    def set(self, key: str, response: CachedResponse):
+        """寫入快取"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, response)
+        if self.persist:
+            self._set_disk(key, response, expires_at)
+
+    async def set_async(self, key: str, response: CachedResponse):
+        """set() 的非同步版本：記憶體層直接寫，SQLite 層在 thread 中寫"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, response)
+        if self.persist:
+            await asyncio.to_thread(self._set_disk, key, response, expires_at)
+
+    def _remember(self, key: str, expires_at: float, response: CachedResponse):
+        """放入記憶體 LRU（呼叫端需持有 self._lock）"""
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """刪除過期資料，並把磁碟快取限制在 disk_entries 筆內（呼叫端需持有 self._db_lock）"""
+        conn = self._db()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            excess = count - self.disk_entries
+            if excess > 0:
+                # 最早到期的優先淘汰
+                conn.execute(
+                    """
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY expires_at LIMIT ?
+                    )
+                    """,
+                    (excess,),
+                )
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.persist:
+            with self._db_lock, self._db() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中統計"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+# 全域快取實例（預設關閉）
+response_cache = ResponseCache()
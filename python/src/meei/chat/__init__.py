@@ -2,133 +2,603 @@
 Chat 模組 - 統一聊天介面
 """
 
-from typing import Optional, List, Dict, Any, Union
+import asyncio
+import threading
+from importlib import import_module
+from itertools import chain
+from typing import (
+    Optional, List, Dict, Any, AsyncGenerator, Awaitable, Callable, Generator, Iterable,
+    Iterator, Sequence, Tuple, Union,
+)
 from meei.chat.base import ChatProvider
-from meei.chat.deepseek import DeepSeekChat
-from meei.chat.openai import OpenAIChat
-from meei.chat.gemini import GeminiChat
-from meei.chat.qwen import QwenChat
-from meei.chat.groq import GroqChat
-from meei.config import config
-
-# Provider 映射
-PROVIDERS: Dict[str, type] = {
-    "deepseek": DeepSeekChat,
-    "openai": OpenAIChat,
-    "chatgpt": OpenAIChat,  # alias
-    "gemini": GeminiChat,
-    "qwen": QwenChat,
-    "groq": GroqChat,
+from meei.health import provider_health
+from meei.pool import http_pools
+from meei.ratelimit import estimate_tokens
+from meei.retry import RetryPolicy
+from meei.routing import AUTO, DEFAULT_OUTPUT_TOKENS, latency_estimator, router
+
+# Provider 映射（"模組:類別"，用到時才載入該 provider 模組）
+PROVIDERS: Dict[str, str] = {
+    "deepseek": "meei.chat.deepseek:DeepSeekChat",
+    "openai": "meei.chat.openai:OpenAIChat",
+    "chatgpt": "meei.chat.openai:OpenAIChat",  # alias
+    "gemini": "meei.chat.gemini:GeminiChat",
+    "qwen": "meei.chat.qwen:QwenChat",
+    "groq": "meei.chat.groq:GroqChat",
 }
 
 # 預設 provider
 DEFAULT_PROVIDER = "deepseek"
 
+# pv 可以是單一 provider、fallback 鏈或 "auto"；model 可以逐一對應 provider
+Providers = Union[str, Sequence[str], None]
+Models = Union[str, Dict[str, str], None]
+
+# hedged request 的備援：provider 或 (provider, model)
+Hedge = Union[str, Tuple[str, str], None]
+
+# 主要請求超過這個延遲百分位仍未完成就送出備援；沒有延遲資料時等待的秒數
+HEDGE_PERCENTILE = 90
+DEFAULT_HEDGE_AFTER = 2.0
+
+# fallback 鏈中後面還有 provider 時：不重試、較短的逾時（秒），第一次可 failover 的
+# 錯誤就換下一個；最後一個 provider 才用完整的重試策略與連線池逾時
+FAILOVER_RETRY = RetryPolicy(max_attempts=1)
+FAILOVER_TIMEOUT = 30.0
+
+
+def get_provider_class(pv: str) -> type:
+    """載入並取得 provider 類別"""
+    if pv not in PROVIDERS:
+        available = ", ".join(PROVIDERS.keys())
+        raise ValueError(f"不支援的 provider: {pv}，可用: {available}")
+
+    module_name, class_name = PROVIDERS[pv].split(":")
+    return getattr(import_module(module_name), class_name)
+
+
+def __getattr__(name: str):
+    # 向下相容 `from meei.chat import DeepSeekChat`
+    for path in PROVIDERS.values():
+        module_name, class_name = path.split(":")
+        if class_name == name:
+            return getattr(import_module(module_name), class_name)
+    raise AttributeError(f"module 'meei.chat' has no attribute {name!r}")
+
 
 class Chat:
     """Chat 統一介面"""
 
     def __init__(self):
         self._instances: Dict[str, ChatProvider] = {}
+        self._lock = threading.Lock()
 
     def _get_provider(self, pv: str) -> ChatProvider:
-        """取得或建立 provider 實例"""
-        if pv not in self._instances:
-            if pv not in PROVIDERS:
-                available = ", ".join(PROVIDERS.keys())
-                raise ValueError(f"不支援的 provider: {pv}，可用: {available}")
+        """取得或建立 provider 實例（多執行緒同時首次使用時也只建立一次）"""
+        provider = self._instances.get(pv)
+        if provider is None:
+            with self._lock:
+                provider = self._instances.get(pv)
+                if provider is None:
+                    provider_class = get_provider_class(pv)
+                    provider = self._instances[pv] = provider_class()
+
+        return provider
+
+    def close(self):
+        """
+        關閉這個 Chat 的 provider 自行建立的 client，之後仍可繼續使用
+
+        process 共用的連線池不受影響（其他 Chat 實例與快捷函數還在使用），
+        要整個關閉時明確呼叫 meei.pool.http_pools.reset()。
+        """
+        with self._lock:
+            providers = list(self._instances.values())
+            self._instances.clear()
+        for provider in providers:
+            provider.close()
+
+    async def aclose(self):
+        """close() 的非同步版本"""
+        with self._lock:
+            providers = list(self._instances.values())
+            self._instances.clear()
+        for provider in providers:
+            await provider.aclose()
+
+    def __enter__(self) -> "Chat":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self) -> "Chat":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def warmup(self, providers: Iterable[str] = None, connections: int = 1):
+        """
+        預先建立連線，讓第一個請求不必等 TCP + TLS 握手
+
+        Args:
+            providers: provider 名稱，None 表示預設 provider
+            connections: 每個 host 預先建立的連線數
+        """
+        urls = [self._get_provider(pv).base_url for pv in (providers or [DEFAULT_PROVIDER])]
+        http_pools.warmup(urls, connections)
+
+    async def warmup_async(self, providers: Iterable[str] = None, connections: int = 1):
+        """warmup() 的非同步版本（預熱目前 event loop 的連線）"""
+        urls = [self._get_provider(pv).base_url for pv in (providers or [DEFAULT_PROVIDER])]
+        await http_pools.warmup_async(urls, connections)
+
+    def _hops(
+        self,
+        pv: Providers,
+        model: Models,
+        messages: List[Dict[str, str]] = None,
+        max_tokens: int = None,
+    ) -> List[Tuple[str, Optional[str]]]:
+        """把 pv/model 參數展開成 [(provider, model), ...]"""
+        if pv == AUTO:
+            return self._route(model, messages or [], max_tokens)
 
-            provider_class = PROVIDERS[pv]
-            self._instances[pv] = provider_class()
+        if pv is None or isinstance(pv, str):
+            pvs = [pv or DEFAULT_PROVIDER]
+        else:
+            pvs = list(pv)
+            if not pvs:
+                raise ValueError("pv 不能是空列表")
 
-        return self._instances[pv]
+        if isinstance(model, dict):
+            return [(p, model.get(p)) for p in pvs]
+        return [(p, model) for p in pvs]
+
+    def _route(
+        self, model: Models, messages: List[Dict[str, str]], max_tokens: Optional[int]
+    ) -> List[Tuple[str, Optional[str]]]:
+        """pv="auto"：router 的候選依估計延遲排序（model 只接受逐一對應的 dict）"""
+        hops = []
+        for pv, hop_model in router.hops():
+            if isinstance(model, dict):
+                hop_model = model.get(pv, hop_model)
+            provider = self._get_provider(pv)
+            hops.append((pv, provider._resolve_model(hop_model or provider.DEFAULT_MODEL)))
+
+        input_tokens = estimate_tokens(messages)
+        output_tokens = max_tokens or DEFAULT_OUTPUT_TOKENS
+
+        def cost(pv: str, hop_model: str) -> float:
+            return self._get_provider(pv)._calculate_cost(input_tokens, output_tokens, hop_model)
+
+        return router.rank(hops, cost)
+
+    def _failover(self, hops: List[Tuple[str, Optional[str]]], call: Callable) -> Any:
+        """
+        依序嘗試 provider，逾時、429 或 5xx 時改用下一個
+
+        冷卻中的 provider 排到最後（仍是最後手段，不會直接放棄）。後面還有
+        provider 時不重試並使用 FAILOVER_TIMEOUT，只有最後一個用完整的重試策略。
+        """
+        if len(hops) == 1:
+            pv, model = hops[0]
+            return call(self._get_provider(pv), model)
+
+        last_error = None
+        ordered = sorted(hops, key=lambda hop: provider_health.bad_until(hop[0]))
+        for index, (pv, model) in enumerate(ordered):
+            try:
+                result = call(self._get_provider(pv), model, index == len(ordered) - 1)
+            except Exception as e:
+                if not provider_health.should_failover(e):
+                    raise
+                provider_health.mark_bad(pv, e)
+                last_error = e
+                continue
+            provider_health.mark_good(pv)
+            return result
+
+        raise last_error
+
+    async def _failover_async(
+        self, hops: List[Tuple[str, Optional[str]]], call: Callable[..., Awaitable]
+    ) -> Any:
+        """_failover() 的非同步版本"""
+        if len(hops) == 1:
+            pv, model = hops[0]
+            return await call(self._get_provider(pv), model)
+
+        last_error = None
+        ordered = sorted(hops, key=lambda hop: provider_health.bad_until(hop[0]))
+        for index, (pv, model) in enumerate(ordered):
+            try:
+                result = await call(self._get_provider(pv), model, index == len(ordered) - 1)
+            except Exception as e:
+                if not provider_health.should_failover(e):
+                    raise
+                provider_health.mark_bad(pv, e)
+                last_error = e
+                continue
+            provider_health.mark_good(pv)
+            return result
+
+        raise last_error
 
     def ask(
         self,
         prompt: str,
-        pv: str = None,
-        model: str = None,
+        pv: Providers = None,
+        model: Models = None,
         system: str = None,
         temperature: float = None,
         max_tokens: int = None,
         stream: bool = False,
+        cache: bool = None,
     ) -> Union[str, Any]:
         """
         發送聊天請求
 
         Args:
             prompt: 用戶訊息
-            pv: provider 名稱 (deepseek/openai/gemini/qwen/groq)
-            model: 模型名稱（不指定則用 provider 預設）
+            pv: provider 名稱 (deepseek/openai/gemini/qwen/groq)，
+                fallback 鏈 ["groq", "deepseek", "openai"]，
+                或 "auto"（依延遲在 meei.routing.router.candidates 中挑選）
+            model: 模型名稱（不指定則用 provider 預設），
+                fallback 鏈可用 {"groq": "llama-70b", "openai": "4o-mini"} 逐一指定
             system: 系統提示詞
             temperature: 溫度 (0-2)
             max_tokens: 最大輸出 token 數
-            stream: 是否串流回應
+            stream: 是否串流回應（fallback 只發生在第一個 chunk 之前）
+            cache: 是否使用回應快取（None 表示依 response_cache.enabled）
 
         Returns:
             回應文字，或串流時返回 generator
         """
-        pv = pv or DEFAULT_PROVIDER
-        provider = self._get_provider(pv)
-
-        return provider.chat(
-            prompt=prompt,
+        return self.conversation(
+            messages=ChatProvider._build_messages(prompt, system),
+            pv=pv,
             model=model,
-            system=system,
             temperature=temperature,
             max_tokens=max_tokens,
             stream=stream,
+            cache=cache,
         )
 
     async def ask_async(
         self,
         prompt: str,
-        pv: str = None,
-        model: str = None,
+        pv: Providers = None,
+        model: Models = None,
         system: str = None,
         temperature: float = None,
         max_tokens: int = None,
-    ) -> str:
-        """非同步聊天請求"""
-        pv = pv or DEFAULT_PROVIDER
-        provider = self._get_provider(pv)
+        stream: bool = False,
+        cache: bool = None,
+        hedge: Hedge = None,
+        hedge_after: float = None,
+    ) -> Union[str, AsyncGenerator[str, None]]:
+        """
+        非同步聊天請求
 
-        return await provider.chat_async(
-            prompt=prompt,
+        串流時返回 async generator:
+            async for chunk in await chat.ask_async("...", stream=True):
+                print(chunk, end="")
+
+        Hedged request（壓低尾端延遲）:
+            await chat.ask_async("...", pv="deepseek", hedge="groq")
+
+        hedge: 備援的 provider 或 (provider, model)；主要請求超過 hedge_after 秒
+            （預設為觀察到的 p90，串流以首 token 時間計）仍未完成時，
+            對備援再送一次，取先完成的結果並取消另一個
+        """
+        return await self.conversation_async(
+            messages=ChatProvider._build_messages(prompt, system),
+            pv=pv,
             model=model,
-            system=system,
             temperature=temperature,
             max_tokens=max_tokens,
+            stream=stream,
+            cache=cache,
+            hedge=hedge,
+            hedge_after=hedge_after,
         )
 
     def conversation(
         self,
         messages: List[Dict[str, str]],
-        pv: str = None,
-        model: str = None,
+        pv: Providers = None,
+        model: Models = None,
         system: str = None,
         temperature: float = None,
         max_tokens: int = None,
-    ) -> str:
+        stream: bool = False,
+        cache: bool = None,
+    ) -> Union[str, Any]:
         """
         多輪對話
 
         Args:
             messages: 對話歷史 [{"role": "user", "content": "..."}, ...]
-            pv: provider 名稱
+            pv: provider 名稱或 fallback 鏈
             ...
         """
-        pv = pv or DEFAULT_PROVIDER
-        provider = self._get_provider(pv)
+        hops = self._hops(pv, model, messages, max_tokens)
 
-        return provider.conversation(
-            messages=messages,
-            model=model,
-            system=system,
-            temperature=temperature,
-            max_tokens=max_tokens,
+        def call(provider: ChatProvider, hop_model: Optional[str], last: bool = True):
+            result = provider.conversation(
+                messages=messages,
+                model=hop_model,
+                system=system,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=stream,
+                cache=cache,
+                retry=None if last else FAILOVER_RETRY,
+                timeout=None if last else FAILOVER_TIMEOUT,
+            )
+            # 串流要等到第一個 chunk 才知道請求是否成功
+            return _prime(result) if stream and len(hops) > 1 else result
+
+        if stream and len(hops) > 1:
+            # 與單一 provider 的串流一樣，迭代時才送出請求
+            return _lazy(lambda: self._failover(hops, call))
+        return self._failover(hops, call)
+
+    async def conversation_async(
+        self,
+        messages: List[Dict[str, str]],
+        pv: Providers = None,
+        model: Models = None,
+        system: str = None,
+        temperature: float = None,
+        max_tokens: int = None,
+        stream: bool = False,
+        cache: bool = None,
+        hedge: Hedge = None,
+        hedge_after: float = None,
+    ) -> Union[str, AsyncGenerator[str, None]]:
+        """非同步多輪對話（hedge 參數見 ask_async）"""
+        if pv == AUTO or (hedge is not None and hedge_after is None):
+            # 第一次使用延遲統計時要讀用量資料庫，不在 event loop 中進行
+            await latency_estimator.seed_async()
+        hops = self._hops(pv, model, messages, max_tokens)
+        # 串流要等到第一個 chunk 才知道請求是否成功
+        primed = stream and (len(hops) > 1 or hedge is not None)
+
+        async def call(provider: ChatProvider, hop_model: Optional[str], last: bool = True):
+            result = await provider.conversation_async(
+                messages=messages,
+                model=hop_model,
+                system=system,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=stream,
+                cache=cache,
+                retry=None if last else FAILOVER_RETRY,
+                timeout=None if last else FAILOVER_TIMEOUT,
+            )
+            return await _prime_async(result) if primed else result
+
+        if hedge is None:
+            return await self._failover_async(hops, call)
+
+        hedge_pv, hedge_model = (hedge, None) if isinstance(hedge, str) else hedge
+        if hedge_after is None:
+            hedge_after = self._hedge_delay(hops[0], ttft=stream)
+
+        return await _hedged(
+            lambda: self._failover_async(hops, call),
+            lambda: call(self._get_provider(hedge_pv), hedge_model),
+            hedge_after,
         )
 
+    def _hedge_delay(self, hop: Tuple[str, Optional[str]], ttft: bool) -> float:
+        """主要 provider 觀察到的延遲百分位（秒），沒有資料時用預設值"""
+        pv, model = hop
+        provider = self._get_provider(pv)
+        model = provider._resolve_model(model or provider.DEFAULT_MODEL)
+        latency_ms = latency_estimator.percentile(pv, model, HEDGE_PERCENTILE, ttft=ttft)
+        return latency_ms / 1000 if latency_ms is not None else DEFAULT_HEDGE_AFTER
+
+    async def batch_async(
+        self,
+        prompts: Iterable[Union[str, List[Dict[str, str]]]],
+        pv: Providers = None,
+        model: Models = None,
+        system: str = None,
+        temperature: float = None,
+        max_tokens: int = None,
+        concurrency: int = 8,
+        on_progress: Callable[[int, Optional[int]], None] = None,
+        cache: bool = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        並行批次請求
+
+        Args:
+            prompts: prompt 字串或 messages 列表，可以是 iterator（逐筆讀取）
+            concurrency: 同時進行的請求數
+            on_progress: 每完成一筆呼叫 on_progress(已完成數, 總數)，總數未知時為 None
+
+        Returns:
+            與輸入同順序的結果；失敗的項目是該筆的 exception，不會中斷整批
+        """
+        total = len(prompts) if hasattr(prompts, "__len__") else None
+        items = enumerate(prompts)
+        results: Dict[int, Union[str, Exception]] = {}
+        completed = 0
+
+        async def worker():
+            nonlocal completed
+            # 所有 worker 共用同一個 iterator，最多 concurrency 筆同時進行
+            for index, item in items:
+                try:
+                    if isinstance(item, str):
+                        item = ChatProvider._build_messages(item, None)
+                    results[index] = await self.conversation_async(
+                        messages=item,
+                        pv=pv,
+                        model=model,
+                        system=system,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        cache=cache,
+                    )
+                except Exception as e:
+                    results[index] = e
+
+                completed += 1
+                if on_progress:
+                    on_progress(completed, total)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        return [results[i] for i in range(len(results))]
+
+    def batch(
+        self,
+        prompts: Iterable[Union[str, List[Dict[str, str]]]],
+        pv: Providers = None,
+        model: Models = None,
+        system: str = None,
+        temperature: float = None,
+        max_tokens: int = None,
+        concurrency: int = 8,
+        on_progress: Callable[[int, Optional[int]], None] = None,
+        cache: bool = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        並行批次請求（同步版，參數同 batch_async）
+
+        用法:
+            results = chat.batch(["翻譯: hello", "翻譯: world"], pv="deepseek", concurrency=16)
+            for r in results:
+                if isinstance(r, Exception):
+                    ...
+        """
+
+        async def run():
+            try:
+                return await self.batch_async(
+                    prompts,
+                    pv=pv,
+                    model=model,
+                    system=system,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    concurrency=concurrency,
+                    on_progress=on_progress,
+                    cache=cache,
+                )
+            finally:
+                # async client 綁定在這個 event loop 上，結束前關閉
+                await http_pools.aclose_loop()
+
+        return asyncio.run(run())
+
 
 # 全域實例
 chat = Chat()
+
+
+def _prime(stream: Iterator[str]) -> Iterator[str]:
+    """先取出第一個 chunk，讓開啟串流時的錯誤在這裡拋出"""
+    try:
+        first = next(stream)
+    except StopIteration:
+        return iter(())
+    return chain((first,), stream)
+
+
+async def _hedged(
+    primary: Callable[[], Awaitable[Any]], secondary: Callable[[], Awaitable[Any]], delay: float
+) -> Any:
+    """
+    先送 primary；delay 秒內沒完成（或以可 failover 的錯誤失敗）就再送 secondary，
+    取先成功的結果並取消另一個（被取消的一方在 tracker 中標記為 wasted）
+    """
+    tasks = [asyncio.ensure_future(primary())]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            error = tasks[0].exception()
+            if error is None:
+                winner = tasks[0]
+                return winner.result()
+            if not provider_health.should_failover(error):
+                raise error
+
+        tasks.append(asyncio.ensure_future(secondary()))
+        pending = {task for task in tasks if not task.done()}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    return winner.result()
+
+        # 兩邊都失敗，拋出主要請求的錯誤
+        raise tasks[0].exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # 等取消完成，讓輸掉的一方記錄用量
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            # 幾乎同時完成的另一個串流也要關閉
+            if task is not winner and not task.cancelled() and task.exception() is None:
+                result = task.result()
+                if isinstance(result, _PrimedStream):
+                    await result.discard()
+
+
+async def _prime_async(stream: AsyncGenerator[str, None]) -> "_PrimedStream":
+    """_prime() 的非同步版本"""
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return _PrimedStream(first, stream)
+
+
+class _PrimedStream:
+    """
+    接回已取出第一個 chunk 的非同步串流
+
+    不用 async generator 包裝：還沒開始迭代的 generator 被 aclose() 時不會執行
+    任何程式碼，底層的 provider 串流（連線與限流額度）就不會被關閉。
+    """
+
+    def __init__(self, first: Optional[str], stream: AsyncGenerator[str, None]):
+        self._first = first
+        self._stream = stream
+
+    def __aiter__(self) -> "_PrimedStream":
+        return self
+
+    async def __anext__(self) -> str:
+        if self._first is not None:
+            first, self._first = self._first, None
+            return first
+        return await self._stream.__anext__()
+
+    async def aclose(self):
+        """關閉底層串流（沒讀完時 provider 會記錄為被取消的請求）"""
+        self._first = None
+        await self._stream.aclose()
+
+    async def discard(self):
+        """丟棄結果並關閉底層串流（provider 會記錄為 wasted，與被取消的 task 相同）"""
+        self._first = None
+        try:
+            await self._stream.athrow(asyncio.CancelledError())
+        except (asyncio.CancelledError, StopAsyncIteration):
+            pass
+
+
+def _lazy(open_stream: Callable[[], Iterator[str]]) -> Generator[str, None, None]:
+    """延後到第一次迭代時才開啟串流"""
+    yield from open_stream()
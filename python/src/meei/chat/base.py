@@ -2,14 +2,23 @@
 Chat Provider 基礎類別
 """
 
+import asyncio
 import os
 import time
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Any, Generator, Union
+from typing import Optional, List, Dict, Any, AsyncGenerator, Generator, Tuple, Union
 
 import httpx
 
+from meei.cache import response_cache, make_key, CachedResponse
+from meei.chat.sse import DONE, loads, iter_sse_data, aiter_sse_data
 from meei.config import config
+from meei.env import load_env
+from meei.pool import http_pools
+from meei.ratelimit import CHARS_PER_TOKEN, Reservation, estimate_tokens, rate_limiter
+from meei.routing import latency_estimator
+from meei.singleflight import single_flight
+from meei.retry import RetryPolicy, RetryStats, parse_retry_after, retry_policy
 from meei.tracker import track
 from meei.exceptions import AuthenticationError, RateLimitError, APIError
 
@@ -35,9 +44,16 @@ class ChatProvider(ABC):
     PRICE_INPUT: float = 0.0
     PRICE_OUTPUT: float = 0.0
 
+    # 是否支援 OpenAI 相容的 Batch API（meei run-batch --native）
+    SUPPORTS_BATCH: bool = False
+
     def __init__(self):
+        # 指定時取代共用連線池的 client
         self._client: Optional[httpx.Client] = None
         self._async_client: Optional[httpx.AsyncClient] = None
+        self._headers: Optional[Dict[str, str]] = None
+        # 預設共用全域策略，可針對單一 provider 替換
+        self.retry_policy = retry_policy
 
     @property
     def api_key(self) -> str:
@@ -50,7 +66,8 @@ class ChatProvider(ABC):
         except Exception:
             pass
 
-        # 2. Fallback 到環境變數
+        # 2. Fallback 到環境變數（.env 在此時才載入）
+        load_env()
         env_name = ENV_KEY_MAP.get(self.PROVIDER_NAME)
         if env_name:
             key = os.environ.get(env_name)
@@ -66,30 +83,51 @@ class ChatProvider(ABC):
 
     @property
     def base_url(self) -> str:
-        """取得 Base URL（可自訂）"""
-        return config.get(f"{self.PROVIDER_NAME}.base_url") or self.BASE_URL
+        """取得 Base URL（優先順序：meei config > 環境變數 <PROVIDER>_BASE_URL > 預設）"""
+        url = config.get(f"{self.PROVIDER_NAME}.base_url")
+        if url:
+            return url
+        load_env()
+        return os.environ.get(f"{self.PROVIDER_NAME.upper()}_BASE_URL") or self.BASE_URL
 
     @property
     def client(self) -> httpx.Client:
-        """取得 HTTP client"""
-        if not self._client:
-            self._client = httpx.Client(
-                base_url=self.base_url,
-                headers=self._get_headers(),
-                timeout=120.0,
-            )
-        return self._client
+        """取得 HTTP client（process 內依 host 共用，見 meei.pool）"""
+        return self._client or http_pools.get(self.base_url)
 
     @property
     def async_client(self) -> httpx.AsyncClient:
-        """取得非同步 HTTP client"""
-        if not self._async_client:
-            self._async_client = httpx.AsyncClient(
-                base_url=self.base_url,
-                headers=self._get_headers(),
-                timeout=120.0,
-            )
-        return self._async_client
+        """取得目前 event loop 的非同步 HTTP client"""
+        return self._async_client or http_pools.get_async(self.base_url)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """請求標頭（共用 client 不帶認證，每次請求附上）"""
+        if self._headers is None:
+            self._headers = self._get_headers()
+        return self._headers
+
+    def _url(self, endpoint: str) -> str:
+        """endpoint 轉成完整 URL（已是完整 URL 時原樣回傳）"""
+        if endpoint.startswith(("https://", "http://")):
+            return endpoint
+        return self.base_url.rstrip("/") + endpoint
+
+    def close(self):
+        """關閉自行指定的 client（共用連線池由 meei.pool 管理）"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self._async_client is not None:
+            # AsyncClient 只能在 event loop 中關閉，這裡只放掉參照
+            self._async_client = None
+
+    async def aclose(self):
+        """close() 的非同步版本"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self.close()
 
     def _get_headers(self) -> Dict[str, str]:
         """取得請求標頭"""
@@ -98,22 +136,104 @@ class ChatProvider(ABC):
             "Content-Type": "application/json",
         }
 
-    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def _resolve_model(self, model: str) -> str:
+        """解析模型名稱（子類別可覆寫以支援別名）"""
+        return model
+
+    def _calculate_cost(self, input_tokens: int, output_tokens: int, model: str = None) -> float:
         """計算花費"""
         return (input_tokens * self.PRICE_INPUT + output_tokens * self.PRICE_OUTPUT) / 1000
 
     def _handle_error(self, response: httpx.Response):
         """處理錯誤回應"""
+        retry_after = parse_retry_after(response.headers.get("retry-after"))
+
         if response.status_code == 401:
             raise AuthenticationError(self.PROVIDER_NAME, "API key 無效")
         elif response.status_code == 429:
-            raise RateLimitError(self.PROVIDER_NAME, "超過請求限制，請稍後再試")
+            raise RateLimitError(
+                self.PROVIDER_NAME, "超過請求限制，請稍後再試", retry_after=retry_after
+            )
         elif response.status_code >= 400:
             try:
                 error_msg = response.json().get("error", {}).get("message", response.text)
             except Exception:
                 error_msg = response.text
-            raise APIError(self.PROVIDER_NAME, response.status_code, error_msg)
+            raise APIError(self.PROVIDER_NAME, response.status_code, error_msg, retry_after=retry_after)
+
+    def _cache_key(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        cache: Optional[bool],
+    ) -> Optional[str]:
+        """回應快取 key（未開啟快取時為 None）"""
+        if not (response_cache.enabled if cache is None else cache):
+            return None
+        return make_key(self.PROVIDER_NAME, model, messages, temperature, max_tokens)
+
+    def _cache_lookup(self, key: str, model: str, prompt: str) -> Optional[CachedResponse]:
+        """查詢快取，命中時記錄為零花費、零延遲的請求"""
+        return self._cache_hit(response_cache.get(key), model, prompt)
+
+    async def _cache_lookup_async(self, key: str, model: str, prompt: str) -> Optional[CachedResponse]:
+        """_cache_lookup() 的非同步版本（SQLite 層在 thread 中查）"""
+        return self._cache_hit(await response_cache.get_async(key), model, prompt)
+
+    def _cache_hit(self, hit: Optional[CachedResponse], model: str, prompt: str) -> Optional[CachedResponse]:
+        """記錄快取命中"""
+        if hit is None:
+            return None
+
+        track(
+            provider=self.PROVIDER_NAME,
+            type="chat",
+            model=model,
+            prompt=prompt,
+            cached=True,
+            response_model=hit.model if hit.model != model else None,
+        )
+        return hit
+
+    def _flight_key(
+        self,
+        cache_key: Optional[str],
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool,
+    ) -> str:
+        """single-flight 的 key：與快取相同的請求雜湊，串流與非串流分開"""
+        key = cache_key or make_key(self.PROVIDER_NAME, model, messages, temperature, max_tokens)
+        return f"{key}:stream" if stream else key
+
+    def _endpoint(self, model: str, stream: bool) -> str:
+        """請求路徑（子類別可覆寫，例如 Gemini）"""
+        return "/chat/completions"
+
+    def _prepare(
+        self, messages: List[Dict[str, str]], model: Optional[str], system: Optional[str]
+    ) -> tuple:
+        """套用預設模型與 system prompt，回傳 (messages, model)"""
+        model = self._resolve_model(model or self.DEFAULT_MODEL)
+
+        # 如果有 system 且 messages 第一條不是 system
+        if system and (not messages or messages[0].get("role") != "system"):
+            messages = [{"role": "system", "content": system}] + messages
+
+        return messages, model
+
+    @staticmethod
+    def _build_messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+        """單輪請求的 messages"""
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        return messages
 
     @abstractmethod
     def _build_payload(
@@ -137,6 +257,228 @@ class ChatProvider(ABC):
         """
         pass
 
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        """解析串流 chunk，回傳文字片段"""
+        choices = chunk.get("choices")
+        if choices:
+            delta = choices[0].get("delta")
+            if delta:
+                return delta.get("content") or ""
+        return ""
+
+    def _parse_stream_usage(self, chunk: Dict[str, Any]) -> Optional[tuple]:
+        """
+        解析串流 chunk 中的用量（stream_options.include_usage 的最後一個 chunk）
+
+        Returns:
+            (input_tokens, output_tokens)，該 chunk 沒有用量時為 None
+        """
+        usage = chunk.get("usage")
+        if not usage:
+            return None
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+    @staticmethod
+    def _reconcile(call: "_Call", actual_tokens: int):
+        """以實際用量修正限流額度；非同步請求先記下，由 _settle_async() 離開 event loop 執行"""
+        if call.is_async:
+            call.used_tokens = actual_tokens
+        else:
+            rate_limiter.reconcile(call.reservation, actual_tokens)
+
+    @staticmethod
+    def _cache_store(call: "_Call", response: CachedResponse):
+        """寫入回應快取；非同步請求先記下，由 _settle_async() 寫入"""
+        if call.is_async:
+            call.cached_response = response
+        else:
+            response_cache.set(call.cache_key, response)
+
+    @staticmethod
+    async def _settle_async(call: "_Call"):
+        """
+        執行非同步請求延後的限流修正與快取寫入
+
+        SQLite 限流狀態與快取的交易不在 event loop 中執行。
+        """
+        if call.used_tokens is not None:
+            tokens, call.used_tokens = call.used_tokens, None
+            await rate_limiter.reconcile_async(call.reservation, tokens)
+        if call.cached_response is not None:
+            response, call.cached_response = call.cached_response, None
+            await response_cache.set_async(call.cache_key, response)
+
+    def _handle_response(self, data: Dict[str, Any], call: "_Call") -> str:
+        """解析回應、記錄用量並寫入快取"""
+        content, input_tokens, output_tokens, used_model = self._parse_response(data)
+        latency_ms = call.elapsed_ms()
+        self._reconcile(call, input_tokens + output_tokens)
+        latency_estimator.observe(self.PROVIDER_NAME, call.model, latency_ms)
+
+        # 記錄用量：彙總、直方圖與路由都以請求的模型名稱為 key，
+        # 回應中的模型版本（例如帶日期的名稱）不同時另外保存
+        track(
+            provider=self.PROVIDER_NAME,
+            type="chat",
+            model=call.model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost=self._calculate_cost(input_tokens, output_tokens, call.model),
+            latency_ms=latency_ms,
+            prompt=call.prompt,
+            retries=call.retry.retries,
+            retry_wait_ms=call.retry.wait_ms,
+            response_model=used_model if used_model != call.model else None,
+        )
+
+        if call.cache_key:
+            self._cache_store(call, CachedResponse(content, used_model, input_tokens, output_tokens))
+
+        return content
+
+    def _track_stream(
+        self, call: "_Call", ttft_ms: Optional[int], content: str, usage: Optional[tuple]
+    ):
+        """串流結束後記錄用量並寫入快取"""
+        # provider 沒回傳用量時只記錄延遲
+        input_tokens, output_tokens = usage or (0, 0)
+        if usage:
+            self._reconcile(call, input_tokens + output_tokens)
+        latency_ms = call.elapsed_ms()
+        latency_estimator.observe(self.PROVIDER_NAME, call.model, latency_ms, ttft_ms)
+
+        track(
+            provider=self.PROVIDER_NAME,
+            type="chat",
+            model=call.model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost=self._calculate_cost(input_tokens, output_tokens, call.model),
+            latency_ms=latency_ms,
+            ttft_ms=ttft_ms,
+            prompt=call.prompt,
+            retries=call.retry.retries,
+            retry_wait_ms=call.retry.wait_ms,
+        )
+
+        if call.cache_key:
+            self._cache_store(call, CachedResponse(content, call.model, input_tokens, output_tokens))
+
+    @staticmethod
+    def _sent_usage(call: "_Call", streamed_chars: int) -> Tuple[int, int]:
+        """
+        沒有正常結束的請求可能產生的用量：(預估的輸入 token, 已收到的輸出 token)
+
+        還在等待限流（請求沒有送出）時為 (0, 0)。
+        """
+        if not call.start_time:
+            return 0, 0
+        return call.input_tokens, streamed_chars // CHARS_PER_TOKEN
+
+    def _track_failure(self, call: "_Call", error: Exception, streamed_chars: int = None):
+        """
+        記錄失敗的請求
+
+        streamed_chars 為 None 表示重試後仍失敗（沒有成功的回應，不計花費）；
+        否則 provider 已經回應（串流中途斷線、回應無法解析），以預估的輸入 token
+        與已收到的輸出字數記錄可能產生的花費。
+        """
+        if streamed_chars is None:
+            input_tokens = output_tokens = 0
+        else:
+            input_tokens, output_tokens = self._sent_usage(call, streamed_chars)
+        self._reconcile(call, input_tokens + output_tokens)
+
+        track(
+            provider=self.PROVIDER_NAME,
+            type="chat",
+            model=call.model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost=self._calculate_cost(input_tokens, output_tokens, call.model),
+            success=False,
+            latency_ms=call.elapsed_ms(),
+            prompt=call.prompt,
+            error=str(error)[:500],
+            retries=call.retry.retries,
+            retry_wait_ms=call.retry.wait_ms,
+        )
+
+    def _track_cancelled(self, call: "_Call", streamed_chars: int = 0, wasted: bool = False):
+        """
+        記錄被取消的請求（例如 hedged request 中輸掉的一方、呼叫端提早關閉的串流）
+
+        已送出的請求可能已送達 provider，以預估的輸入 token 與已收到的輸出字數
+        記錄可能產生的花費，並以此修正限流額度。
+
+        wasted: 結果因為改用其他請求而被丟棄（task 被取消）；呼叫端自己提早
+        關閉串流不算。還在等待限流時被取消的請求沒有送出，不會是 wasted。
+        """
+        input_tokens, output_tokens = self._sent_usage(call, streamed_chars)
+        self._reconcile(call, input_tokens + output_tokens)
+
+        track(
+            provider=self.PROVIDER_NAME,
+            type="chat",
+            model=call.model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost=self._calculate_cost(input_tokens, output_tokens, call.model),
+            success=False,
+            latency_ms=call.elapsed_ms() if call.start_time else 0,
+            prompt=call.prompt,
+            error="cancelled",
+            retries=call.retry.retries,
+            retry_wait_ms=call.retry.wait_ms,
+            wasted=wasted and bool(call.start_time),
+        )
+
+    def _post(self, endpoint: str, payload: Dict, timeout: float = None) -> httpx.Response:
+        """送出一次請求，非 200 時拋出對應例外（timeout 為 None 時用連線池的設定）"""
+        response = self.client.post(
+            self._url(endpoint), json=payload, headers=self.headers, timeout=_timeout(timeout)
+        )
+        if response.status_code != 200:
+            self._handle_error(response)
+        return response
+
+    async def _post_async(self, endpoint: str, payload: Dict, timeout: float = None) -> httpx.Response:
+        """_post() 的非同步版本"""
+        response = await self.async_client.post(
+            self._url(endpoint), json=payload, headers=self.headers, timeout=_timeout(timeout)
+        )
+        if response.status_code != 200:
+            self._handle_error(response)
+        return response
+
+    def _open_stream(self, endpoint: str, payload: Dict, timeout: float = None) -> httpx.Response:
+        """開啟串流，收到 200 的回應標頭後即回傳（呼叫端負責 close）"""
+        request = self.client.build_request(
+            "POST", self._url(endpoint), json=payload, headers=self.headers, timeout=_timeout(timeout)
+        )
+        response = self.client.send(request, stream=True)
+        if response.status_code != 200:
+            try:
+                response.read()
+            finally:
+                response.close()
+            self._handle_error(response)
+        return response
+
+    async def _open_stream_async(self, endpoint: str, payload: Dict, timeout: float = None) -> httpx.Response:
+        """_open_stream() 的非同步版本"""
+        request = self.async_client.build_request(
+            "POST", self._url(endpoint), json=payload, headers=self.headers, timeout=_timeout(timeout)
+        )
+        response = await self.async_client.send(request, stream=True)
+        if response.status_code != 200:
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+            self._handle_error(response)
+        return response
+
     def chat(
         self,
         prompt: str,
@@ -145,19 +487,16 @@ class ChatProvider(ABC):
         temperature: float = None,
         max_tokens: int = None,
         stream: bool = False,
+        cache: bool = None,
     ) -> Union[str, Generator[str, None, None]]:
         """發送聊天請求"""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
-
         return self.conversation(
-            messages=messages,
+            messages=self._build_messages(prompt, system),
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
             stream=stream,
+            cache=cache,
         )
 
     def conversation(
@@ -168,13 +507,25 @@ class ChatProvider(ABC):
         temperature: float = None,
         max_tokens: int = None,
         stream: bool = False,
+        cache: bool = None,
+        retry: RetryPolicy = None,
+        timeout: float = None,
     ) -> Union[str, Generator[str, None, None]]:
-        """多輪對話"""
-        model = model or self.DEFAULT_MODEL
+        """
+        多輪對話
 
-        # 如果有 system 且 messages 第一條不是 system
-        if system and (not messages or messages[0].get("role") != "system"):
-            messages = [{"role": "system", "content": system}] + messages
+        cache: 是否使用回應快取（None 表示依 response_cache.enabled）
+        retry: 這次請求的重試策略（None 表示 self.retry_policy）
+        timeout: 這次請求的逾時秒數（None 表示連線池的設定）
+        """
+        messages, model = self._prepare(messages, model, system)
+
+        prompt = messages[-1].get("content", "")
+        cache_key = self._cache_key(messages, model, temperature, max_tokens, cache)
+        if cache_key:
+            hit = self._cache_lookup(cache_key, model, prompt)
+            if hit is not None:
+                return _replay(hit.content) if stream else hit.content
 
         payload = self._build_payload(
             messages=messages,
@@ -183,71 +534,87 @@ class ChatProvider(ABC):
             max_tokens=max_tokens,
             stream=stream,
         )
+        call = _Call(model, prompt, cache_key, estimate_tokens(messages), max_tokens)
+        call.policy = retry or self.retry_policy
+        call.timeout = timeout
 
-        start_time = time.time()
+        if single_flight.enabled:
+            key = self._flight_key(cache_key, messages, model, temperature, max_tokens, stream)
+            if stream:
+                return single_flight.stream(key, lambda: self._stream_response(payload, call))
+            return single_flight.do(key, lambda: self._complete(payload, call))
 
         if stream:
-            return self._stream_response(payload, prompt=messages[-1].get("content", ""))
-
-        response = self.client.post("/chat/completions", json=payload)
-        latency_ms = int((time.time() - start_time) * 1000)
+            return self._stream_response(payload, call)
+        return self._complete(payload, call)
 
-        if response.status_code != 200:
-            self._handle_error(response)
-
-        data = response.json()
-        content, input_tokens, output_tokens, used_model = self._parse_response(data)
+    def _complete(self, payload: Dict, call: "_Call") -> str:
+        """送出非串流請求（含限流與重試）並處理回應"""
+        endpoint = self._endpoint(call.model, stream=False)
+        try:
+            call.reservation = rate_limiter.acquire(self.PROVIDER_NAME, call.model, call.tokens)
+            call.start()
+            response = call.policy.call(lambda: self._post(endpoint, payload, call.timeout), call.retry)
+        except Exception as e:
+            self._track_failure(call, e)
+            raise
 
-        # 記錄用量
-        track(
-            provider=self.PROVIDER_NAME,
-            type="chat",
-            model=used_model,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            cost=self._calculate_cost(input_tokens, output_tokens),
-            latency_ms=latency_ms,
-            prompt=messages[-1].get("content", ""),
-        )
+        try:
+            return self._handle_response(response.json(), call)
+        except Exception as e:
+            # 回應不是預期的格式
+            self._track_failure(call, e, 0)
+            raise
+
+    def _stream_response(self, payload: Dict, call: "_Call") -> Generator[str, None, None]:
+        """串流回應（只在收到第一個 byte 前重試；完整讀完時才寫入快取）"""
+        endpoint = self._endpoint(call.model, stream=True)
+        try:
+            call.reservation = rate_limiter.acquire(self.PROVIDER_NAME, call.model, call.tokens)
+            call.start()
+            response = call.policy.call(
+                lambda: self._open_stream(endpoint, payload, call.timeout), call.retry
+            )
+        except Exception as e:
+            self._track_failure(call, e)
+            raise
 
-        return content
+        # 只有要寫入快取時才保留完整內容
+        parts: Optional[List[str]] = [] if call.cache_key else None
+        usage = None
+        ttft_ms = None
+        streamed = 0
 
-    def _stream_response(self, payload: Dict, prompt: str) -> Generator[str, None, None]:
-        """串流回應"""
-        start_time = time.time()
-        total_content = ""
-
-        with self.client.stream("POST", "/chat/completions", json=payload) as response:
-            if response.status_code != 200:
-                self._handle_error(response)
-
-            for line in response.iter_lines():
-                if line.startswith("data: "):
-                    data = line[6:]
-                    if data == "[DONE]":
-                        break
-                    try:
-                        import json
-
-                        chunk = json.loads(data)
-                        delta = chunk.get("choices", [{}])[0].get("delta", {})
-                        content = delta.get("content", "")
-                        if content:
-                            total_content += content
-                            yield content
-                    except Exception:
-                        continue
-
-        latency_ms = int((time.time() - start_time) * 1000)
-
-        # 記錄用量（串流模式無法取得精確 token 數）
-        track(
-            provider=self.PROVIDER_NAME,
-            type="chat",
-            model=payload.get("model"),
-            latency_ms=latency_ms,
-            prompt=prompt,
-        )
+        try:
+            for data in iter_sse_data(response.iter_bytes()):
+                if data == DONE:
+                    break
+                try:
+                    chunk = loads(data)
+                except ValueError:
+                    continue
+
+                usage = self._parse_stream_usage(chunk) or usage
+                content = self._parse_stream_chunk(chunk)
+                if content:
+                    if ttft_ms is None:
+                        ttft_ms = call.elapsed_ms()
+                    if parts is not None:
+                        parts.append(content)
+                    streamed += len(content)
+                    yield content
+        except GeneratorExit:
+            # 呼叫端提早關閉（或丟棄）串流
+            self._track_cancelled(call, streamed)
+            raise
+        except Exception as e:
+            # 串流中途斷線
+            self._track_failure(call, e, streamed)
+            raise
+        finally:
+            response.close()
+
+        self._track_stream(call, ttft_ms, "".join(parts) if parts else "", usage)
 
     async def chat_async(
         self,
@@ -256,42 +623,214 @@ class ChatProvider(ABC):
         system: str = None,
         temperature: float = None,
         max_tokens: int = None,
-    ) -> str:
+        stream: bool = False,
+        cache: bool = None,
+    ) -> Union[str, AsyncGenerator[str, None]]:
         """非同步聊天請求"""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
+        return await self.conversation_async(
+            messages=self._build_messages(prompt, system),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+            cache=cache,
+        )
 
-        model = model or self.DEFAULT_MODEL
+    async def conversation_async(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        system: str = None,
+        temperature: float = None,
+        max_tokens: int = None,
+        stream: bool = False,
+        cache: bool = None,
+        retry: RetryPolicy = None,
+        timeout: float = None,
+    ) -> Union[str, AsyncGenerator[str, None]]:
+        """
+        非同步多輪對話（retry、timeout 同 conversation）
+
+        stream=True 時回傳 async generator:
+            async for chunk in await provider.conversation_async(messages, stream=True):
+                ...
+        """
+        messages, model = self._prepare(messages, model, system)
+
+        prompt = messages[-1].get("content", "")
+        cache_key = self._cache_key(messages, model, temperature, max_tokens, cache)
+        if cache_key:
+            hit = await self._cache_lookup_async(cache_key, model, prompt)
+            if hit is not None:
+                return _replay_async(hit.content) if stream else hit.content
 
         payload = self._build_payload(
             messages=messages,
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
-            stream=False,
+            stream=stream,
         )
+        call = _Call(model, prompt, cache_key, estimate_tokens(messages), max_tokens)
+        call.policy = retry or self.retry_policy
+        call.timeout = timeout
+        call.is_async = True
 
-        start_time = time.time()
-        response = await self.async_client.post("/chat/completions", json=payload)
-        latency_ms = int((time.time() - start_time) * 1000)
-
-        if response.status_code != 200:
-            self._handle_error(response)
+        if single_flight.enabled:
+            key = self._flight_key(cache_key, messages, model, temperature, max_tokens, stream)
+            if stream:
+                return single_flight.stream_async(key, lambda: self._stream_response_async(payload, call))
+            return await single_flight.do_async(key, lambda: self._complete_async(payload, call))
 
-        data = response.json()
-        content, input_tokens, output_tokens, used_model = self._parse_response(data)
+        if stream:
+            return self._stream_response_async(payload, call)
+        return await self._complete_async(payload, call)
 
-        track(
-            provider=self.PROVIDER_NAME,
-            type="chat",
-            model=used_model,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            cost=self._calculate_cost(input_tokens, output_tokens),
-            latency_ms=latency_ms,
-            prompt=prompt,
-        )
+    async def _complete_async(self, payload: Dict, call: "_Call") -> str:
+        """_complete() 的非同步版本"""
+        endpoint = self._endpoint(call.model, stream=False)
+        try:
+            call.reservation = await rate_limiter.acquire_async(
+                self.PROVIDER_NAME, call.model, call.tokens
+            )
+            call.start()
+            response = await call.policy.call_async(
+                lambda: self._post_async(endpoint, payload, call.timeout), call.retry
+            )
+        except asyncio.CancelledError:
+            self._track_cancelled(call, wasted=True)
+            await self._settle_async(call)
+            raise
+        except Exception as e:
+            self._track_failure(call, e)
+            await self._settle_async(call)
+            raise
 
+        try:
+            content = self._handle_response(response.json(), call)
+        except Exception as e:
+            self._track_failure(call, e, 0)
+            raise
+        finally:
+            await self._settle_async(call)
         return content
+
+    async def _stream_response_async(
+        self, payload: Dict, call: "_Call"
+    ) -> AsyncGenerator[str, None]:
+        """非同步串流回應"""
+        endpoint = self._endpoint(call.model, stream=True)
+        try:
+            call.reservation = await rate_limiter.acquire_async(
+                self.PROVIDER_NAME, call.model, call.tokens
+            )
+            call.start()
+            response = await call.policy.call_async(
+                lambda: self._open_stream_async(endpoint, payload, call.timeout), call.retry
+            )
+        except asyncio.CancelledError:
+            self._track_cancelled(call, wasted=True)
+            await self._settle_async(call)
+            raise
+        except Exception as e:
+            self._track_failure(call, e)
+            await self._settle_async(call)
+            raise
+
+        parts: Optional[List[str]] = [] if call.cache_key else None
+        usage = None
+        ttft_ms = None
+        streamed = 0
+
+        try:
+            async for data in aiter_sse_data(response.aiter_bytes()):
+                if data == DONE:
+                    break
+                try:
+                    chunk = loads(data)
+                except ValueError:
+                    continue
+
+                usage = self._parse_stream_usage(chunk) or usage
+                content = self._parse_stream_chunk(chunk)
+                if content:
+                    if ttft_ms is None:
+                        ttft_ms = call.elapsed_ms()
+                    if parts is not None:
+                        parts.append(content)
+                    streamed += len(content)
+                    yield content
+        except asyncio.CancelledError:
+            self._track_cancelled(call, streamed, wasted=True)
+            await self._settle_async(call)
+            raise
+        except GeneratorExit:
+            self._track_cancelled(call, streamed)
+            await self._settle_async(call)
+            raise
+        except Exception as e:
+            self._track_failure(call, e, streamed)
+            await self._settle_async(call)
+            raise
+        finally:
+            await response.aclose()
+
+        self._track_stream(call, ttft_ms, "".join(parts) if parts else "", usage)
+        await self._settle_async(call)
+
+
+class _Call:
+    """單次請求在各階段之間傳遞的狀態"""
+
+    __slots__ = (
+        "model", "prompt", "cache_key", "input_tokens", "tokens", "start_time", "retry", "reservation",
+        "policy", "timeout", "is_async", "used_tokens", "cached_response",
+    )
+
+    def __init__(
+        self,
+        model: str,
+        prompt: str,
+        cache_key: Optional[str],
+        input_tokens: int,
+        max_tokens: Optional[int],
+    ):
+        self.model = model
+        self.prompt = prompt
+        self.cache_key = cache_key
+        self.input_tokens = input_tokens  # 預估輸入 token 數
+        self.tokens = input_tokens + (max_tokens or 0)  # 預估總 token 數（限流用）
+        self.start_time = 0.0
+        self.retry = RetryStats()
+        self.reservation: Optional[Reservation] = None
+        self.policy: RetryPolicy = retry_policy
+        self.timeout: Optional[float] = None
+        # 非同步請求：限流修正與快取寫入延後到 _settle_async()
+        self.is_async = False
+        self.used_tokens: Optional[int] = None
+        self.cached_response: Optional[CachedResponse] = None
+
+    def start(self):
+        """開始計時（取得限流額度之後，包含重試；延遲統計不含 meei 自己的排隊時間）"""
+        self.start_time = time.time()
+
+    def elapsed_ms(self) -> int:
+        """開始計時後經過的毫秒數，還沒開始（仍在等待限流）時為 0"""
+        if not self.start_time:
+            return 0
+        return int((time.time() - self.start_time) * 1000)
+
+
+def _timeout(seconds: Optional[float]) -> Any:
+    """單次請求的 httpx timeout 參數，None 表示沿用 client 的設定"""
+    return httpx.USE_CLIENT_DEFAULT if seconds is None else seconds
+
+
+def _replay(content: str) -> Generator[str, None, None]:
+    """把完整回應當成單一 chunk 的串流"""
+    yield content
+
+
+async def _replay_async(content: str) -> AsyncGenerator[str, None]:
+    """把完整回應當成單一 chunk 的非同步串流"""
+    yield content
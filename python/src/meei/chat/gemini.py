@@ -19,8 +19,6 @@ Gemini API 文檔: https://ai.google.dev/gemini-api/docs
 
 from typing import Dict, Any, List, Optional
 
-import httpx
-
 from meei.chat.base import ChatProvider
 from meei.config import config
 from meei.exceptions import AuthenticationError
@@ -62,15 +60,12 @@ class GeminiChat(ChatProvider):
         """Gemini 使用 URL 參數傳遞 API key"""
         return {"Content-Type": "application/json"}
 
-    @property
-    def client(self) -> httpx.Client:
-        """取得 HTTP client（不含 base_url，因為 Gemini 需要動態構建）"""
-        if not self._client:
-            self._client = httpx.Client(
-                headers=self._get_headers(),
-                timeout=120.0,
-            )
-        return self._client
+    def _endpoint(self, model: str, stream: bool) -> str:
+        """Gemini endpoint 格式（API key 放在 URL 參數）"""
+        if stream:
+            # alt=sse 讓回應變成與 OpenAI 相同的 `data: {...}` 格式
+            return f"{self.base_url}/models/{model}:streamGenerateContent?alt=sse&key={self.api_key}"
+        return f"{self.base_url}/models/{model}:generateContent?key={self.api_key}"
 
     def _calculate_cost(self, input_tokens: int, output_tokens: int, model: str = None) -> float:
         """根據模型計算花費"""
@@ -149,57 +144,25 @@ class GeminiChat(ChatProvider):
 
         return content, input_tokens, output_tokens, model
 
-    def conversation(
-        self,
-        messages: List[Dict[str, str]],
-        model: str = None,
-        system: str = None,
-        temperature: float = None,
-        max_tokens: int = None,
-        stream: bool = False,
-    ) -> str:
-        """多輪對話 - 覆寫以使用 Gemini API"""
-        import time
-        from meei.tracker import track
-
-        model = self._resolve_model(model or self.DEFAULT_MODEL)
-
-        if system and (not messages or messages[0].get("role") != "system"):
-            messages = [{"role": "system", "content": system}] + messages
-
-        payload = self._build_payload(
-            messages=messages,
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=stream,
-        )
-
-        # Gemini endpoint 格式
-        endpoint = f"{self.base_url}/models/{model}:generateContent?key={self.api_key}"
-
-        start_time = time.time()
-        response = self.client.post(endpoint, json=payload)
-        latency_ms = int((time.time() - start_time) * 1000)
-
-        if response.status_code != 200:
-            self._handle_error(response)
-
-        data = response.json()
-        content, input_tokens, output_tokens, used_model = self._parse_response(data)
-
-        track(
-            provider=self.PROVIDER_NAME,
-            type="chat",
-            model=model,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            cost=self._calculate_cost(input_tokens, output_tokens, model),
-            latency_ms=latency_ms,
-            prompt=messages[-1].get("content", ""),
-        )
-
-        return content
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        """解析串流 chunk（格式同 generateContent 回應）"""
+        candidates = chunk.get("candidates")
+        if candidates:
+            content = candidates[0].get("content")
+            if content:
+                parts = content.get("parts")
+                if parts:
+                    if len(parts) == 1:
+                        return parts[0].get("text") or ""
+                    return "".join(part.get("text", "") for part in parts)
+        return ""
+
+    def _parse_stream_usage(self, chunk: Dict[str, Any]) -> Optional[tuple]:
+        """每個 chunk 都帶 usageMetadata，最後一個才是完整用量"""
+        usage = chunk.get("usageMetadata")
+        if not usage:
+            return None
+        return usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0)
 
 
 # 便捷函數
@@ -225,6 +188,10 @@ def gemini(
 
         # 使用最新實驗版
         response = gemini("寫個程式", model="2.0")
+
+        # 串流輸出
+        for chunk in gemini("講個故事", stream=True):
+            print(chunk, end="")
     """
     provider = GeminiChat()
     return provider.chat(
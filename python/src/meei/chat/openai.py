@@ -27,6 +27,7 @@ class OpenAIChat(ChatProvider):
     PROVIDER_NAME = "openai"
     DEFAULT_MODEL = "gpt-4o-mini"
     BASE_URL = "https://api.openai.com/v1"
+    SUPPORTS_BATCH = True
 
     # 預設價格 (per 1K tokens) - gpt-4o-mini
     PRICE_INPUT = 0.00015
@@ -82,6 +83,10 @@ class OpenAIChat(ChatProvider):
         if max_tokens is not None:
             payload["max_tokens"] = max_tokens
 
+        if stream:
+            # 最後一個 chunk 附上 token 用量
+            payload["stream_options"] = {"include_usage": True}
+
         return payload
 
     def _parse_response(self, data: Dict[str, Any]) -> tuple:
@@ -86,6 +86,10 @@ class QwenChat(ChatProvider):
         if max_tokens is not None:
             payload["max_tokens"] = max_tokens
 
+        if stream:
+            # 最後一個 chunk 附上 token 用量
+            payload["stream_options"] = {"include_usage": True}
+
         return payload
 
     def _parse_response(self, data: Dict[str, Any]) -> tuple:
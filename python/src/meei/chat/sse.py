@@ -0,0 +1,108 @@
+"""
+增量 SSE (Server-Sent Events) 解碼器
+
+直接處理 iter_bytes() 的原始 bytes，不先解碼成 str 再逐行切割。
+sync、async 以及 Gemini 的串流共用同一套解碼邏輯。
+
+有安裝 orjson 時自動使用（JSON 解析快數倍），否則退回標準 json。
+"""
+
+import json
+from typing import AsyncIterator, Iterator, List
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson 為選用套件
+    loads = json.loads
+
+# OpenAI 相容格式的結束標記
+DONE = b"[DONE]"
+
+
+class SSEDecoder:
+    """
+    增量 SSE 解碼器
+
+    餵入任意切割的 bytes，回傳完整事件的 data 內容（bytes）。
+    只處理 data 欄位；event/id/retry 與註解行會被忽略。
+    行尾可以是 CRLF、CR 或 LF（SSE 規格都允許）。
+    """
+
+    __slots__ = ("_pending", "_data", "_skip_lf")
+
+    def __init__(self):
+        # 還沒遇到行尾的片段（很長的 data 行分多次送達時不必重複掃描）
+        self._pending: List[bytes] = []
+        self._data: List[bytes] = []
+        # 上一段以 CR 結尾，下一段開頭的 LF 屬於同一個行尾
+        self._skip_lf = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """餵入一段 bytes，回傳這段資料中完成的事件"""
+        if not chunk:
+            return []
+        if self._skip_lf:
+            self._skip_lf = False
+            if chunk.startswith(b"\n"):
+                chunk = chunk[1:]
+
+        # bytes.splitlines 只認 CRLF、CR、LF，而且只掃描新送達的部分
+        lines = chunk.splitlines(True)
+        rest = None
+        if lines and not lines[-1].endswith((b"\n", b"\r")):
+            # 最後一段是不完整的行，留到下次
+            rest = lines.pop()
+
+        events = []
+        for line in lines:
+            if self._pending:
+                self._pending.append(line)
+                line = b"".join(self._pending)
+                self._pending = []
+            line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+
+            if not line:
+                # 空行代表事件結束
+                if self._data:
+                    data = self._data
+                    events.append(data[0] if len(data) == 1 else b"\n".join(data))
+                    self._data = []
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                if value.startswith(b" "):
+                    value = value[1:]
+                self._data.append(value)
+
+        if rest is not None:
+            self._pending.append(rest)
+        elif chunk.endswith(b"\r"):
+            self._skip_lf = True
+
+        return events
+
+    def flush(self) -> List[bytes]:
+        """串流結束時，送出沒有以空行結尾的最後一個事件"""
+        events = self.feed(b"\n\n") if (self._pending or self._data) else []
+        self._pending = []
+        self._skip_lf = False
+        return events
+
+
+def iter_sse_data(byte_iter: Iterator[bytes]) -> Iterator[bytes]:
+    """把 bytes 串流轉成事件 data 串流"""
+    decoder = SSEDecoder()
+    for chunk in byte_iter:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_sse_data(byte_iter: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """把非同步 bytes 串流轉成事件 data 串流"""
+    decoder = SSEDecoder()
+    async for chunk in byte_iter:
+        for data in decoder.feed(chunk):
+            yield data
+    for data in decoder.flush():
+        yield data
@@ -0,0 +1,137 @@
+"""
+meei 命令列工具
+"""
+
+import os
+
+import typer
+
+from meei import agent
+
+app = typer.Typer(help="meei - Personal AI SDK", no_args_is_help=True)
+usage_app = typer.Typer(help="用量紀錄（~/.meei/meei.db）維護", no_args_is_help=True)
+app.add_typer(usage_app, name="usage")
+
+
+@app.command()
+def unlock(
+    ttl: int = typer.Option(agent.DEFAULT_TTL, "--ttl", help="金鑰保留秒數（0 表示不過期）"),
+    password: bool = typer.Option(False, "--password", help="以密碼衍生金鑰，而非讀取 ~/.meei/.key"),
+    foreground: bool = typer.Option(False, "--foreground", "-f", help="在前景執行"),
+):
+    """啟動憑證 agent，讓其他 process 不必重新衍生金鑰"""
+    if agent.ping():
+        typer.echo(f"meei agent 已在執行中: {agent.AGENT_SOCKET}")
+        return
+
+    secret = typer.prompt("密碼", hide_input=True) if password else None
+
+    try:
+        # 在 fork 前衍生金鑰，錯誤才能回報給使用者
+        server = agent.Agent(password=secret, ttl=ttl)
+    except Exception as e:
+        typer.echo(f"解鎖失敗: {e}", err=True)
+        raise typer.Exit(1)
+
+    if not foreground and hasattr(os, "fork"):
+        if os.fork() > 0:
+            typer.echo(f"meei agent 已啟動: {agent.AGENT_SOCKET}")
+            return
+        os.setsid()
+
+    try:
+        server.serve_forever()
+    except RuntimeError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+
+
+@app.command()
+def lock():
+    """停止憑證 agent 並清除記憶體中的金鑰"""
+    if agent.lock():
+        typer.echo("meei agent 已停止")
+    else:
+        typer.echo("meei agent 未在執行")
+
+
+@app.command("run-batch")
+def run_batch(
+    input_path: str = typer.Argument(..., metavar="INPUT", help="輸入 JSONL（每行含 prompt 或 messages）"),
+    out: str = typer.Option(..., "--out", "-o", help="輸出 JSONL（重跑時從 <out>.ckpt 接續）"),
+    pv: str = typer.Option(None, "--pv", help="provider 名稱（逗號分隔為 fallback 鏈，或 auto）"),
+    model: str = typer.Option(None, "--model", "-m", help="模型名稱"),
+    system: str = typer.Option(None, "--system", help="系統提示詞"),
+    temperature: float = typer.Option(None, "--temperature", help="溫度"),
+    max_tokens: int = typer.Option(None, "--max-tokens", help="最大輸出 token 數"),
+    concurrency: int = typer.Option(8, "--concurrency", "-c", help="同時進行的請求數"),
+    native: bool = typer.Option(False, "--native", help="使用 provider 原生 Batch API（OpenAI）"),
+    wait: bool = typer.Option(True, "--wait/--no-wait", help="--native 時是否等待 batch 完成"),
+    poll_interval: float = typer.Option(30.0, "--poll-interval", help="--native 查詢狀態的間隔秒數"),
+):
+    """批次執行 JSONL 中的 prompt，可中斷後續跑"""
+    from meei.jobs import run_batch as run
+
+    if pv and "," in pv:
+        pv = [p.strip() for p in pv.split(",") if p.strip()]
+
+    def progress(completed: int, total):
+        if completed % 100 == 0:
+            typer.echo(f"已完成 {completed} 筆", err=True)
+
+    try:
+        completed = run(
+            input_path,
+            out,
+            pv=pv,
+            model=model,
+            system=system,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            concurrency=concurrency,
+            native=native,
+            wait=wait,
+            poll_interval=poll_interval,
+            on_progress=progress,
+        )
+    except KeyboardInterrupt:
+        typer.echo(f"已中斷，進度已存到 {out}.ckpt，重新執行相同指令即可接續", err=True)
+        raise typer.Exit(130)
+    except (RuntimeError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+
+    typer.echo(f"完成，本次處理 {completed} 筆: {out}")
+
+
+@usage_app.command("rebuild")
+def usage_rebuild(
+    days: float = typer.Option(None, "--days", help="只重建最近幾天，預設全部"),
+):
+    """從原始紀錄重建每小時彙總"""
+    from meei.tracker import rebuild_rollups
+
+    buckets = rebuild_rollups(days)
+    typer.echo(f"已重建 {buckets} 筆每小時彙總")
+
+
+@usage_app.command("prune")
+def usage_prune(
+    days: float = typer.Option(90, "--days", help="原始紀錄保留天數"),
+    archive: bool = typer.Option(True, "--archive/--no-archive", help="刪除前封存成 JSONL.gz"),
+    archive_dir: str = typer.Option(None, "--archive-dir", help="封存目錄，預設 ~/.meei/archive"),
+):
+    """刪除過期的原始紀錄（彙總保留），並縮小資料庫"""
+    from meei.tracker import prune_usage
+
+    result = prune_usage(days, archive=archive, archive_dir=archive_dir)
+    typer.echo(
+        f"已刪除 {result['deleted']} 筆原始紀錄、{result['prompts']} 個不再使用的 prompt，"
+        f"釋放 {result['freed_pages']} 頁"
+    )
+    for path in result["files"]:
+        typer.echo(f"  封存: {path}")
+
+
+if __name__ == "__main__":
+    app()
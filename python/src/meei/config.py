@@ -1,8 +1,13 @@
 """
 設定管理模組 - 加密儲存 API keys
+
+解密後的設定會快取在記憶體中，以檔案 mtime/size 判斷是否失效，
+每次查詢只需一次 stat 加上 dict 讀取。
 """
 
+import copy
 import json
+import threading
 from pathlib import Path
 from typing import Optional, Dict, Any
 
@@ -16,21 +21,63 @@ class Config:
 
     def __init__(self):
         self._cache: Dict[str, Any] = {}
-
-    def _load(self) -> Dict[str, Any]:
-        """載入並解密設定"""
+        self._stamp: Optional[tuple] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _file_stamp() -> Optional[tuple]:
+        """設定檔的 (mtime, size)，不存在則為 None"""
+        try:
+            st = CONFIG_FILE.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self) -> Dict[str, Any]:
+        """從磁碟讀取並解密設定（有 meei agent 時改由 agent 提供）"""
         if not CONFIG_FILE.exists():
             return {"providers": {}}
 
+        from meei import agent
+
+        data = agent.fetch_config()
+        if data is not None:
+            return data
+
         encrypted = CONFIG_FILE.read_text()
         decrypted = decrypt(encrypted)
         return json.loads(decrypted)
 
+    def _load(self) -> Dict[str, Any]:
+        """載入設定（檔案未變動時直接回傳快取）"""
+        stamp = self._file_stamp()
+        if self._loaded and stamp == self._stamp:
+            return self._cache
+
+        with self._lock:
+            if not (self._loaded and stamp == self._stamp):
+                self._cache = self._read()
+                self._stamp = stamp
+                self._loaded = True
+            return self._cache
+
     def _save(self, data: Dict[str, Any]):
-        """加密並儲存設定"""
+        """加密並儲存設定（同時更新快取）"""
         json_str = json.dumps(data, indent=2)
         encrypted = encrypt(json_str)
-        CONFIG_FILE.write_text(encrypted)
+        with self._lock:
+            CONFIG_FILE.write_text(encrypted)
+            self._cache = data
+            self._stamp = self._file_stamp()
+            self._loaded = True
+
+    def reload(self):
+        """清除快取，下次查詢時重新從磁碟讀取"""
+        with self._lock:
+            self._cache = {}
+            self._stamp = None
+            self._loaded = False
 
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -49,6 +96,9 @@ class Config:
             if current is None:
                 return default
 
+        # 避免呼叫端修改到快取
+        if isinstance(current, dict):
+            return copy.deepcopy(current)
         return current
 
     def set(self, key: str, value: Any):
@@ -59,7 +109,7 @@ class Config:
         if not is_initialized():
             raise RuntimeError("meei 尚未初始化，請執行 `meei init`")
 
-        data = self._load()
+        data = copy.deepcopy(self._load())
         keys = key.split(".")
 
         if "providers" not in data:
@@ -77,7 +127,7 @@ class Config:
     def get_provider(self, name: str) -> Dict[str, Any]:
         """取得完整的 provider 設定"""
         data = self._load()
-        return data.get("providers", {}).get(name, {})
+        return copy.deepcopy(data.get("providers", {}).get(name, {}))
 
     def list_providers(self) -> list:
         """列出所有已設定的 providers"""
@@ -86,7 +136,7 @@ class Config:
 
     def delete(self, key: str) -> bool:
         """刪除設定"""
-        data = self._load()
+        data = copy.deepcopy(self._load())
         keys = key.split(".")
 
         current = data.get("providers", {})
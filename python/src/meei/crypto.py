@@ -4,15 +4,23 @@
 
 import os
 import base64
+import hashlib
+import threading
 from pathlib import Path
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from typing import Dict, Tuple, TYPE_CHECKING
+
+# cryptography 載入較慢，延後到真正需要加解密時才 import
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
 
 MEEI_DIR = Path.home() / ".meei"
 KEY_FILE = MEEI_DIR / ".key"
 SALT_FILE = MEEI_DIR / ".salt"
 
+# 已建立的 Fernet 快取，避免重複讀取 .key 或重跑 PBKDF2
+_fernet_cache: Dict[Tuple, "Fernet"] = {}
+_fernet_lock = threading.Lock()
+
 
 def _ensure_dir():
     """確保 ~/.meei 目錄存在且權限正確"""
@@ -24,6 +32,9 @@ def _ensure_dir():
 
 def _derive_key(password: str, salt: bytes) -> bytes:
     """從密碼衍生加密金鑰"""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
@@ -48,26 +59,49 @@ def init_encryption(password: str) -> bool:
         os.chmod(KEY_FILE, 0o600)
         os.chmod(SALT_FILE, 0o600)
 
+    clear_key_cache()
     return True
 
 
+def clear_key_cache():
+    """清除記憶體中的金鑰快取"""
+    with _fernet_lock:
+        _fernet_cache.clear()
+
+
 def is_initialized() -> bool:
     """檢查是否已初始化"""
     return KEY_FILE.exists() and SALT_FILE.exists()
 
 
-def get_fernet(password: str = None) -> Fernet:
+def get_fernet(password: str = None) -> "Fernet":
     """取得 Fernet 加密器"""
     if not is_initialized():
         raise RuntimeError("meei 尚未初始化，請執行 `meei init`")
 
+    # 檔案變動（重新 init）時快取自動失效
+    key_stat = KEY_FILE.stat()
+    cache_key: Tuple = (key_stat.st_mtime_ns, key_stat.st_size)
     if password:
-        salt = SALT_FILE.read_bytes()
-        key = _derive_key(password, salt)
-    else:
-        key = KEY_FILE.read_bytes()
-
-    return Fernet(key)
+        cache_key += (hashlib.sha256(password.encode()).hexdigest(),)
+
+    f = _fernet_cache.get(cache_key)
+    if f is not None:
+        return f
+
+    from cryptography.fernet import Fernet
+
+    with _fernet_lock:
+        f = _fernet_cache.get(cache_key)
+        if f is None:
+            if password:
+                salt = SALT_FILE.read_bytes()
+                key = _derive_key(password, salt)
+            else:
+                key = KEY_FILE.read_bytes()
+            f = Fernet(key)
+            _fernet_cache[cache_key] = f
+        return f
 
 
 def encrypt(data: str, password: str = None) -> str:
@@ -0,0 +1,48 @@
+"""
+.env 載入模組
+
+延後到第一次查詢憑證時才載入，`import meei` 不會碰到檔案系統。
+"""
+
+import os
+import threading
+from pathlib import Path
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def _load_env():
+    """載入 .env 文件（優先級：系統環境變數 > 專案 .env > ~/.meei/.env）"""
+    current = Path(__file__).resolve()
+
+    # 搜索順序：專案目錄優先，全局 ~/.meei/ 最後
+    env_locations = [
+        current.parent.parent.parent.parent.parent / ".env",  # meei/
+        current.parent.parent.parent.parent / ".env",          # meei/python/
+        Path.cwd() / ".env",                                   # 當前目錄
+        Path.home() / ".meei" / ".env",                        # 全局設定
+    ]
+
+    for env_file in env_locations:
+        if env_file.exists():
+            with open(env_file) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#") and "=" in line:
+                        key, value = line.split("=", 1)
+                        # 不覆蓋已存在的環境變數
+                        if key and value and key not in os.environ:
+                            os.environ[key] = value
+
+
+def load_env():
+    """載入 .env 文件（每個 process 只做一次）"""
+    global _loaded
+    if _loaded:
+        return
+
+    with _lock:
+        if not _loaded:
+            _load_env()
+            _loaded = True
@@ -32,12 +32,16 @@ class AuthenticationError(ProviderError):
 class RateLimitError(ProviderError):
     """超過請求限制"""
 
-    pass
+    def __init__(self, provider: str, message: str, retry_after: float = None):
+        self.status_code = 429
+        self.retry_after = retry_after  # 伺服器建議的等待秒數（Retry-After）
+        super().__init__(provider, message)
 
 
 class APIError(ProviderError):
     """API 回應錯誤"""
 
-    def __init__(self, provider: str, status_code: int, message: str):
+    def __init__(self, provider: str, status_code: int, message: str, retry_after: float = None):
         self.status_code = status_code
+        self.retry_after = retry_after
         super().__init__(provider, f"HTTP {status_code}: {message}")
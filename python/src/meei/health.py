@@ -0,0 +1,88 @@
+"""
+Provider 健康狀態 - 短暫記住剛失敗的 provider
+
+fallback 鏈（pv=["groq", "deepseek", "openai"]）在 provider 逾時、429 或 5xx
+時改用下一個 provider，並把失敗的 provider 標記為暫時不可用。冷卻期間內的
+後續請求會把它排到最後，不必再等一次逾時：
+    from meei.health import provider_health
+    provider_health.cooldown = 60  # 秒
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+
+import httpx
+
+from meei.exceptions import ProviderError
+
+# 預設冷卻秒數；伺服器給的 Retry-After 較長時以它為準，但不超過上限
+DEFAULT_COOLDOWN = 30.0
+MAX_COOLDOWN = 300.0
+
+
+class ProviderHealth:
+    """各 provider 的暫時不可用狀態（process 內共用）"""
+
+    def __init__(
+        self,
+        cooldown: float = DEFAULT_COOLDOWN,
+        failover_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+    ):
+        """
+        Args:
+            cooldown: 失敗後跳過該 provider 的秒數
+            failover_statuses: 要改用下一個 provider 的 HTTP 狀態碼
+        """
+        self.cooldown = cooldown
+        self.failover_statuses = failover_statuses
+        # provider -> 恢復時間（monotonic）
+        self._bad: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def should_failover(self, error: Exception) -> bool:
+        """此錯誤是否應改用下一個 provider"""
+        # 與重試不同，Retry-After 很長時正是該換 provider 的時候
+        if isinstance(error, ProviderError) and hasattr(error, "status_code"):
+            return error.status_code in self.failover_statuses
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+    def mark_bad(self, provider: str, error: Exception = None):
+        """標記 provider 暫時不可用"""
+        retry_after = getattr(error, "retry_after", None) or 0
+        cooldown = min(max(self.cooldown, retry_after), MAX_COOLDOWN)
+        until = time.monotonic() + cooldown
+        with self._lock:
+            self._bad[provider] = max(self._bad.get(provider, 0.0), until)
+
+    def mark_good(self, provider: str):
+        """provider 成功回應，清除不可用標記"""
+        with self._lock:
+            self._bad.pop(provider, None)
+
+    def bad_until(self, provider: str) -> float:
+        """不可用標記的到期時間，健康時為 0（可直接當排序 key）"""
+        until = self._bad.get(provider)
+        if until is None:
+            return 0.0
+        now = time.monotonic()
+        if until <= now:
+            with self._lock:
+                # 期間可能被重新標記，確認仍已過期才移除
+                if self._bad.get(provider, now) <= now:
+                    self._bad.pop(provider, None)
+            return 0.0
+        return until
+
+    def is_bad(self, provider: str) -> bool:
+        """provider 是否在冷卻中"""
+        return self.bad_until(provider) > 0
+
+    def clear(self):
+        """清除所有標記"""
+        with self._lock:
+            self._bad.clear()
+
+
+# 全域健康狀態
+provider_health = ProviderHealth()
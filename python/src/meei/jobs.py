@@ -0,0 +1,525 @@
+"""
+批次工作模組 - 大量 prompt 的可續跑批次執行
+
+    meei run-batch input.jsonl --pv deepseek --concurrency 64 --out results.jsonl
+
+輸入 JSONL 每行一筆（model/system/temperature/max_tokens 可逐筆覆寫）：
+    {"id": "a1", "prompt": "翻譯: hello"}
+    {"id": "a2", "messages": [{"role": "user", "content": "..."}], "max_tokens": 100}
+
+輸出 JSONL 依完成順序附加，line 是輸入檔的行號（從 0 開始）：
+    {"line": 0, "id": "a1", "output": "..."}
+    {"line": 1, "id": "a2", "error": "..."}
+
+輸入逐行讀取，同時只保留 concurrency 筆進行中的請求，記憶體用量與輸入大小
+無關。進度存在 <out>.ckpt：已完成的連續前綴（watermark）、之後零散完成的
+行號區間，以及當時輸出檔的長度。中斷（crash、Ctrl-C）後以相同參數重跑即可
+接續；checkpoint 之後才寫入的結果會從輸出檔補讀回來，已完成的行不會重送。
+
+OpenAI 可改用原生 Batch API（native=True）：上傳 batch 檔並等待完成後下載結果，
+batch id 也記錄在 checkpoint 中，重跑時會繼續等待而不是重新上傳。
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+# checkpoint 最短寫入間隔（秒）
+CHECKPOINT_INTERVAL = 2.0
+
+# OpenAI Batch API 單一 batch 的請求數上限
+NATIVE_MAX_REQUESTS = 50000
+NATIVE_COMPLETION_WINDOW = "24h"
+# Batch API 價格為一般請求的一半
+NATIVE_DISCOUNT = 0.5
+NATIVE_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+Progress = Callable[[int, Optional[int]], None]
+
+
+class Checkpoint:
+    """批次工作的進度"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        # 行號 < watermark 的都已完成
+        self.watermark = 0
+        # watermark 之後已完成的行號
+        self.done: Set[int] = set()
+        # 上次存檔時輸出檔的長度（bytes）
+        self.offset = 0
+        # 原生 batch 的狀態
+        self.native: Dict[str, Any] = {}
+        self._saved_at = 0.0
+
+    @classmethod
+    def load(cls, path: Path) -> "Checkpoint":
+        ckpt = cls(path)
+        if path.exists():
+            data = json.loads(path.read_text())
+            ckpt.watermark = data["watermark"]
+            ckpt.done = {line for start, end in data["done"] for line in range(start, end + 1)}
+            ckpt.offset = data["offset"]
+            ckpt.native = data.get("native", {})
+        return ckpt
+
+    def is_done(self, line: int) -> bool:
+        return line < self.watermark or line in self.done
+
+    def mark(self, line: int):
+        """標記一行完成，並推進 watermark"""
+        self.done.add(line)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self, offset: int):
+        """原子性地寫入 checkpoint"""
+        data = {
+            "watermark": self.watermark,
+            "done": _to_ranges(sorted(self.done)),
+            "offset": offset,
+            "native": self.native,
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+        self.offset = offset
+        self._saved_at = time.monotonic()
+
+    def due(self) -> bool:
+        """距離上次存檔是否已超過 CHECKPOINT_INTERVAL"""
+        return time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL
+
+
+def _to_ranges(lines: List[int]) -> List[Tuple[int, int]]:
+    """[1, 2, 3, 7] -> [(1, 3), (7, 7)]"""
+    ranges: List[Tuple[int, int]] = []
+    for line in lines:
+        if ranges and ranges[-1][1] == line - 1:
+            ranges[-1] = (ranges[-1][0], line)
+        else:
+            ranges.append((line, line))
+    return ranges
+
+
+def _recover(out_path: Path, ckpt: Checkpoint):
+    """
+    補讀 checkpoint 之後寫入輸出檔的結果，並截掉寫到一半的最後一行
+    """
+    if not out_path.exists():
+        if ckpt.offset:
+            raise RuntimeError(f"找不到輸出檔 {out_path}，請刪除 {ckpt.path} 後重新執行")
+        return
+
+    with open(out_path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < ckpt.offset:
+            raise RuntimeError(
+                f"輸出檔 {out_path} 比 checkpoint 記錄的短，請刪除 {ckpt.path} 後重新執行"
+            )
+
+        f.seek(ckpt.offset)
+        end = ckpt.offset
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                ckpt.mark(json.loads(raw)["line"])
+            except (ValueError, KeyError, TypeError):
+                break
+            end += len(raw)
+        f.truncate(end)
+
+
+def _read_input(path: Path) -> Iterator[Tuple[int, Any]]:
+    """
+    逐行讀取輸入，回傳 (行號, 資料)
+
+    空行回傳 (行號, None)，無法解析的行回傳 (行號, ValueError)。
+    """
+    with open(path, encoding="utf-8") as f:
+        for line, text in enumerate(f):
+            if not text.strip():
+                yield line, None
+                continue
+            try:
+                row = json.loads(text)
+                if not isinstance(row, dict) or not ("prompt" in row or "messages" in row):
+                    raise ValueError("每行需要 prompt 或 messages 欄位")
+            except ValueError as e:
+                yield line, ValueError(f"無法解析第 {line} 行: {e}")
+                continue
+            yield line, row
+
+
+def _messages(row: Dict[str, Any]) -> List[Dict[str, str]]:
+    if "messages" in row:
+        return row["messages"]
+    return [{"role": "user", "content": row["prompt"]}]
+
+
+def _result(line: int, row: Any, output: str = None, error: Exception = None) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"line": line}
+    if isinstance(row, dict) and "id" in row:
+        result["id"] = row["id"]
+    if error is not None:
+        result["error"] = str(error)
+    else:
+        result["output"] = output
+    return result
+
+
+class _Output:
+    """輸出檔與 checkpoint 的共同寫入點"""
+
+    def __init__(self, out_path: Path, ckpt: Checkpoint, on_progress: Optional[Progress]):
+        self.ckpt = ckpt
+        self.on_progress = on_progress
+        self.completed = 0
+        # 不緩衝：每筆結果寫完就落到檔案，tell() 也是精確的 byte 位置
+        self._file = open(out_path, "ab", buffering=0)
+
+    def write(self, result: Dict[str, Any]):
+        self._file.write((json.dumps(result, ensure_ascii=False) + "\n").encode())
+        self.ckpt.mark(result["line"])
+        self.completed += 1
+        if self.ckpt.due():
+            self.checkpoint()
+        if self.on_progress:
+            self.on_progress(self.completed, None)
+
+    def skip(self, line: int):
+        """沒有輸出的行（空行）直接標記完成"""
+        self.ckpt.mark(line)
+
+    def checkpoint(self):
+        os.fsync(self._file.fileno())
+        self.ckpt.save(self._file.tell())
+
+    def close(self):
+        self.checkpoint()
+        self._file.close()
+
+
+def run_batch(
+    input_path: str,
+    out_path: str,
+    pv: str = None,
+    model: str = None,
+    system: str = None,
+    temperature: float = None,
+    max_tokens: int = None,
+    concurrency: int = 8,
+    native: bool = False,
+    wait: bool = True,
+    poll_interval: float = 30.0,
+    on_progress: Progress = None,
+) -> int:
+    """
+    執行（或接續）批次工作
+
+    Args:
+        input_path: 輸入 JSONL
+        out_path: 輸出 JSONL（checkpoint 存在旁邊的 .ckpt）
+        pv: provider 名稱、fallback 鏈或 "auto"
+        concurrency: 同時進行的請求數
+        native: 使用 provider 原生的 Batch API（目前只有 OpenAI）
+        wait: native 模式下是否等待 batch 完成（False 時送出後即返回，重跑時繼續）
+        poll_interval: native 模式查詢 batch 狀態的間隔（秒）
+        on_progress: 每完成一筆呼叫 on_progress(本次完成數, None)
+
+    Returns:
+        本次完成的筆數
+    """
+    out = Path(out_path)
+    ckpt = Checkpoint.load(out.with_name(out.name + ".ckpt"))
+    _recover(out, ckpt)
+
+    output = _Output(out, ckpt, on_progress)
+    try:
+        if native:
+            _run_native(
+                Path(input_path), output, pv, model, system, temperature, max_tokens, wait, poll_interval
+            )
+        else:
+            asyncio.run(
+                _run_async(
+                    Path(input_path), output, pv, model, system, temperature, max_tokens, concurrency
+                )
+            )
+    finally:
+        # Ctrl-C 時也保留已完成的進度
+        output.close()
+
+    return output.completed
+
+
+async def _run_async(
+    input_path: Path,
+    output: _Output,
+    pv: Optional[str],
+    model: Optional[str],
+    system: Optional[str],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    concurrency: int,
+):
+    from meei.chat import chat
+    from meei.pool import http_pools
+
+    rows = ((line, row) for line, row in _read_input(input_path) if not output.ckpt.is_done(line))
+
+    async def worker():
+        # 所有 worker 共用同一個 generator，最多 concurrency 筆同時進行
+        for line, row in rows:
+            if row is None:
+                output.skip(line)
+                continue
+            if isinstance(row, Exception):
+                output.write(_result(line, row, error=row))
+                continue
+            try:
+                content = await chat.conversation_async(
+                    messages=_messages(row),
+                    pv=row.get("pv", pv),
+                    model=row.get("model", model),
+                    system=row.get("system", system),
+                    temperature=row.get("temperature", temperature),
+                    max_tokens=row.get("max_tokens", max_tokens),
+                )
+                output.write(_result(line, row, output=content))
+            except Exception as e:
+                output.write(_result(line, row, error=e))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        await http_pools.aclose_loop()
+
+
+def _run_native(
+    input_path: Path,
+    output: _Output,
+    pv: Optional[str],
+    model: Optional[str],
+    system: Optional[str],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    wait: bool,
+    poll_interval: float,
+):
+    """透過 provider 的 Batch API 執行"""
+    from meei.chat import chat
+
+    provider = chat._get_provider(pv or "openai")
+    if not provider.SUPPORTS_BATCH:
+        raise ValueError(f"{provider.PROVIDER_NAME} 不支援原生 Batch API")
+
+    batch_api = _BatchAPI(provider)
+    state = output.ckpt.native
+    state.setdefault("batches", [])
+
+    if not state.get("submitted"):
+        _submit_native(input_path, output, batch_api, model, system, temperature, max_tokens)
+
+    while True:
+        pending = [batch for batch in state["batches"] if not batch.get("collected")]
+        for batch in pending:
+            info = batch_api.get_batch(batch["id"])
+            if info["status"] in NATIVE_FINAL_STATUSES:
+                for file_id in (info.get("output_file_id"), info.get("error_file_id")):
+                    if file_id:
+                        _collect_native(batch_api, batch, file_id, output)
+                batch["collected"] = True
+                batch["status"] = info["status"]
+                output.checkpoint()
+
+        if not wait or all(batch.get("collected") for batch in state["batches"]):
+            return
+        time.sleep(poll_interval)
+
+
+def _submit_native(
+    input_path: Path,
+    output: _Output,
+    batch_api: "_BatchAPI",
+    model: Optional[str],
+    system: Optional[str],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+):
+    """把尚未送出的行分批寫成 batch 檔並上傳（每送出一批就存 checkpoint）"""
+    provider = batch_api.provider
+    state = output.ckpt.native
+    submitted_until = state.get("submitted_until", 0)
+    # 請求的模型（收結果時以它記錄用量）：整批的預設值，加上逐筆覆寫的行號 -> 模型
+    default_model = provider._resolve_model(model or provider.DEFAULT_MODEL)
+    overrides: Dict[str, str] = {}
+
+    fd, tmp_name = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        count = 0
+        last_line = submitted_until - 1
+        f = open(tmp, "w", encoding="utf-8")
+        for line, row in _read_input(input_path):
+            if line < submitted_until or output.ckpt.is_done(line):
+                continue
+            if row is None:
+                output.skip(line)
+                continue
+            if isinstance(row, Exception):
+                output.write(_result(line, row, error=row))
+                continue
+
+            messages, resolved = provider._prepare(
+                _messages(row), row.get("model", model), row.get("system", system)
+            )
+            payload = provider._build_payload(
+                messages=messages,
+                model=resolved,
+                temperature=row.get("temperature", temperature),
+                max_tokens=row.get("max_tokens", max_tokens),
+                stream=False,
+            )
+            # custom_id 帶上行號與原始 id
+            custom_id = f"{line}:{row['id']}" if "id" in row else str(line)
+            request = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": batch_api.endpoint(resolved),
+                "body": payload,
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+            last_line = line
+            if resolved != default_model:
+                overrides[str(line)] = resolved
+
+            if count >= NATIVE_MAX_REQUESTS:
+                f.close()
+                _upload_native(batch_api, tmp, state, last_line + 1, default_model, overrides)
+                output.checkpoint()
+                f = open(tmp, "w", encoding="utf-8")
+                count = 0
+                overrides = {}
+
+        f.close()
+        if count:
+            _upload_native(batch_api, tmp, state, last_line + 1, default_model, overrides)
+        state["submitted"] = True
+        output.checkpoint()
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _upload_native(
+    batch_api: "_BatchAPI",
+    path: Path,
+    state: Dict[str, Any],
+    submitted_until: int,
+    model: str,
+    overrides: Dict[str, str],
+):
+    batch_id = batch_api.create_batch(batch_api.upload(path))
+    batch: Dict[str, Any] = {"id": batch_id, "model": model}
+    if overrides:
+        batch["models"] = overrides
+    state["batches"].append(batch)
+    state["submitted_until"] = submitted_until
+
+
+def _collect_native(batch_api: "_BatchAPI", batch: Dict[str, Any], file_id: str, output: _Output):
+    """下載 batch 結果檔並寫入輸出"""
+    from meei.tracker import track
+
+    provider = batch_api.provider
+    for item in batch_api.iter_file(file_id):
+        line_text, _, row_id = item["custom_id"].partition(":")
+        line = int(line_text)
+        if output.ckpt.is_done(line):
+            continue
+        row = {"id": row_id} if row_id else {}
+
+        response = item.get("response") or {}
+        if response.get("status_code") == 200:
+            content, input_tokens, output_tokens, used_model = provider._parse_response(response["body"])
+            # 與一般請求相同，以請求的模型記錄（較舊的 checkpoint 沒有記錄時用回應中的模型）
+            requested = batch.get("models", {}).get(line_text) or batch.get("model") or used_model
+            track(
+                provider=provider.PROVIDER_NAME,
+                type="batch",
+                model=requested,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cost=provider._calculate_cost(input_tokens, output_tokens, requested) * NATIVE_DISCOUNT,
+                response_model=used_model if used_model != requested else None,
+            )
+            output.write(_result(line, row, output=content))
+        else:
+            error = item.get("error") or (response.get("body") or {}).get("error") or response
+            output.write(_result(line, row, error=Exception(json.dumps(error, ensure_ascii=False))))
+
+
+class _BatchAPI:
+    """OpenAI 相容的 Files + Batches API"""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.base_url = provider.base_url.rstrip("/")
+        # multipart 上傳不能帶 JSON 的 Content-Type
+        self.auth = {k: v for k, v in provider.headers.items() if k.lower() != "content-type"}
+
+    def endpoint(self, model: str) -> str:
+        """batch 檔中的 url（含 base_url 的路徑，例如 /v1/chat/completions）"""
+        return urlsplit(self.base_url).path + self.provider._endpoint(model, stream=False)
+
+    def _check(self, response):
+        if response.status_code != 200:
+            self.provider._handle_error(response)
+        return response
+
+    def upload(self, path: Path) -> str:
+        with open(path, "rb") as f:
+            response = self.provider.client.post(
+                f"{self.base_url}/files",
+                headers=self.auth,
+                data={"purpose": "batch"},
+                files={"file": (path.name, f, "application/jsonl")},
+            )
+        return self._check(response).json()["id"]
+
+    def create_batch(self, file_id: str) -> str:
+        response = self.provider.client.post(
+            f"{self.base_url}/batches",
+            headers=self.provider.headers,
+            json={
+                "input_file_id": file_id,
+                "endpoint": self.endpoint(self.provider.DEFAULT_MODEL),
+                "completion_window": NATIVE_COMPLETION_WINDOW,
+            },
+        )
+        return self._check(response).json()["id"]
+
+    def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        response = self.provider.client.get(f"{self.base_url}/batches/{batch_id}", headers=self.auth)
+        return self._check(response).json()
+
+    def iter_file(self, file_id: str) -> Iterator[Dict[str, Any]]:
+        """逐行讀取檔案內容（不整份載入記憶體）"""
+        with self.provider.client.stream(
+            "GET", f"{self.base_url}/files/{file_id}/content", headers=self.auth
+        ) as response:
+            if response.status_code != 200:
+                response.read()
+                self.provider._handle_error(response)
+            for text in response.iter_lines():
+                if text.strip():
+                    yield json.loads(text)
@@ -0,0 +1,196 @@
+"""
+HTTP 連線池 - process 內依 host 共用 httpx client
+
+所有 provider 實例（包括 deepseek()、openai() 等快捷函數每次建立的實例）
+共用同一個 host 的 client，重複呼叫不必重新做 TCP + TLS 握手。
+認證標頭每次請求帶上，client 本身不綁定任何 provider。
+
+調整設定（之後建立的 client 生效，已建立的可用 reset() 重建）：
+    from meei.pool import http_pools
+    http_pools.configure(max_connections=200, http2=True, read_timeout=300)
+    http_pools.configure("api.openai.com", max_keepalive_connections=50)
+
+測試時可以換成錄製 / 重播的 transport（見 meei.testing.use_cassette）。
+
+AsyncClient 綁定建立它的 event loop，所以非同步 client 依 event loop 分開保存。
+
+HTTP/2 需要安裝 h2（pip install "meei[http2]"），沒有安裝時使用 HTTP/1.1。
+"""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from typing import Any, Dict, Iterable
+from urllib.parse import urlsplit
+
+import httpx
+
+# 預設值
+DEFAULT_OPTIONS: Dict[str, Any] = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,  # 秒
+    "http2": False,
+    "connect_timeout": 10.0,
+    "read_timeout": 120.0,
+    "write_timeout": 30.0,
+    "pool_timeout": 30.0,  # 等待空閒連線的時間
+    # 自訂的 httpx transport（例如 meei.testing 的 CassetteTransport），None 表示一般網路連線
+    "transport": None,
+}
+
+
+def origin(url: str) -> str:
+    """URL 的 scheme://host[:port]，作為連線池的 key"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class ConnectionPools:
+    """依 host 共用的 httpx client"""
+
+    def __init__(self):
+        self._options: Dict[str, Any] = dict(DEFAULT_OPTIONS)
+        # host -> 覆寫的設定
+        self._host_options: Dict[str, Dict[str, Any]] = {}
+        self._clients: Dict[str, httpx.Client] = {}
+        # event loop -> {origin: AsyncClient}；loop 結束後自動釋放
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def configure(self, host: str = None, **options):
+        """
+        調整連線池設定
+
+        Args:
+            host: 只套用到此 host（例如 "api.openai.com"），None 表示全域預設
+            **options: DEFAULT_OPTIONS 中的欄位
+        """
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"未知的連線池設定: {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            if host is None:
+                self._options.update(options)
+            else:
+                self._host_options.setdefault(host, {}).update(options)
+
+    def options(self, url: str) -> Dict[str, Any]:
+        """此 URL 適用的設定"""
+        host = urlsplit(url).hostname
+        merged = dict(self._options)
+        merged.update(self._host_options.get(host, {}))
+        return merged
+
+    def _client_kwargs(self, url: str) -> Dict[str, Any]:
+        opts = self.options(url)
+        kwargs = {
+            "limits": httpx.Limits(
+                max_connections=opts["max_connections"],
+                max_keepalive_connections=opts["max_keepalive_connections"],
+                keepalive_expiry=opts["keepalive_expiry"],
+            ),
+            "timeout": httpx.Timeout(
+                connect=opts["connect_timeout"],
+                read=opts["read_timeout"],
+                write=opts["write_timeout"],
+                pool=opts["pool_timeout"],
+            ),
+            # h2 是選用套件
+            "http2": bool(opts["http2"]) and find_spec("h2") is not None,
+        }
+        if opts["transport"] is not None:
+            kwargs["transport"] = opts["transport"]
+        return kwargs
+
+    def get(self, url: str) -> httpx.Client:
+        """取得此 URL 所屬 host 的共用 client"""
+        key = origin(url)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = httpx.Client(**self._client_kwargs(url))
+        return client
+
+    def get_async(self, url: str) -> httpx.AsyncClient:
+        """取得目前 event loop 中此 host 的共用 AsyncClient"""
+        loop = asyncio.get_running_loop()
+        key = origin(url)
+        with self._lock:
+            clients = self._async_clients.get(loop)
+            if clients is None:
+                clients = self._async_clients[loop] = {}
+            client = clients.get(key)
+            if client is None:
+                client = clients[key] = httpx.AsyncClient(**self._client_kwargs(url))
+        return client
+
+    def warmup(self, urls: Iterable[str], connections: int = 1):
+        """
+        預先建立連線（每個 host connections 條），失敗時忽略
+
+        對 URL 送出 HEAD 請求：不論回應狀態碼，握手完成的連線都會留在池中。
+        """
+        targets = [url for url in dict.fromkeys(urls) for _ in range(max(1, connections))]
+        if not targets:
+            return
+
+        def touch(url: str):
+            try:
+                self.get(url).head(url)
+            except httpx.HTTPError:
+                pass
+
+        with ThreadPoolExecutor(max_workers=min(32, len(targets))) as executor:
+            list(executor.map(touch, targets))
+
+    async def warmup_async(self, urls: Iterable[str], connections: int = 1):
+        """warmup() 的非同步版本（預熱目前 event loop 的 AsyncClient）"""
+
+        async def touch(url: str):
+            try:
+                await self.get_async(url).head(url)
+            except httpx.HTTPError:
+                pass
+
+        await asyncio.gather(
+            *(touch(url) for url in dict.fromkeys(urls) for _ in range(max(1, connections)))
+        )
+
+    async def aclose_loop(self):
+        """關閉目前 event loop 的所有 AsyncClient"""
+        with self._lock:
+            clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    def reset(self):
+        """
+        關閉所有同步 client，下次使用時依目前設定重建
+
+        非同步 client 只能在各自的 event loop 中關閉，這裡只放掉參照。
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._async_clients = weakref.WeakKeyDictionary()
+        for client in clients:
+            client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """目前保存的 client"""
+        return {
+            "clients": sorted(self._clients),
+            "async_loops": len(self._async_clients),
+        }
+
+
+# 全域連線池
+http_pools = ConnectionPools()
@@ -0,0 +1,249 @@
+"""
+客戶端限流模組 - 每個 provider/model 的 RPM 與 TPM token bucket
+
+在送出請求前先等待額度，而不是撞到 429 才知道超速。預設不限流：
+    from meei.ratelimit import rate_limiter
+    rate_limiter.set_limit("openai", rpm=500, tpm=200_000)
+    rate_limiter.set_limit("openai", model="gpt-4o", rpm=100, tpm=30_000)
+
+同一台機器上多個 worker process 要共用額度時：
+    rate_limiter.use_sqlite()  # ~/.meei/ratelimit.db
+
+送出前以 payload 估算 token 數先扣額度，拿到實際用量後再補差額。
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Optional, List, Dict, Tuple
+
+from meei.crypto import MEEI_DIR
+
+RATELIMIT_DB_FILE = MEEI_DIR / "ratelimit.db"
+
+# 估算 token：平均每 4 個字元約 1 token，每則訊息另有固定開銷
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> int:
+    """估算一次請求會用掉的 token（輸入 + 最大輸出）"""
+    chars = 0
+    for msg in messages:
+        chars += len(msg.get("content") or "")
+    return chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages) + (max_tokens or 0)
+
+
+class MemoryBackend:
+    """單一 process 內的 bucket 狀態（threads 與 asyncio tasks 共用）"""
+
+    def __init__(self):
+        # key -> (level, updated_at)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, amount: float) -> float:
+        """
+        嘗試取出 amount，成功回傳 0，否則回傳需要等待的秒數（不扣額度）
+
+        bucket 每秒補充 capacity / 60。
+        """
+        rate = capacity / 60.0
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(key, (capacity, now))
+            level = min(capacity, level + (now - updated) * rate)
+            # 單次超過容量的請求，等到 bucket 滿了就放行
+            need = min(amount, capacity)
+            if level >= need:
+                self._buckets[key] = (level - amount, now)
+                return 0.0
+            self._buckets[key] = (level, now)
+            return (need - level) / rate
+
+    def adjust(self, key: str, capacity: float, delta: float):
+        """歸還（delta > 0）或追加扣除（delta < 0）額度"""
+        rate = capacity / 60.0
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(key, (capacity, now))
+            level = min(capacity, level + (now - updated) * rate + delta)
+            self._buckets[key] = (level, now)
+
+
+class SQLiteBackend:
+    """
+    多個 process 共用的 bucket 狀態
+
+    每次操作都在 BEGIN IMMEDIATE 交易中完成，SQLite 的檔案鎖保證原子性。
+    時間使用 wall clock，因為 monotonic 時鐘無法跨 process 比較。
+    """
+
+    def __init__(self, path=RATELIMIT_DB_FILE):
+        self._path = path
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            MEEI_DIR.mkdir(exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _update(self, key: str, capacity: float, fn) -> float:
+        conn = self._db()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT level, updated_at FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            level, updated = row if row else (capacity, now)
+            level = min(capacity, level + max(0.0, now - updated) * capacity / 60.0)
+            level, result = fn(level)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, level, updated_at) VALUES (?, ?, ?)",
+                (key, level, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def take(self, key: str, capacity: float, amount: float) -> float:
+        rate = capacity / 60.0
+        need = min(amount, capacity)
+
+        def fn(level):
+            if level >= need:
+                return level - amount, 0.0
+            return level, (need - level) / rate
+
+        return self._update(key, capacity, fn)
+
+    def adjust(self, key: str, capacity: float, delta: float):
+        self._update(key, capacity, lambda level: (min(capacity, level + delta), None))
+
+
+class Reservation:
+    """一次請求預先扣除的額度，拿到實際用量後用來補差額"""
+
+    __slots__ = ("key", "tokens", "tpm")
+
+    def __init__(self, key: str, tokens: int, tpm: Optional[int]):
+        self.key = key
+        self.tokens = tokens
+        self.tpm = tpm
+
+
+class RateLimiter:
+    """RPM / TPM 限流器"""
+
+    def __init__(self):
+        # (provider, model 或 None) -> (rpm, tpm)
+        self._limits: Dict[Tuple[str, Optional[str]], Tuple[Optional[int], Optional[int]]] = {}
+        self.backend = MemoryBackend()
+
+    def set_limit(self, provider: str, model: str = None, rpm: int = None, tpm: int = None):
+        """
+        設定限流；model 為 None 時套用到該 provider 所有未個別設定的模型
+
+        rpm/tpm 都是 None 時移除限制。
+        """
+        if rpm is None and tpm is None:
+            self._limits.pop((provider, model), None)
+        else:
+            self._limits[(provider, model)] = (rpm, tpm)
+
+    def use_sqlite(self, path=RATELIMIT_DB_FILE):
+        """改用 SQLite 儲存 bucket 狀態，讓同機多個 process 共用額度"""
+        self.backend = SQLiteBackend(path)
+
+    def use_memory(self):
+        """改回 process 內的記憶體狀態"""
+        self.backend = MemoryBackend()
+
+    def _lookup(self, provider: str, model: str) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+        """找出適用的限制，回傳 (bucket key, rpm, tpm)"""
+        if not self._limits:
+            return None, None, None
+        if (provider, model) in self._limits:
+            rpm, tpm = self._limits[(provider, model)]
+            return f"{provider}/{model}", rpm, tpm
+        if (provider, None) in self._limits:
+            rpm, tpm = self._limits[(provider, None)]
+            return provider, rpm, tpm
+        return None, None, None
+
+    def _try(self, key: str, rpm: Optional[int], tpm: Optional[int], tokens: int) -> float:
+        """同時取得 RPM 與 TPM 額度，回傳需要等待的秒數"""
+        if rpm:
+            wait = self.backend.take(f"{key}:rpm", rpm, 1)
+            if wait:
+                return wait
+        if tpm:
+            wait = self.backend.take(f"{key}:tpm", tpm, tokens)
+            if wait:
+                # 沒拿到 TPM 就把剛拿的 RPM 還回去
+                if rpm:
+                    self.backend.adjust(f"{key}:rpm", rpm, 1)
+                return wait
+        return 0.0
+
+    def acquire(self, provider: str, model: str, tokens: int) -> Optional[Reservation]:
+        """阻塞直到有額度；沒有設定限制時立即回傳 None"""
+        key, rpm, tpm = self._lookup(provider, model)
+        if key is None:
+            return None
+        while True:
+            wait = self._try(key, rpm, tpm, tokens)
+            if not wait:
+                return Reservation(key, tokens, tpm)
+            time.sleep(wait)
+
+    async def acquire_async(self, provider: str, model: str, tokens: int) -> Optional[Reservation]:
+        """acquire() 的非同步版本，等待時不阻塞 event loop"""
+        key, rpm, tpm = self._lookup(provider, model)
+        if key is None:
+            return None
+        while True:
+            if isinstance(self.backend, MemoryBackend):
+                wait = self._try(key, rpm, tpm, tokens)
+            else:
+                # SQLite 的交易可能要等其他 process 的檔案鎖，不在 event loop 中執行
+                wait = await asyncio.to_thread(self._try, key, rpm, tpm, tokens)
+            if not wait:
+                return Reservation(key, tokens, tpm)
+            await asyncio.sleep(wait)
+
+    def reconcile(self, reservation: Optional[Reservation], actual_tokens: int):
+        """以實際用量修正預估值（失敗的請求傳 0，全數歸還 token 額度）"""
+        if reservation is None or not reservation.tpm:
+            return
+        self.backend.adjust(
+            f"{reservation.key}:tpm", reservation.tpm, reservation.tokens - actual_tokens
+        )
+
+    async def reconcile_async(self, reservation: Optional[Reservation], actual_tokens: int):
+        """reconcile() 的非同步版本（SQLite 的交易在 thread 中執行）"""
+        if reservation is None or not reservation.tpm:
+            return
+        if isinstance(self.backend, MemoryBackend):
+            self.reconcile(reservation, actual_tokens)
+        else:
+            await asyncio.to_thread(self.reconcile, reservation, actual_tokens)
+
+
+# 全域限流器（預設無限制）
+rate_limiter = RateLimiter()
@@ -0,0 +1,141 @@
+"""
+重試模組 - 指數退避 + full jitter，遵守 Retry-After
+
+預設對 429、5xx、逾時與連線錯誤重試，最多 3 次嘗試。調整方式：
+    from meei.retry import retry_policy
+    retry_policy.max_attempts = 5
+
+或針對單一 provider：
+    provider.retry_policy = RetryPolicy(max_attempts=1)  # 關閉重試
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+import httpx
+
+from meei.exceptions import RateLimitError, APIError
+
+T = TypeVar("T")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析時為 None"""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryStats:
+    """單次請求的重試統計"""
+
+    __slots__ = ("retries", "wait")
+
+    def __init__(self):
+        self.retries = 0
+        self.wait = 0.0
+
+    @property
+    def wait_ms(self) -> int:
+        return int(self.wait * 1000)
+
+
+class RetryPolicy:
+    """重試策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30.0,
+        max_retry_after: float = 60.0,
+        retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+    ):
+        """
+        Args:
+            max_attempts: 最多嘗試次數（含第一次），1 表示不重試
+            backoff_base: 第一次重試的退避上限（秒），之後每次加倍
+            backoff_cap: 退避上限（秒）
+            max_retry_after: Retry-After 超過此秒數就不重試，直接拋出
+            retry_statuses: 要重試的 HTTP 狀態碼
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = retry_statuses
+
+    def is_retryable(self, error: Exception) -> bool:
+        """此錯誤是否值得重試"""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None and retry_after > self.max_retry_after:
+            return False
+
+        if isinstance(error, RateLimitError):
+            return 429 in self.retry_statuses
+        if isinstance(error, APIError):
+            return error.status_code in self.retry_statuses
+        # 逾時、連線中斷等暫時性網路錯誤
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+    def backoff(self, retries: int, error: Exception) -> float:
+        """第 retries 次重試前要等待的秒數"""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return retry_after
+        # full jitter: uniform(0, min(cap, base * 2^n))
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** retries)))
+
+    def _next_delay(self, error: Exception, stats: RetryStats) -> Optional[float]:
+        """要重試時回傳等待秒數，否則 None"""
+        if stats.retries + 1 >= self.max_attempts or not self.is_retryable(error):
+            return None
+        return self.backoff(stats.retries, error)
+
+    def call(self, fn: Callable[[], T], stats: RetryStats = None) -> T:
+        """執行 fn，失敗時依策略重試"""
+        stats = stats if stats is not None else RetryStats()
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._next_delay(e, stats)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            stats.retries += 1
+            stats.wait += delay
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]], stats: RetryStats = None) -> T:
+        """call() 的非同步版本"""
+        stats = stats if stats is not None else RetryStats()
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._next_delay(e, stats)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            stats.retries += 1
+            stats.wait += delay
+
+
+# 全域預設策略
+retry_policy = RetryPolicy()
@@ -0,0 +1,209 @@
+"""
+延遲感知路由 - 把請求送到目前最快的健康 provider
+
+每個 provider/model 在記憶體中維護延遲（以及串流的首 token 時間）的 EWMA 與
+最近樣本（用來算百分位數），第一次使用時從 tracker 最近的紀錄預熱（非同步的
+呼叫在 thread 中預熱），之後每次請求完成就更新。
+
+    from meei.routing import router
+    router.candidates = ["groq", "deepseek", ("openai", "4o-mini")]
+    router.max_cost = 0.01  # 單次請求估計花費上限（USD）
+
+    chat.ask("你好", pv="auto")
+
+pv="auto" 會把候選依估計延遲排序成一條 fallback 鏈：最快的先試，失敗時
+依序改用下一個。
+"""
+
+import asyncio
+import random
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from meei.health import provider_health
+
+# pv="auto" 的名稱
+AUTO = "auto"
+
+# EWMA 權重與每個 key 保留的樣本數
+DEFAULT_ALPHA = 0.2
+SAMPLE_SIZE = 256
+
+# 預熱時讀取的 tracker 紀錄範圍
+SEED_HOURS = 24
+SEED_LIMIT = 5000
+
+# 估算花費時，未指定 max_tokens 的預設輸出 token 數
+DEFAULT_OUTPUT_TOKENS = 512
+
+Hop = Tuple[str, Optional[str]]
+
+
+class LatencyStats:
+    """單一 provider/model 的延遲統計"""
+
+    __slots__ = ("ewma", "samples")
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self.ewma: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=sample_size)
+
+    def add(self, latency_ms: float, alpha: float):
+        if self.ewma is None:
+            self.ewma = float(latency_ms)
+        else:
+            self.ewma += alpha * (latency_ms - self.ewma)
+        self.samples.append(latency_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """最近樣本的第 p 百分位（nearest-rank），沒有樣本時為 None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+
+class LatencyEstimator:
+    """各 provider/model 的延遲估計（process 內共用）"""
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA, sample_size: int = SAMPLE_SIZE):
+        self.alpha = alpha
+        self.sample_size = sample_size
+        # (provider, model) -> 統計；model 為 None 的是整個 provider 的彙總
+        self._stats: Dict[Hop, LatencyStats] = {}
+        # 串流的首 token 時間，結構相同
+        self._ttft: Dict[Hop, LatencyStats] = {}
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    def _add(self, table: Dict[Hop, LatencyStats], provider: str, model: Optional[str], value: float):
+        """加入一筆樣本（呼叫端需持有 self._lock）"""
+        for key in ((provider, model), (provider, None)):
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = LatencyStats(self.sample_size)
+            stats.add(value, self.alpha)
+
+    def seed(self):
+        """從 tracker 最近的紀錄預熱（只執行一次）"""
+        if self._seeded:
+            return
+        with self._lock:
+            if self._seeded:
+                return
+            from meei.tracker import get_recent_latencies
+
+            try:
+                rows = get_recent_latencies(SEED_HOURS, SEED_LIMIT)
+            except Exception:
+                # 沒有可讀的用量資料庫時從零開始
+                rows = []
+            for provider, model, latency_ms, ttft_ms in rows:
+                self._add(self._stats, provider, model, latency_ms)
+                if ttft_ms is not None:
+                    self._add(self._ttft, provider, model, ttft_ms)
+            self._seeded = True
+
+    async def seed_async(self):
+        """seed() 的非同步版本（讀取用量資料庫時不阻塞 event loop）"""
+        if not self._seeded:
+            await asyncio.to_thread(self.seed)
+
+    def observe(
+        self, provider: str, model: Optional[str], latency_ms: float, ttft_ms: float = None
+    ):
+        """
+        記錄一次成功請求的延遲（串流另外記錄首 token 時間）
+
+        預熱前不記錄：這筆請求已寫入 tracker，預熱時會一併讀到。
+        """
+        if not self._seeded:
+            return
+        with self._lock:
+            self._add(self._stats, provider, model, latency_ms)
+            if ttft_ms is not None:
+                self._add(self._ttft, provider, model, ttft_ms)
+
+    def _get(self, provider: str, model: Optional[str], ttft: bool = False) -> Optional[LatencyStats]:
+        """找出統計，該 model 沒有資料時退回 provider 彙總"""
+        self.seed()
+        table = self._ttft if ttft else self._stats
+        return table.get((provider, model)) or table.get((provider, None))
+
+    def estimate(self, provider: str, model: Optional[str] = None) -> Optional[float]:
+        """估計延遲（EWMA，毫秒），沒有資料時為 None"""
+        stats = self._get(provider, model)
+        return stats.ewma if stats else None
+
+    def percentile(
+        self, provider: str, model: Optional[str] = None, p: float = 50, ttft: bool = False
+    ) -> Optional[float]:
+        """延遲（ttft=True 時為首 token 時間）的第 p 百分位（毫秒），沒有資料時為 None"""
+        stats = self._get(provider, model, ttft)
+        if stats is None:
+            return None
+        with self._lock:
+            return stats.percentile(p)
+
+    def clear(self):
+        """清除所有統計（下次使用時重新預熱）"""
+        with self._lock:
+            self._stats.clear()
+            self._ttft.clear()
+            self._seeded = False
+
+
+class Router:
+    """pv="auto" 的候選與排序規則"""
+
+    def __init__(self):
+        # "provider" 或 ("provider", "model")
+        self.candidates: List[Union[str, Tuple[str, str]]] = []
+        # 單次請求估計花費上限（USD），None 表示不限
+        self.max_cost: Optional[float] = None
+        # 偶爾先試一個不是最快的候選，讓它的延遲估計保持更新
+        self.explore = 0.05
+
+    def hops(self) -> List[Hop]:
+        """候選展開成 [(provider, model), ...]"""
+        if not self.candidates:
+            raise ValueError('pv="auto" 需要先設定 router.candidates')
+        return [(c, None) if isinstance(c, str) else (c[0], c[1]) for c in self.candidates]
+
+    def rank(self, hops: Sequence[Hop], cost: Callable[[str, Optional[str]], float] = None) -> List[Hop]:
+        """
+        依估計延遲排序候選
+
+        Args:
+            hops: [(provider, 解析後的 model), ...]
+            cost: 估計單次請求花費的函數，搭配 max_cost 過濾候選
+
+        冷卻中的 provider 排在最後；還沒有延遲資料的候選排在最前面，
+        讓它先被量測一次。
+        """
+        if self.max_cost is not None and cost is not None:
+            hops = [hop for hop in hops if cost(*hop) <= self.max_cost]
+            if not hops:
+                raise ValueError(f"沒有估計花費低於 {self.max_cost} 的候選 provider")
+
+        def key(hop: Hop):
+            estimate = latency_estimator.estimate(*hop)
+            return (provider_health.is_bad(hop[0]), estimate if estimate is not None else 0.0)
+
+        ranked = sorted(hops, key=key)
+
+        if len(ranked) > 1 and random.random() < self.explore:
+            healthy = [hop for hop in ranked[1:] if not provider_health.is_bad(hop[0])]
+            if healthy:
+                pick = random.choice(healthy)
+                ranked.remove(pick)
+                ranked.insert(0, pick)
+
+        return ranked
+
+
+# 全域實例
+latency_estimator = LatencyEstimator()
+router = Router()
@@ -0,0 +1,292 @@
+"""
+Single-flight - 合併同時進行的相同請求
+
+同一個請求（provider、model、messages、temperature、max_tokens 都相同）
+已經在進行中時，後到的呼叫不再送往上游，而是等待同一個結果；串流則由
+一條上游串流分送給所有訂閱者（後加入的訂閱者會先收到已產生的部分）。
+預設關閉：
+    from meei.singleflight import single_flight
+    single_flight.enable()
+
+只合併「同時」進行的請求，完成後不保留結果（要保留請用 meei.cache）。
+所有訂閱者都離開時，共用的上游串流會被關閉（不會在沒人讀的情況下讀完）。
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Generator, List, Optional, Tuple
+
+
+class _Flight:
+    """進行中的一般請求"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamFlight:
+    """進行中的串流：背景執行緒讀上游，訂閱者依序讀取共用的 chunk 列表"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+        # 目前的訂閱者數（由 SingleFlight 持有 _lock 時增減）
+        self.subscribers = 0
+        self.cancelled = False
+
+    def cancel(self):
+        """停止讀取上游（讀取執行緒在下一個 chunk 到達時關閉上游）"""
+        self.cancelled = True
+
+    def pump(self, stream: Generator[str, None, None], on_done: Callable[[], None]):
+        try:
+            for chunk in stream:
+                if self.cancelled:
+                    break
+                with self.cond:
+                    self.chunks.append(chunk)
+                    self.cond.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            # generator 只能在讀取它的執行緒中關閉
+            stream.close()
+            # 先移除 flight，之後的呼叫會送出新請求
+            on_done()
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def subscribe(self) -> Generator[str, None, None]:
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                pending = self.chunks[index:]
+                finished = self.done
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+            if finished and index >= len(self.chunks):
+                break
+        if self.error is not None:
+            raise self.error
+
+
+class _AsyncStreamFlight:
+    """_StreamFlight 的非同步版本（上游由同一個 event loop 的 task 讀取）"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        停止讀取上游（下一個 chunk 到達時關閉上游）
+
+        不取消 task：上游是被呼叫端關閉而不是被丟棄，provider 不應記錄為 wasted。
+        """
+        self.cancelled = True
+
+    async def pump(self, stream: AsyncGenerator[str, None], on_done: Callable[[], None]):
+        try:
+            async for chunk in stream:
+                if self.cancelled:
+                    break
+                self.chunks.append(chunk)
+                self.changed.set()
+        except BaseException as e:
+            self.error = e
+        finally:
+            await stream.aclose()
+            on_done()
+            self.done = True
+            self.changed.set()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                break
+            self.changed.clear()
+            # clear 之後再檢查一次，避免錯過剛加入的 chunk
+            if index >= len(self.chunks) and not self.done:
+                await self.changed.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class SingleFlight:
+    """相同請求的合併器"""
+
+    def __init__(self):
+        self.enabled = False
+        # 被合併（沒有送往上游）的呼叫數
+        self.coalesced = 0
+
+        self._flights: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        # AsyncClient 與 Future 都綁定 event loop，以 (loop, key) 區分
+        self._async_flights: Dict[Tuple[int, str], asyncio.Future] = {}
+        self._async_streams: Dict[Tuple[int, str], _AsyncStreamFlight] = {}
+        self._lock = threading.Lock()
+
+    def _discard(self, table: Dict, key: Any, flight: Any):
+        """flight 結束時從表中移除（只移除同一個 flight）"""
+        with self._lock:
+            if table.get(key) is flight:
+                del table[key]
+
+    def _leave(self, table: Dict, key: Any, flight: Any):
+        """訂閱者離開；最後一個離開且上游還沒結束時，移除 flight 並停止上游"""
+        with self._lock:
+            flight.subscribers -= 1
+            if flight.subscribers or flight.done:
+                return
+            if table.get(key) is flight:
+                del table[key]
+        flight.cancel()
+
+    def enable(self):
+        """開啟合併"""
+        self.enabled = True
+
+    def disable(self):
+        """關閉合併（進行中的請求不受影響）"""
+        self.enabled = False
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """執行 fn；相同 key 已在進行中時等待它的結果"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do() 的非同步版本"""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+
+        with self._lock:
+            future = self._async_flights.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._async_flights[flight_key] = loop.create_future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            await asyncio.wait([future])
+            if not future.cancelled():
+                return future.result()
+            # 帶頭的呼叫被取消（例如 hedged request 輸掉），自己送出
+            return await fn()
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 沒有其他人等待時不要留下「exception 未被取出」的警告
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_flights.pop(flight_key, None)
+
+    def stream(
+        self, key: str, open_stream: Callable[[], Generator[str, None, None]]
+    ) -> Generator[str, None, None]:
+        """
+        訂閱相同 key 的串流；沒有進行中的串流時開啟一條
+
+        與一般串流一樣，開始迭代時才送出請求。
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = self._streams[key] = _StreamFlight()
+                thread = threading.Thread(
+                    target=flight.pump,
+                    args=(open_stream(), lambda: self._discard(self._streams, key, flight)),
+                    daemon=True,
+                )
+                thread.start()
+            else:
+                self.coalesced += 1
+            flight.subscribers += 1
+
+        try:
+            yield from flight.subscribe()
+        finally:
+            self._leave(self._streams, key, flight)
+
+    async def stream_async(
+        self, key: str, open_stream: Callable[[], AsyncGenerator[str, None]]
+    ) -> AsyncGenerator[str, None]:
+        """stream() 的非同步版本"""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+
+        with self._lock:
+            flight = self._async_streams.get(flight_key)
+            if flight is None:
+                flight = self._async_streams[flight_key] = _AsyncStreamFlight()
+                # 保留 task 參照，避免被回收
+                flight.task = loop.create_task(
+                    flight.pump(
+                        open_stream(), lambda: self._discard(self._async_streams, flight_key, flight)
+                    )
+                )
+            else:
+                self.coalesced += 1
+            flight.subscribers += 1
+
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            self._leave(self._async_streams, flight_key, flight)
+
+
+# 全域實例（預設關閉）
+single_flight = SingleFlight()
@@ -0,0 +1,11 @@
+"""
+測試工具 - 不需要 API key 的可重現測試與壓測
+
+- FakeServer: 本地的 OpenAI 相容 / Gemini 假伺服器（延遲、串流速度、429、5xx）
+- use_cassette / CassetteTransport: 錄製真實回應，之後離線重播
+"""
+
+from meei.testing.cassette import CassetteError, CassetteTransport, use_cassette
+from meei.testing.server import FakeServer
+
+__all__ = ["FakeServer", "CassetteTransport", "CassetteError", "use_cassette"]
@@ -0,0 +1,326 @@
+"""
+錄製 / 重播 HTTP 回應（cassette）
+
+第一次執行時把真實 provider 的回應（包括串流的每個 chunk 與到達時間）錄進
+JSON 檔，之後重播同一份檔案，不需要 API key 也不會發出網路請求：
+
+    from meei.testing import use_cassette
+
+    with use_cassette("tests/cassettes/hello.json"):
+        chat.ask("你好", pv="openai")
+
+請求以 method + URL + body 比對；同一個請求錄了多次時依序重播，用完後重複
+最後一筆（方便拿一份錄製結果重複壓測）。realtime=True 時依錄製的時間送出
+chunk，重現原本的延遲與串流速度。
+
+Authorization 標頭與 Gemini 的 key 參數不會寫進檔案。
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+import httpx
+
+from meei.pool import http_pools
+
+# 檔案格式版本
+CASSETTE_VERSION = 1
+
+MODES = ("replay", "record", "auto")
+
+# 不寫進檔案的回應標頭
+_SKIP_HEADERS = {"set-cookie"}
+
+
+class CassetteError(httpx.TransportError):
+    """重播模式下找不到對應的錄製結果（與連線錯誤一樣由 transport 拋出，不會重試）"""
+
+    pass
+
+
+def _request_key(request: httpx.Request, body: bytes) -> str:
+    """請求的比對 key（不含 API key；multipart 的 boundary 是隨機的，不比對 body）"""
+    url = request.url.copy_remove_param("key")
+    if request.headers.get("content-type", "").startswith("multipart/"):
+        body = b""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), str(url).encode(), body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _encode_chunk(at: float, data: bytes) -> Dict[str, Any]:
+    try:
+        return {"at": round(at, 4), "text": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        # gzip 等壓縮過的內容
+        return {"at": round(at, 4), "base64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode_chunk(chunk: Dict[str, Any]) -> bytes:
+    if "base64" in chunk:
+        return base64.b64decode(chunk["base64"])
+    return chunk["text"].encode("utf-8")
+
+
+class _RecordingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """轉送上游的回應內容，同時記錄每個 chunk 與到達時間"""
+
+    def __init__(self, cassette: "CassetteTransport", entry: Dict[str, Any], stream: Any, start: float):
+        self._cassette = cassette
+        self._entry = entry
+        self._stream = stream
+        self._start = start
+        self._saved = False
+
+    def _add(self, data: bytes):
+        if data:
+            self._entry["chunks"].append(_encode_chunk(time.monotonic() - self._start, data))
+
+    def _finish(self):
+        # 讀完或提早關閉都保存，提早關閉時只有已讀到的部分
+        if not self._saved:
+            self._saved = True
+            self._cassette._append(self._entry)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for data in self._stream:
+            self._add(data)
+            yield data
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for data in self._stream:
+            self._add(data)
+            yield data
+
+    def close(self):
+        self._finish()
+        self._stream.close()
+
+    async def aclose(self):
+        self._finish()
+        await self._stream.aclose()
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """重播錄製的 chunk"""
+
+    def __init__(self, chunks: List[Dict[str, Any]], realtime: bool, start: float):
+        self._chunks = chunks
+        self._realtime = realtime
+        self._start = start
+
+    def _wait(self, chunk: Dict[str, Any]) -> float:
+        if not self._realtime:
+            return 0.0
+        return self._start + chunk["at"] - time.monotonic()
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._chunks:
+            wait = self._wait(chunk)
+            if wait > 0:
+                time.sleep(wait)
+            yield _decode_chunk(chunk)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in self._chunks:
+            wait = self._wait(chunk)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield _decode_chunk(chunk)
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    錄製 / 重播的 httpx transport（同步與非同步 client 都可使用）
+
+    Args:
+        path: cassette 檔案路徑
+        mode: "replay"（只重播，找不到時拋出 CassetteError）、
+              "record"（全部重新錄製）、"auto"（有錄製就重播，沒有才錄製）
+        realtime: 重播時依錄製的時間送出 chunk
+    """
+
+    def __init__(self, path: Union[str, Path], mode: str = "auto", realtime: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"不支援的 cassette 模式: {mode}，可用: {', '.join(MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self.realtime = realtime
+
+        self._interactions: List[Dict[str, Any]] = []
+        if mode != "record" and self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self._interactions = json.load(f).get("interactions", [])
+        # key -> 已重播的次數
+        self._cursors: Dict[str, int] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        self._inner: Optional[httpx.HTTPTransport] = None
+        # 上游的 AsyncHTTPTransport 綁定 event loop，依 loop 分開
+        self._async_inner: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # ===== 比對與保存 =====
+
+    def _find(self, key: str) -> Optional[Dict[str, Any]]:
+        """依序取出 key 的下一筆錄製結果"""
+        if self.mode == "record":
+            return None
+        with self._lock:
+            matches = [entry for entry in self._interactions if entry["key"] == key]
+            if not matches:
+                return None
+            index = self._cursors.get(key, 0)
+            if index >= len(matches):
+                if self.mode == "auto":
+                    # 這次執行的請求比錄製時多，補錄
+                    return None
+                index = len(matches) - 1
+            self._cursors[key] = index + 1
+            return matches[index]
+
+    def _append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._interactions.append(entry)
+            # 補錄的這筆算已重播過，同一個 key 之後的請求繼續補錄
+            self._cursors[entry["key"]] = self._cursors.get(entry["key"], 0) + 1
+            self._dirty = True
+
+    def save(self):
+        """有新的錄製結果時寫入檔案（先寫暫存檔再改名）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": CASSETTE_VERSION, "interactions": self._interactions},
+                    f,
+                    ensure_ascii=False,
+                    indent=1,
+                )
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    # ===== 請求處理 =====
+
+    def _prepare(self, request: httpx.Request, body: bytes):
+        """比對 key 與錄製用的紀錄（還沒有回應內容）"""
+        key = _request_key(request, body)
+        content_type = request.headers.get("content-type", "")
+        text = None
+        if body and not content_type.startswith("multipart/"):
+            try:
+                text = body.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        entry = {
+            "key": key,
+            "method": request.method,
+            "url": str(request.url.copy_remove_param("key")),
+            "request": text,
+            "status": None,
+            "headers": [],
+            "chunks": [],
+        }
+        return key, entry
+
+    def _replay(self, request: httpx.Request, recorded: Dict[str, Any], start: float) -> httpx.Response:
+        return httpx.Response(
+            recorded["status"],
+            headers=recorded["headers"],
+            stream=_ReplayStream(recorded["chunks"], self.realtime, start),
+            request=request,
+        )
+
+    def _recording(self, response: httpx.Response, entry: Dict[str, Any], start: float) -> httpx.Response:
+        entry["status"] = response.status_code
+        entry["headers"] = [
+            [name, value] for name, value in response.headers.multi_items() if name.lower() not in _SKIP_HEADERS
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(self, entry, response.stream, start),
+            extensions=response.extensions,
+        )
+
+    def _miss(self, request: httpx.Request):
+        url = request.url.copy_remove_param("key")
+        raise CassetteError(f"cassette {self.path} 中沒有此請求的錄製結果: {request.method} {url}")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        body = request.read()
+        key, entry = self._prepare(request, body)
+        recorded = self._find(key)
+        if recorded is not None:
+            return self._replay(request, recorded, start)
+        if self.mode == "replay":
+            self._miss(request)
+
+        if self._inner is None:
+            self._inner = httpx.HTTPTransport()
+        return self._recording(self._inner.handle_request(request), entry, start)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        body = await request.aread()
+        key, entry = self._prepare(request, body)
+        recorded = self._find(key)
+        if recorded is not None:
+            return self._replay(request, recorded, start)
+        if self.mode == "replay":
+            self._miss(request)
+
+        loop = asyncio.get_running_loop()
+        inner = self._async_inner.get(loop)
+        if inner is None:
+            inner = self._async_inner[loop] = httpx.AsyncHTTPTransport()
+        return self._recording(await inner.handle_async_request(request), entry, start)
+
+    def close(self):
+        # client 關閉時呼叫；transport 由多個 client 共用，之後仍可繼續使用
+        self.save()
+        if self._inner is not None:
+            self._inner.close()
+            self._inner = None
+
+    async def aclose(self):
+        self.save()
+        inner = self._async_inner.pop(asyncio.get_running_loop(), None)
+        if inner is not None:
+            await inner.aclose()
+
+
+@contextmanager
+def use_cassette(path: Union[str, Path], mode: str = "auto", realtime: bool = False):
+    """
+    在區塊內讓所有 provider 經由 cassette 收發請求
+
+    以 meei.pool 的 transport 設定套用，結束時保存錄製結果並還原原本的設定。
+    """
+    transport = CassetteTransport(path, mode, realtime)
+    previous = http_pools.options("")["transport"]
+    http_pools.configure(transport=transport)
+    http_pools.reset()
+    try:
+        yield transport
+    finally:
+        http_pools.configure(transport=previous)
+        http_pools.reset()
+        transport.save()
@@ -0,0 +1,571 @@
+"""
+本地假 provider 伺服器 - 不需要 API key 的可重現測試與壓測
+
+在背景執行緒跑一個 HTTP 伺服器，回應 OpenAI 相容（deepseek、openai、qwen、
+groq）與 Gemini 格式的請求，可模擬：
+- 固定延遲（+ 隨機抖動），串流時即為首 token 時間
+- 每秒 token 數（串流逐 token 送出，非串流等同樣的生成時間）
+- 429 爆發：每 burst_every 個請求中前 burst_length 個回 429 + Retry-After
+- 5xx：以 error_rate 的機率回 error_status（固定 seed，可重現）
+
+    from meei.testing import FakeServer
+
+    with FakeServer(latency=0.2, tokens_per_sec=50) as server:
+        server.install()  # 設定 <PROVIDER>_BASE_URL 與假的 API key
+        chat.ask("你好", pv="openai")
+
+meei config 中設定的 base_url 優先於環境變數，使用前請確認沒有設定。
+也支援 run-batch --native 用到的 Files + Batches API（batch 建立後立即完成）。
+"""
+
+import email.parser
+import email.policy
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# 產生回應文字用的詞（每個詞算一個 token）
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua"
+).split()
+
+DEFAULT_API_KEY = "fake-key"
+
+_GEMINI_PATH = re.compile(r"/models/([^/:]+):(generateContent|streamGenerateContent)$")
+_FILE_CONTENT_PATH = re.compile(r"/files/([^/]+)/content$")
+_BATCH_PATH = re.compile(r"/batches/([^/]+)$")
+
+# Gemini 錯誤回應的 status 欄位
+_GEMINI_STATUS = {
+    401: "UNAUTHENTICATED",
+    404: "NOT_FOUND",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+}
+
+
+def _count_tokens(text: str) -> int:
+    """粗估 token 數（約 4 字元一個 token）"""
+    return max(1, len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """單一連線的請求處理（實際邏輯在 FakeServer）"""
+
+    # HTTP/1.1 才能 keep-alive，讓連線池的行為與真實 provider 相同
+    protocol_version = "HTTP/1.1"
+    # 標頭與內容分開寫出，不關掉 Nagle 會多出 ~40ms 的 delayed ACK
+    disable_nagle_algorithm = True
+    server: "_HTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        # 連線池預熱用
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.fake._dispatch(self, "GET", b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.fake._dispatch(self, "POST", body)
+
+    def send_json(self, status: int, data: Any, headers: Dict[str, str] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, data: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def send_event(self, data: Any):
+        text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        payload = f"data: {text}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeServer"
+
+    def handle_error(self, request, client_address):
+        # 用戶端中途斷線（hedge 輸掉的一方、提早關閉的串流）是正常情況，不印 traceback
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeServer:
+    """模擬 OpenAI 相容與 Gemini API 的本地伺服器"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        tokens_per_sec: Optional[float] = None,
+        output_tokens: int = 32,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        burst_every: int = 0,
+        burst_length: int = 0,
+        retry_after: Optional[float] = 1.0,
+        reply: Optional[str] = None,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Args:
+            latency: 回應（串流為第一個 chunk）前等待的秒數
+            jitter: 額外加上 0 ~ jitter 秒的隨機延遲
+            tokens_per_sec: 生成速度，None 表示瞬間生成
+            output_tokens: 每次回應的 token 數（請求的 max_tokens 較小時以它為準）
+            error_rate: 回傳 error_status 的機率
+            error_status: 模擬的伺服器錯誤狀態碼
+            burst_every: 429 爆發的週期（請求數），0 表示只有最前面一次
+            burst_length: 每個週期開頭回 429 的請求數
+            retry_after: 429 回應的 Retry-After 秒數，None 表示不帶
+            reply: 固定的回應文字（取代產生的詞）
+            seed: 抖動與錯誤的亂數種子
+            host, port: 監聽位址，port=0 表示自動選擇
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.reply = reply
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+        self._stats = self._empty_stats()
+        # Files + Batches API 的資料（只存在記憶體中）
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+
+        self._httpd = _HTTPServer((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+        # install() 前的環境變數，stop() 時還原
+        self._saved_env: Dict[str, Optional[str]] = {}
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {
+            "requests": 0,
+            "streams": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "unauthorized": 0,
+            "output_tokens": 0,
+        }
+
+    # ===== 生命週期 =====
+
+    @property
+    def url(self) -> str:
+        """伺服器位址（http://host:port）"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        """在背景執行緒啟動伺服器"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止伺服器並還原 install() 改過的環境變數"""
+        self.uninstall()
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ===== 接到 meei =====
+
+    @staticmethod
+    def _provider_classes(providers: Iterable[str] = None) -> List[type]:
+        from meei.chat import PROVIDERS, get_provider_class
+
+        classes = []
+        for pv in providers or PROVIDERS:
+            cls = get_provider_class(pv)
+            if cls not in classes:
+                classes.append(cls)
+        return classes
+
+    def base_url(self, provider: str) -> str:
+        """provider 指向此伺服器的 base_url（保留原本的路徑，例如 /v1）"""
+        return self._base_url(self._provider_classes([provider])[0])
+
+    def _base_url(self, cls: type) -> str:
+        return self.url + urlsplit(cls.BASE_URL).path.rstrip("/")
+
+    def env(self, providers: Iterable[str] = None, api_key: str = DEFAULT_API_KEY) -> Dict[str, str]:
+        """把 provider 指向此伺服器所需的環境變數"""
+        from meei.chat.base import ENV_KEY_MAP
+
+        env = {}
+        for cls in self._provider_classes(providers):
+            name = cls.PROVIDER_NAME
+            env[f"{name.upper()}_BASE_URL"] = self._base_url(cls)
+            env[ENV_KEY_MAP.get(name, f"{name.upper()}_API_KEY")] = api_key
+        return env
+
+    def install(self, providers: Iterable[str] = None, api_key: str = DEFAULT_API_KEY):
+        """設定環境變數，讓 provider（預設全部）改連此伺服器"""
+        for name, value in self.env(providers, api_key).items():
+            if name not in self._saved_env:
+                self._saved_env[name] = os.environ.get(name)
+            os.environ[name] = value
+
+    def uninstall(self):
+        """還原 install() 改過的環境變數"""
+        for name, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self._saved_env.clear()
+
+    # ===== 統計 =====
+
+    def stats(self) -> Dict[str, int]:
+        """收到的請求統計"""
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        """清除統計並重新開始 429 爆發的計數"""
+        with self._lock:
+            self._stats = self._empty_stats()
+            self._count = 0
+
+    def _bump(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    # ===== 請求處理 =====
+
+    def _dispatch(self, handler: _Handler, method: str, body: bytes):
+        parts = urlsplit(handler.path)
+        path = parts.path
+        query = parse_qs(parts.query)
+
+        try:
+            if method == "POST" and path.endswith("/chat/completions"):
+                if not handler.headers.get("Authorization"):
+                    return self._unauthorized(handler, gemini=False)
+                return self._chat_openai(handler, json.loads(body or b"{}"))
+
+            match = _GEMINI_PATH.search(path)
+            if method == "POST" and match:
+                if not (query.get("key") or handler.headers.get("x-goog-api-key")):
+                    return self._unauthorized(handler, gemini=True)
+                stream = match.group(2) == "streamGenerateContent"
+                return self._chat_gemini(handler, match.group(1), json.loads(body or b"{}"), stream)
+
+            if method == "POST" and path.endswith("/files"):
+                return self._upload_file(handler, body)
+            match = _FILE_CONTENT_PATH.search(path)
+            if method == "GET" and match:
+                return self._file_content(handler, match.group(1))
+            if method == "POST" and path.endswith("/batches"):
+                return self._create_batch(handler, json.loads(body or b"{}"))
+            match = _BATCH_PATH.search(path)
+            if method == "GET" and match:
+                return self._get_batch(handler, match.group(1))
+
+            handler.send_json(404, {"error": {"message": f"unknown path: {path}", "code": 404}})
+        except (BrokenPipeError, ConnectionResetError):
+            # 客戶端中途斷線（例如 hedged request 輸掉被取消）
+            pass
+
+    def _unauthorized(self, handler: _Handler, gemini: bool):
+        self._bump("unauthorized")
+        self._send_error(handler, 401, "missing API key", gemini)
+
+    def _fault(self) -> Tuple[Optional[int], float]:
+        """決定這個請求的錯誤狀態碼（None 表示成功）與延遲"""
+        with self._lock:
+            n = self._count
+            self._count += 1
+            self._stats["requests"] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.burst_length and (
+                n % self.burst_every < self.burst_length if self.burst_every else n < self.burst_length
+            ):
+                self._stats["rate_limited"] += 1
+                return 429, delay
+            if self.error_rate and self._random.random() < self.error_rate:
+                self._stats["errors"] += 1
+                return self.error_status, delay
+        return None, delay
+
+    def _send_error(self, handler: _Handler, status: int, message: Optional[str], gemini: bool):
+        headers = {}
+        if message is None:
+            message = "rate limit exceeded (simulated)" if status == 429 else "server error (simulated)"
+        if status == 429 and self.retry_after is not None:
+            headers["Retry-After"] = f"{self.retry_after:g}"
+        if gemini:
+            error = {"code": status, "message": message, "status": _GEMINI_STATUS.get(status, "UNKNOWN")}
+        else:
+            error = {"message": message, "type": "rate_limit_error" if status == 429 else "server_error", "code": status}
+        handler.send_json(status, {"error": error}, headers)
+
+    def _words(self, max_tokens: Optional[int]) -> List[str]:
+        """回應的 token 列表"""
+        if self.reply is not None:
+            words = self.reply.split(" ")
+            return [w if i == 0 else " " + w for i, w in enumerate(words)]
+        count = self.output_tokens if not max_tokens else min(self.output_tokens, max_tokens)
+        return [("" if i == 0 else " ") + WORDS[i % len(WORDS)] for i in range(count)]
+
+    def _generate(self, words: List[str], stream_chunk: Callable[[str], None]):
+        """依 tokens_per_sec 的節奏逐 token 呼叫 stream_chunk"""
+        start = time.monotonic()
+        for i, word in enumerate(words):
+            if self.tokens_per_sec:
+                wait = start + i / self.tokens_per_sec - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            stream_chunk(word)
+        self._bump("output_tokens", len(words))
+
+    def _wait_generation(self, count: int):
+        """非串流回應等待與串流相同的生成時間"""
+        if self.tokens_per_sec and count > 1:
+            time.sleep((count - 1) / self.tokens_per_sec)
+        self._bump("output_tokens", count)
+
+    # ----- OpenAI 相容 -----
+
+    @staticmethod
+    def _openai_completion(payload: Dict[str, Any], text: str, output_tokens: int) -> Dict[str, Any]:
+        prompt = "".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        input_tokens = _count_tokens(prompt)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    def _chat_openai(self, handler: _Handler, payload: Dict[str, Any]):
+        status, delay = self._fault()
+        time.sleep(delay)
+        if status is not None:
+            return self._send_error(handler, status, None, gemini=False)
+
+        words = self._words(payload.get("max_tokens") or payload.get("max_completion_tokens"))
+        if not payload.get("stream"):
+            self._wait_generation(len(words))
+            return handler.send_json(200, self._openai_completion(payload, "".join(words), len(words)))
+
+        self._bump("streams")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = payload.get("model", "fake")
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        handler.start_stream()
+        self._generate(words, lambda word: handler.send_event(chunk({"content": word})))
+        handler.send_event(chunk({}, "stop"))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            usage = self._openai_completion(payload, "", len(words))["usage"]
+            handler.send_event({**chunk({}), "choices": [], "usage": usage})
+        handler.send_event("[DONE]")
+        handler.end_stream()
+
+    # ----- Gemini -----
+
+    @staticmethod
+    def _gemini_response(payload: Dict[str, Any], model: str, text: str, output_tokens: int) -> Dict[str, Any]:
+        prompt = "".join(
+            part.get("text", "")
+            for content in payload.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        input_tokens = _count_tokens(prompt)
+        return {
+            "candidates": [
+                {"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}
+            ],
+            "usageMetadata": {
+                "promptTokenCount": input_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": input_tokens + output_tokens,
+            },
+            "modelVersion": model,
+        }
+
+    def _chat_gemini(self, handler: _Handler, model: str, payload: Dict[str, Any], stream: bool):
+        status, delay = self._fault()
+        time.sleep(delay)
+        if status is not None:
+            return self._send_error(handler, status, None, gemini=True)
+
+        words = self._words((payload.get("generationConfig") or {}).get("maxOutputTokens"))
+        if not stream:
+            self._wait_generation(len(words))
+            return handler.send_json(200, self._gemini_response(payload, model, "".join(words), len(words)))
+
+        self._bump("streams")
+        sent = [0]
+
+        def send(word: str):
+            # 與 Gemini 相同：每個 chunk 都帶目前為止的用量
+            sent[0] += 1
+            handler.send_event(self._gemini_response(payload, model, word, sent[0]))
+
+        handler.start_stream()
+        self._generate(words, send)
+        handler.end_stream()
+
+    # ----- Files + Batches -----
+
+    def _upload_file(self, handler: _Handler, body: bytes):
+        content_type = handler.headers.get("Content-Type", "")
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        data, filename = b"", "upload.jsonl"
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                data = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._files[file_id] = data
+        handler.send_json(
+            200,
+            {"id": file_id, "object": "file", "bytes": len(data), "filename": filename, "purpose": "batch"},
+        )
+
+    def _file_content(self, handler: _Handler, file_id: str):
+        data = self._files.get(file_id)
+        if data is None:
+            return handler.send_json(404, {"error": {"message": f"no such file: {file_id}", "code": 404}})
+        handler.send_bytes(data, "application/jsonl")
+
+    def _create_batch(self, handler: _Handler, payload: Dict[str, Any]):
+        data = self._files.get(payload.get("input_file_id"))
+        if data is None:
+            return handler.send_json(400, {"error": {"message": "input_file_id not found", "code": 400}})
+
+        # 不模擬延遲與錯誤，建立後立即完成
+        lines = []
+        for text in data.decode("utf-8").splitlines():
+            if not text.strip():
+                continue
+            item = json.loads(text)
+            body = item.get("body") or {}
+            words = self._words(body.get("max_tokens") or body.get("max_completion_tokens"))
+            self._bump("output_tokens", len(words))
+            response = self._openai_completion(body, "".join(words), len(words))
+            lines.append(
+                json.dumps(
+                    {
+                        "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                        "custom_id": item.get("custom_id"),
+                        "response": {"status_code": 200, "request_id": response["id"], "body": response},
+                        "error": None,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:12]}",
+            "object": "batch",
+            "endpoint": payload.get("endpoint"),
+            "input_file_id": payload.get("input_file_id"),
+            "completion_window": payload.get("completion_window"),
+            "status": "completed",
+            "output_file_id": output_id,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+        }
+        with self._lock:
+            self._files[output_id] = ("\n".join(lines) + "\n").encode("utf-8")
+            self._batches[batch["id"]] = batch
+        handler.send_json(200, batch)
+
+    def _get_batch(self, handler: _Handler, batch_id: str):
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            return handler.send_json(404, {"error": {"message": f"no such batch: {batch_id}", "code": 404}})
+        handler.send_json(200, batch)
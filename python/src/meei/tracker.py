@@ -1,46 +1,777 @@
 """
 用量追蹤模組 - SQLite 記錄每次 API 調用
+
+寫入採 write-behind：track() 只把資料列放進有界佇列，
+由背景執行緒批次 executemany 寫入（單一長連線、WAL 模式），
+請求延遲不再包含磁碟 I/O。
+
+資料表結構有版本（schema_version 表），開啟資料庫時依序套用尚未執行的
+migration，舊資料庫會就地升級。時間欄位 ts 是 UTC epoch 毫秒整數。
+
+寫入原始紀錄的同一個 transaction 也會更新每小時彙總（usage_hourly，依
+hour、provider、model、type 分組），摘要查詢只讀彙總，成本與資料列數無關。
+彙總與原始紀錄不一致時可用 rebuild_rollups()（meei usage rebuild）重建。
+
+延遲與首 token 時間另外以固定的對數分桶直方圖（每小時一份）保存，可跨
+時間範圍直接相加，get_latency_percentiles() 不必排序原始紀錄。
+
+原始紀錄可以只保留最近 N 天（prune_usage()，meei usage prune）：過期的資料列
+先依月份附加到 ~/.meei/archive/ 的 JSONL.gz 再刪除，彙總與直方圖永久保留。
+
+prompt 以內容雜湊存在 prompts 表，相同的 prompt（例如重複使用的範本）只存一份，
+usage 只保存參照；可選擇 zlib 壓縮，並依 provider 關閉保存或遮蔽（prompt_storage）。
 """
 
+import atexit
+import gzip
+import hashlib
+import json
+import math
+import os
+import queue
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any, Tuple, Union
 from contextlib import contextmanager
 
 from meei.crypto import MEEI_DIR
 
 DB_FILE = MEEI_DIR / "meei.db"
+ARCHIVE_DIR = MEEI_DIR / "archive"
+
+# 批次寫入設定
+QUEUE_SIZE = 10000  # 佇列上限，滿了 track() 直接丟棄該筆並計數（不阻塞請求）
+BATCH_SIZE = 200  # 累積多少筆就寫入
+FLUSH_INTERVAL = 1.0  # 最多等幾秒就寫入
+REOPEN_INTERVAL = 30.0  # 資料庫開不起來時，隔幾秒再試（期間的紀錄會被丟棄）
+
+# 保留與封存
+DEFAULT_RETENTION_DAYS = 90
+PRUNE_BATCH = 5000  # 每次封存並刪除的列數（一個 gzip member、一個 transaction）
+VACUUM_STEP = 1000  # 每次 incremental_vacuum 釋放的頁數，讓寫入執行緒可以穿插
+
+# prompt 保存
+PROMPT_MAX_CHARS = 500  # 只存前幾個字
+COMPRESS_MIN_BYTES = 128  # 短於此長度的 prompt 壓縮不划算
+
+# track() 放進佇列的資料列中各欄位的位置。寫入時 prompt 文字才換成 prompts 表的
+# 參照（移到最後一欄），所以和 _INSERT_SQL 的欄位順序不同
+_ROW_TS, _ROW_PROVIDER, _ROW_MODEL = 0, 1, 2
+_ROW_SUCCESS, _ROW_LATENCY, _ROW_PROMPT = 8, 9, 10
+_ROW_CACHED, _ROW_TTFT, _ROW_WASTED = 12, 13, 17
+
+_INSERT_SQL = """
+    INSERT INTO usage (
+        ts, provider, model, type,
+        input_tokens, output_tokens, total_tokens,
+        cost, success, latency_ms, error, cached,
+        ttft_ms, tokens_per_sec, retries, retry_wait_ms, wasted, response_model, prompt_hash
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 讀取原始紀錄時一併取出 prompt 內容（舊資料的 prompt 欄位仍可能有值）
+_SELECT_USAGE_SQL = """
+    SELECT usage.*, prompts.content AS prompt_content, prompts.compressed AS prompt_compressed
+    FROM usage LEFT JOIN prompts ON prompts.hash = usage.prompt_hash
+"""
+
+# 每小時彙總的欄位（hour、provider、model、type 之後），與 _rollup() 的順序相同
+_ROLLUP_COLUMNS = (
+    "requests",
+    "success_count",
+    "input_tokens",
+    "output_tokens",
+    "total_tokens",
+    "cost",
+    "latency_sum",  # 非快取請求的延遲總和
+    "latency_count",
+    "ttft_sum",
+    "ttft_count",
+    "tps_sum",
+    "tps_count",
+    "cache_hits",
+    "retries",
+    "retry_wait_ms",
+    "wasted",
+    "wasted_cost",
+)
+
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# 延遲直方圖：第 b 桶（b >= 1）涵蓋 [GROWTH^(b-1), GROWTH^b) 毫秒，相對誤差約 ±4.5%；
+# 第 0 桶為 1ms 以下，最後一桶收超過約 1 小時的值
+HIST_GROWTH = 2 ** (1 / 8)
+HIST_BUCKETS = 1 + math.ceil(math.log(3600 * 1000, HIST_GROWTH))
+_LOG_GROWTH = math.log(HIST_GROWTH)
+
+_ROLLUP_UPSERT_SQL = f"""
+    INSERT INTO usage_hourly (hour, provider, model, type, {", ".join(_ROLLUP_COLUMNS)})
+    VALUES ({", ".join("?" * (4 + len(_ROLLUP_COLUMNS)))})
+    ON CONFLICT (hour, provider, model, type) DO UPDATE SET
+        {", ".join(f"{c} = {c} + excluded.{c}" for c in _ROLLUP_COLUMNS)}
+"""
+
+# 從原始紀錄重建 ts >= ? 的彙總（model 為 NULL 時存成 ''，才能當主鍵）
+_ROLLUP_REBUILD_SQL = f"""
+    INSERT INTO usage_hourly (hour, provider, model, type, {", ".join(_ROLLUP_COLUMNS)})
+    SELECT
+        ts / {HOUR_MS} AS bucket,
+        provider,
+        COALESCE(model, '') AS model_key,
+        type,
+        COUNT(*),
+        SUM(success),
+        SUM(input_tokens),
+        SUM(output_tokens),
+        SUM(total_tokens),
+        SUM(cost),
+        SUM(CASE WHEN cached = 0 THEN latency_ms ELSE 0 END),
+        SUM(CASE WHEN cached = 0 THEN 1 ELSE 0 END),
+        COALESCE(SUM(ttft_ms), 0),
+        COUNT(ttft_ms),
+        COALESCE(SUM(tokens_per_sec), 0),
+        COUNT(tokens_per_sec),
+        SUM(cached),
+        SUM(retries),
+        SUM(retry_wait_ms),
+        SUM(wasted),
+        SUM(CASE WHEN wasted = 1 THEN cost ELSE 0 END)
+    FROM usage
+    WHERE ts >= ?
+    GROUP BY bucket, provider, model_key, type
+"""
+
+_HIST_UPSERT_SQL = """
+    INSERT INTO usage_latency_hist (provider, model, metric, hour, bucket, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (provider, model, hour, metric, bucket) DO UPDATE SET count = count + excluded.count
+"""
+
+# 直方圖只記成功、非快取、沒有被取消的請求（這些請求的延遲不代表 provider 的速度）
+_HIST_REBUILD_SQL = f"""
+    INSERT INTO usage_latency_hist (provider, model, metric, hour, bucket, count)
+    SELECT provider, COALESCE(model, '') AS model_key, 'latency', ts / {HOUR_MS} AS bucket_hour,
+        meei_hist_bucket(latency_ms) AS b, COUNT(*)
+    FROM usage
+    WHERE ts >= ? AND success = 1 AND cached = 0 AND wasted = 0
+    GROUP BY provider, model_key, bucket_hour, b
+    UNION ALL
+    SELECT provider, COALESCE(model, '') AS model_key, 'ttft', ts / {HOUR_MS} AS bucket_hour,
+        meei_hist_bucket(ttft_ms) AS b, COUNT(*)
+    FROM usage
+    WHERE ts >= ? AND success = 1 AND cached = 0 AND wasted = 0 AND ttft_ms IS NOT NULL
+    GROUP BY provider, model_key, bucket_hour, b
+"""
+
+# 第 1 版之後陸續新增的欄位（沒有版本紀錄的舊資料庫以 ALTER TABLE 補上）
+_EXTRA_COLUMNS = {
+    "cached": "INTEGER DEFAULT 0",
+    "ttft_ms": "INTEGER",  # 串流的首 token 延遲，非串流為 NULL
+    "tokens_per_sec": "REAL",
+    "retries": "INTEGER DEFAULT 0",
+    "retry_wait_ms": "INTEGER DEFAULT 0",
+    "wasted": "INTEGER DEFAULT 0",
+}
+
+_db_ready = False
+_db_lock = threading.Lock()
+
+
+def _now_ms() -> int:
+    """目前時間（UTC epoch 毫秒）"""
+    return int(time.time() * 1000)
+
+
+def _since_ms(**delta) -> int:
+    """現在往前 delta（timedelta 參數）的 epoch 毫秒"""
+    return _now_ms() - int(timedelta(**delta).total_seconds() * 1000)
+
+
+def _hist_bucket(ms: float) -> int:
+    """毫秒數所屬的直方圖分桶"""
+    if ms is None or ms < 1:
+        return 0
+    return min(HIST_BUCKETS - 1, 1 + int(math.log(ms) / _LOG_GROWTH))
+
+
+def _hist_value(bucket: int) -> float:
+    """分桶的代表值（上下界的幾何平均）"""
+    if bucket <= 0:
+        return 0.0
+    return HIST_GROWTH ** (bucket - 0.5)
+
+
+def _prompt_hash(text: str) -> int:
+    """prompt 的內容雜湊（64 位元，直接當 prompts 表的 rowid）"""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _decode_prompt(content: Union[str, bytes], compressed: int) -> str:
+    """還原 prompts 表中的內容"""
+    if compressed:
+        return zlib.decompress(content).decode("utf-8")
+    return content
+
+
+def _connect(**kwargs) -> sqlite3.Connection:
+    """開啟資料庫並註冊 SQL 中用到的函數"""
+    conn = sqlite3.connect(DB_FILE, **kwargs)
+    conn.create_function("meei_hist_bucket", 1, _hist_bucket, deterministic=True)
+    conn.create_function("meei_prompt_hash", 1, _prompt_hash, deterministic=True)
+    return conn
+
+
+def _migrate_v1(conn: sqlite3.Connection):
+    """第 1 版：原本的 usage 表（timestamp 為本地時間的 ISO 文字）"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            model TEXT,
+            type TEXT NOT NULL,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            total_tokens INTEGER DEFAULT 0,
+            cost REAL DEFAULT 0,
+            success INTEGER DEFAULT 1,
+            latency_ms INTEGER DEFAULT 0,
+            prompt TEXT,
+            error TEXT
+        )
+    """)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(usage)")}
+    for name, definition in _EXTRA_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE usage ADD COLUMN {name} {definition}")
+
+
+def _migrate_v2(conn: sqlite3.Connection):
+    """
+    第 2 版：timestamp 文字改為 ts 整數（UTC epoch 毫秒），並換成複合索引
+
+    SQLite 不能直接改欄位型別，重建資料表後把舊資料轉換複製過去。
+    舊的 timestamp 是 datetime.now() 的本地時間，以 'utc' 修飾轉成 UTC。
+    """
+    conn.execute("ALTER TABLE usage RENAME TO usage_v1")
+    conn.execute("""
+        CREATE TABLE usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            provider TEXT NOT NULL,
+            model TEXT,
+            type TEXT NOT NULL,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            total_tokens INTEGER DEFAULT 0,
+            cost REAL DEFAULT 0,
+            success INTEGER DEFAULT 1,
+            latency_ms INTEGER DEFAULT 0,
+            prompt TEXT,
+            error TEXT,
+            cached INTEGER DEFAULT 0,
+            ttft_ms INTEGER,
+            tokens_per_sec REAL,
+            retries INTEGER DEFAULT 0,
+            retry_wait_ms INTEGER DEFAULT 0,
+            wasted INTEGER DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        INSERT INTO usage (
+            id, ts, provider, model, type,
+            input_tokens, output_tokens, total_tokens,
+            cost, success, latency_ms, prompt, error, cached,
+            ttft_ms, tokens_per_sec, retries, retry_wait_ms, wasted
+        )
+        SELECT
+            id,
+            COALESCE(CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER), 0),
+            provider, model, type,
+            input_tokens, output_tokens, total_tokens,
+            cost, success, latency_ms, prompt, error, cached,
+            ttft_ms, tokens_per_sec, retries, retry_wait_ms, wasted
+        FROM usage_v1
+        ORDER BY id
+    """)
+    conn.execute("DROP TABLE usage_v1")
+
+    # 時間範圍查詢與最近請求
+    conn.execute("CREATE INDEX idx_usage_ts ON usage(ts)")
+    # 依 provider / model 篩選的時間範圍查詢
+    conn.execute("CREATE INDEX idx_usage_provider_model_ts ON usage(provider, model, ts)")
+    # 路由預熱（get_recent_latencies）只需要讀索引，不必回表
+    conn.execute("""
+        CREATE INDEX idx_usage_chat_latency ON usage(ts, provider, model, latency_ms, ttft_ms)
+        WHERE type = 'chat' AND success = 1 AND cached = 0
+    """)
+
+
+def _migrate_v3(conn: sqlite3.Connection):
+    """第 3 版：每小時彙總，並從既有的原始紀錄回填"""
+    conn.execute("""
+        CREATE TABLE usage_hourly (
+            hour INTEGER NOT NULL,  -- ts / HOUR_MS（UTC）
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            type TEXT NOT NULL,
+            requests INTEGER DEFAULT 0,
+            success_count INTEGER DEFAULT 0,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            total_tokens INTEGER DEFAULT 0,
+            cost REAL DEFAULT 0,
+            latency_sum INTEGER DEFAULT 0,
+            latency_count INTEGER DEFAULT 0,
+            ttft_sum INTEGER DEFAULT 0,
+            ttft_count INTEGER DEFAULT 0,
+            tps_sum REAL DEFAULT 0,
+            tps_count INTEGER DEFAULT 0,
+            cache_hits INTEGER DEFAULT 0,
+            retries INTEGER DEFAULT 0,
+            retry_wait_ms INTEGER DEFAULT 0,
+            wasted INTEGER DEFAULT 0,
+            wasted_cost REAL DEFAULT 0,
+            PRIMARY KEY (hour, provider, model, type)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(_ROLLUP_REBUILD_SQL, (0,))
+
+
+def _migrate_v4(conn: sqlite3.Connection):
+    """第 4 版：每小時的延遲 / 首 token 時間直方圖（只存非零的分桶），並回填"""
+    conn.execute("""
+        CREATE TABLE usage_latency_hist (
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            metric TEXT NOT NULL,  -- 'latency' 或 'ttft'
+            hour INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (provider, model, hour, metric, bucket)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(_HIST_REBUILD_SQL, (0, 0))
+
+
+def _migrate_v5(conn: sqlite3.Connection):
+    """第 5 版：prompt 依內容雜湊存一份（prompts 表），usage 只存參照，並搬移既有的 prompt"""
+    conn.execute("""
+        CREATE TABLE prompts (
+            hash INTEGER PRIMARY KEY,  -- _prompt_hash(內容)
+            content BLOB NOT NULL,  -- 文字，或 compressed = 1 時為 zlib 壓縮的 UTF-8
+            compressed INTEGER NOT NULL DEFAULT 0,
+            created_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("ALTER TABLE usage ADD COLUMN prompt_hash INTEGER")
+    conn.execute("""
+        INSERT OR IGNORE INTO prompts (hash, content, compressed, created_at)
+        SELECT meei_prompt_hash(prompt), prompt, 0, MIN(ts)
+        FROM usage
+        WHERE prompt IS NOT NULL AND prompt != ''
+        GROUP BY prompt
+    """)
+    # 空出來的空間在下一次 prune_usage() 時釋放
+    conn.execute("""
+        UPDATE usage SET prompt_hash = meei_prompt_hash(prompt), prompt = NULL
+        WHERE prompt IS NOT NULL AND prompt != ''
+    """)
+
+
+def _migrate_v6(conn: sqlite3.Connection):
+    """第 6 版：回應中的模型版本（與請求的模型名稱不同時才有值）"""
+    conn.execute("ALTER TABLE usage ADD COLUMN response_model TEXT")
+
+
+# (版本, migration)，依序套用；新增欄位或索引請加在最後
+_MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+]
+
+SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """BEGIN IMMEDIATE 的 transaction（連線需以 isolation_level=None 開啟）"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _migrate(conn: sqlite3.Connection):
+    """
+    套用尚未執行的 migration（每一版在自己的 transaction 中）
+
+    BEGIN IMMEDIATE 取得寫入鎖後才讀取目前版本，多個 process 同時開啟
+    舊資料庫時只有一個會執行 migration。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            applied_at INTEGER NOT NULL
+        )
+    """)
+    for version, migration in _MIGRATIONS:
+        with _transaction(conn):
+            current = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            if version > current:
+                migration(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, applied_at) VALUES (?, ?)", (version, _now_ms())
+                )
+
+
+def _rollup(rows: List[tuple]) -> List[tuple]:
+    """把一批原始紀錄彙總成 usage_hourly 的資料列（與 _ROLLUP_REBUILD_SQL 相同的算法）"""
+    buckets: Dict[tuple, list] = {}
+    for (
+        ts, provider, model, type_, input_tokens, output_tokens, total_tokens, cost, success,
+        latency_ms, _prompt, _error, cached, ttft_ms, tokens_per_sec, retries, retry_wait_ms, wasted,
+        _response_model,
+    ) in rows:
+        key = (ts // HOUR_MS, provider, model or "", type_)
+        b = buckets.get(key)
+        if b is None:
+            b = buckets[key] = [0] * len(_ROLLUP_COLUMNS)
+        b[0] += 1
+        b[1] += success
+        b[2] += input_tokens
+        b[3] += output_tokens
+        b[4] += total_tokens
+        b[5] += cost
+        if not cached:
+            b[6] += latency_ms
+            b[7] += 1
+        if ttft_ms is not None:
+            b[8] += ttft_ms
+            b[9] += 1
+        if tokens_per_sec is not None:
+            b[10] += tokens_per_sec
+            b[11] += 1
+        b[12] += cached
+        b[13] += retries
+        b[14] += retry_wait_ms
+        b[15] += wasted
+        if wasted:
+            b[16] += cost
+    return [key + tuple(b) for key, b in buckets.items()]
+
+
+def _latency_histograms(rows: List[tuple]) -> List[tuple]:
+    """一批原始紀錄的直方圖增量（與 _HIST_REBUILD_SQL 相同的篩選）"""
+    counts: Dict[tuple, int] = {}
+    for row in rows:
+        ts, provider, model = row[_ROW_TS], row[_ROW_PROVIDER], row[_ROW_MODEL]
+        success, latency_ms, ttft_ms = row[_ROW_SUCCESS], row[_ROW_LATENCY], row[_ROW_TTFT]
+        cached, wasted = row[_ROW_CACHED], row[_ROW_WASTED]
+        if not success or cached or wasted:
+            continue
+        hour, model = ts // HOUR_MS, model or ""
+        key = (provider, model, "latency", hour, _hist_bucket(latency_ms))
+        counts[key] = counts.get(key, 0) + 1
+        if ttft_ms is not None:
+            key = (provider, model, "ttft", hour, _hist_bucket(ttft_ms))
+            counts[key] = counts.get(key, 0) + 1
+    return [key + (count,) for key, count in counts.items()]
 
 
 def _ensure_db():
-    """確保資料庫存在並建立表格"""
+    """確保資料庫存在且為最新版本（每個 process 只做一次）"""
+    global _db_ready
+    if _db_ready:
+        return
+
+    with _db_lock:
+        if _db_ready:
+            return
+        _create_schema()
+        _db_ready = True
+
+
+def _create_schema():
+    """建立或升級資料表"""
     MEEI_DIR.mkdir(exist_ok=True)
 
-    with sqlite3.connect(DB_FILE) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS usage (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                provider TEXT NOT NULL,
-                model TEXT,
-                type TEXT NOT NULL,
-                input_tokens INTEGER DEFAULT 0,
-                output_tokens INTEGER DEFAULT 0,
-                total_tokens INTEGER DEFAULT 0,
-                cost REAL DEFAULT 0,
-                success INTEGER DEFAULT 1,
-                latency_ms INTEGER DEFAULT 0,
-                prompt TEXT,
-                error TEXT
+    # 自行管理 transaction（DDL 也要包在 migration 的 transaction 中）
+    conn = _connect(isolation_level=None, timeout=30)
+    try:
+        # 只對還沒有資料表的新資料庫生效；舊資料庫在第一次 prune_usage() 時轉換
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL 是資料庫檔案層級的設定，設一次即可
+        conn.execute("PRAGMA journal_mode=WAL")
+        _migrate(conn)
+    finally:
+        conn.close()
+
+
+class PromptStorage:
+    """
+    prompt 的保存方式（由寫入執行緒套用）
+
+    compress: 是否以 zlib 壓縮新寫入的 prompt（已存在的內容不會改變）
+    """
+
+    def __init__(self):
+        self.compress = False
+        # provider（None 為預設）-> (是否保存, 遮蔽函數)
+        self._policies: Dict[Optional[str], Tuple[bool, Optional[Callable[[str], Optional[str]]]]] = {}
+
+    def set_policy(
+        self,
+        provider: str = None,
+        store: bool = True,
+        redact: Callable[[str], Optional[str]] = None,
+    ):
+        """
+        設定 prompt 的保存方式；provider 為 None 時套用到所有未個別設定的 provider
+
+        store=False 時不保存 prompt（用量照常記錄）。redact 在保存前處理 prompt
+        （例如遮蔽個資），回傳 None 或拋出例外時不保存。store=True 且沒有 redact 時移除設定。
+        """
+        if store and redact is None:
+            self._policies.pop(provider, None)
+        else:
+            self._policies[provider] = (store, redact)
+
+    def prepare(self, provider: str, prompt: str) -> Optional[str]:
+        """套用設定後要保存的內容，None 表示不保存"""
+        store, redact = self._policies.get(provider) or self._policies.get(None) or (True, None)
+        if not store:
+            return None
+        if redact is not None:
+            try:
+                prompt = redact(prompt)
+            except Exception:
+                # 遮蔽失敗時寧可不存
+                return None
+        return prompt or None
+
+    def encode(self, text: str) -> Tuple[Union[str, bytes], int]:
+        """寫入 prompts 表的 (content, compressed)；壓縮後沒有變小就存原文"""
+        if self.compress:
+            raw = text.encode("utf-8")
+            if len(raw) >= COMPRESS_MIN_BYTES:
+                packed = zlib.compress(raw)
+                if len(packed) < len(raw):
+                    return packed, 1
+        return text, 0
+
+
+prompt_storage = PromptStorage()
+
+
+def _store_prompts(conn: sqlite3.Connection, rows: List[tuple]) -> List[tuple]:
+    """
+    把資料列中的 prompt 存進 prompts 表（已存在就略過），回傳寫入 usage 用的資料列
+
+    需在寫入 usage 的同一個 transaction 中呼叫：prune_usage() 會清除沒有參照的 prompt。
+    """
+    refs: Dict[Tuple[str, str], Optional[int]] = {}
+    now = _now_ms()
+    result = []
+    for row in rows:
+        provider, prompt = row[_ROW_PROVIDER], row[_ROW_PROMPT]
+        ref = None
+        if prompt:
+            key = (provider, prompt)
+            if key not in refs:
+                refs[key] = _store_prompt(conn, prompt_storage.prepare(provider, prompt), now)
+            ref = refs[key]
+        result.append(row[:_ROW_PROMPT] + row[_ROW_PROMPT + 1 :] + (ref,))
+    return result
+
+
+def _store_prompt(conn: sqlite3.Connection, text: Optional[str], now: int) -> Optional[int]:
+    """保存一個 prompt，回傳它的雜湊"""
+    if not text:
+        return None
+    ref = _prompt_hash(text)
+    # 已存在時不必壓縮，也不產生任何寫入
+    if conn.execute("SELECT 1 FROM prompts WHERE hash = ?", (ref,)).fetchone() is None:
+        content, compressed = prompt_storage.encode(text)
+        conn.execute(
+            "INSERT INTO prompts (hash, content, compressed, created_at) VALUES (?, ?, ?, ?)",
+            (ref, content, compressed, now),
+        )
+    return ref
+
+
+def _usage_item(row: sqlite3.Row) -> Dict[str, Any]:
+    """_SELECT_USAGE_SQL 的資料列轉成 dict（prompt 為還原後的內容）"""
+    item = dict(row)
+    content = item.pop("prompt_content")
+    compressed = item.pop("prompt_compressed")
+    if content is not None:
+        item["prompt"] = _decode_prompt(content, compressed)
+    return item
+
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    """是否為等待寫入鎖逾時（database is locked / busy）"""
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+class _Writer:
+    """背景批次寫入器"""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # 佇列滿了或資料庫無法寫入而丟棄的筆數
+        self.dropped = 0
+
+    def _start(self):
+        """啟動寫入執行緒（fork 後會重新啟動）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # fork 後父行程的佇列內容不屬於這個行程
+                self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="meei-tracker", daemon=True
             )
-        """)
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_timestamp ON usage(timestamp)
-        """)
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_provider ON usage(provider)
-        """)
+            self._thread.start()
+
+    def put(self, row: tuple):
+        """放入一筆資料（佇列滿了就丟棄，追蹤不能拖慢或卡住請求）"""
+        if self._pid != os.getpid() or not self._thread or not self._thread.is_alive():
+            self._start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待佇列中所有資料寫入完成"""
+        if not self._thread or not self._thread.is_alive() or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _open(self) -> sqlite3.Connection:
+        _ensure_db()
+        # 與其他連線相同的等待時間：rebuild_rollups()、prune_usage() 的 VACUUM、
+        # migration 都可能持有寫入鎖超過預設的 5 秒
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self):
+        conn: Optional[sqlite3.Connection] = None
+        reopen_at = 0.0
+        # 資料庫被鎖住而沒寫入的資料列與等待它們的 flush()，下一輪重試
+        backlog: List[tuple] = []
+        held: List[threading.Event] = []
+
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    if not backlog:
+                        continue
+                    item = None
+
+                rows: List[tuple] = backlog
+                waiters: List[threading.Event] = held
+                backlog, held = [], []
+                while item is not None:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        rows.append(item)
+                    if len(rows) >= BATCH_SIZE:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if rows and conn is None and time.monotonic() >= reopen_at:
+                    try:
+                        conn = self._open()
+                    except (sqlite3.Error, OSError):
+                        # 資料庫開不起來（目錄不存在、權限、migration 失敗）：
+                        # 繼續清空佇列，過一段時間再試
+                        reopen_at = time.monotonic() + REOPEN_INTERVAL
+
+                if rows and conn is None:
+                    self.dropped += len(rows)
+                elif rows:
+                    try:
+                        # 原始紀錄與彙總在同一個 transaction，兩者不會不一致
+                        with conn:
+                            # 先取得寫入鎖，prompts 表的查詢與寫入才不會和 prune_usage() 交錯
+                            conn.execute("BEGIN IMMEDIATE")
+                            conn.executemany(_INSERT_SQL, _store_prompts(conn, rows))
+                            conn.executemany(_ROLLUP_UPSERT_SQL, _rollup(rows))
+                            conn.executemany(_HIST_UPSERT_SQL, _latency_histograms(rows))
+                    except sqlite3.OperationalError as e:
+                        if not _is_locked(e):
+                            self.dropped += len(rows)
+                        else:
+                            # 其他 process 的長交易：保留這批（最多 QUEUE_SIZE 筆）稍後重試
+                            backlog = rows[-QUEUE_SIZE:]
+                            self.dropped += len(rows) - len(backlog)
+                            held = waiters
+                            continue
+                    except sqlite3.Error:
+                        # 追蹤失敗不影響主程式
+                        self.dropped += len(rows)
+
+                for event in waiters:
+                    event.set()
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+_writer = _Writer()
+
+
+def flush(timeout: float = 5.0) -> bool:
+    """
+    將尚未寫入的用量記錄寫入資料庫
+
+    Returns:
+        是否在 timeout 內完成
+    """
+    return _writer.flush(timeout)
+
+
+atexit.register(flush)
+
+
+def get_dropped_count() -> int:
+    """因佇列已滿或資料庫無法寫入而沒有記錄的筆數（process 啟動以來）"""
+    return _writer.dropped
 
 
 @contextmanager
@@ -66,55 +797,79 @@ def track(
     latency_ms: int = 0,
     prompt: str = None,
     error: str = None,
+    cached: bool = False,
+    ttft_ms: int = None,
+    retries: int = 0,
+    retry_wait_ms: int = 0,
+    wasted: bool = False,
+    response_model: str = None,
 ):
-    """記錄一次 API 調用"""
-    with get_db() as conn:
-        conn.execute(
-            """
-            INSERT INTO usage (
-                timestamp, provider, model, type,
-                input_tokens, output_tokens, total_tokens,
-                cost, success, latency_ms, prompt, error
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                datetime.now().isoformat(),
-                provider,
-                model,
-                type,
-                input_tokens,
-                output_tokens,
-                input_tokens + output_tokens,
-                cost,
-                1 if success else 0,
-                latency_ms,
-                prompt[:500] if prompt else None,  # 只存前 500 字
-                error,
-            ),
+    """
+    記錄一次 API 調用（非阻塞，由背景執行緒批次寫入）
+
+    model: 請求的模型名稱（彙總、直方圖與路由統計的 key）
+    wasted: 結果被丟棄的請求（例如 hedged request 中輸掉而被取消的一方）
+    response_model: 回應中的模型版本，與 model 不同時才需要傳入
+    """
+    # 輸出速度：串流扣掉首 token 前的等待時間
+    tokens_per_sec = None
+    generation_ms = latency_ms - (ttft_ms or 0)
+    if output_tokens and generation_ms > 0:
+        tokens_per_sec = output_tokens * 1000 / generation_ms
+
+    _writer.put(
+        (
+            _now_ms(),
+            provider,
+            model,
+            type,
+            input_tokens,
+            output_tokens,
+            input_tokens + output_tokens,
+            cost,
+            1 if success else 0,
+            latency_ms,
+            prompt[:PROMPT_MAX_CHARS] if prompt else None,  # 寫入時換成 prompts 表的參照
+            error,
+            1 if cached else 0,
+            ttft_ms,
+            tokens_per_sec,
+            retries,
+            retry_wait_ms,
+            1 if wasted else 0,
+            response_model,
         )
-        conn.commit()
+    )
 
 
 def get_usage_summary(
     days: int = 30,
     provider: str = None,
 ) -> Dict[str, Any]:
-    """取得用量摘要"""
-    since = (datetime.now() - timedelta(days=days)).isoformat()
+    """取得用量摘要（讀每小時彙總，起點取整到小時）"""
+    flush()
+    since_hour = _since_ms(days=days) // HOUR_MS
 
     with get_db() as conn:
         query = """
             SELECT
                 provider,
-                COUNT(*) as total_requests,
+                SUM(requests) as total_requests,
                 SUM(total_tokens) as total_tokens,
                 SUM(cost) as total_cost,
-                AVG(latency_ms) as avg_latency,
-                SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as success_count
-            FROM usage
-            WHERE timestamp > ?
+                SUM(latency_sum) * 1.0 / NULLIF(SUM(latency_count), 0) as avg_latency,
+                SUM(ttft_sum) * 1.0 / NULLIF(SUM(ttft_count), 0) as avg_ttft,
+                SUM(tps_sum) / NULLIF(SUM(tps_count), 0) as avg_tokens_per_sec,
+                SUM(success_count) as success_count,
+                SUM(cache_hits) as cache_hits,
+                SUM(retries) as total_retries,
+                SUM(retry_wait_ms) as total_retry_wait_ms,
+                SUM(wasted) as wasted_requests,
+                SUM(wasted_cost) as wasted_cost
+            FROM usage_hourly
+            WHERE hour >= ?
         """
-        params = [since]
+        params = [since_hour]
 
         if provider:
             query += " AND provider = ?"
@@ -133,38 +888,282 @@ def get_usage_summary(
 
 
 def get_recent_requests(limit: int = 50) -> List[Dict[str, Any]]:
-    """取得最近的請求記錄"""
+    """取得最近的請求記錄（timestamp 為本地時間的 ISO 字串，ts 為 epoch 毫秒）"""
+    flush()
     with get_db() as conn:
         rows = conn.execute(
-            """
-            SELECT * FROM usage
-            ORDER BY timestamp DESC
-            LIMIT ?
-            """,
+            _SELECT_USAGE_SQL + " ORDER BY usage.ts DESC LIMIT ?",
             (limit,),
         ).fetchall()
 
-        return [dict(row) for row in rows]
+        requests = []
+        for row in rows:
+            item = _usage_item(row)
+            item["timestamp"] = datetime.fromtimestamp(row["ts"] / 1000).isoformat()
+            requests.append(item)
+        return requests
 
 
 def get_daily_usage(days: int = 30) -> List[Dict[str, Any]]:
-    """取得每日用量統計"""
-    since = (datetime.now() - timedelta(days=days)).isoformat()
+    """取得每日用量統計（讀每小時彙總，依本地時區分日）"""
+    flush()
+    since_hour = _since_ms(days=days) // HOUR_MS
+    # 小時彙總加上時區偏移後以整數運算分日（時區偏移不是整點時以所在小時歸日）
+    offset_ms = int(datetime.now().astimezone().utcoffset().total_seconds() * 1000)
 
     with get_db() as conn:
         rows = conn.execute(
-            """
+            f"""
             SELECT
-                DATE(timestamp) as date,
-                COUNT(*) as requests,
+                (hour * {HOUR_MS} + ?) / {DAY_MS} as day,
+                SUM(requests) as requests,
                 SUM(cost) as cost,
                 SUM(total_tokens) as tokens
-            FROM usage
-            WHERE timestamp > ?
-            GROUP BY DATE(timestamp)
-            ORDER BY date
+            FROM usage_hourly
+            WHERE hour >= ?
+            GROUP BY day
+            ORDER BY day
+            """,
+            (offset_ms, since_hour),
+        ).fetchall()
+
+        return [
+            {
+                "date": datetime.fromtimestamp(row["day"] * 86400, timezone.utc).date().isoformat(),
+                "requests": row["requests"],
+                "cost": row["cost"],
+                "tokens": row["tokens"],
+            }
+            for row in rows
+        ]
+
+
+def rebuild_rollups(days: float = None) -> int:
+    """
+    從原始紀錄重建每小時彙總與延遲直方圖（回填或修正不一致）
+
+    已被 prune_usage() 刪除原始紀錄的時段不會重建，保留原本的彙總。
+
+    Args:
+        days: 只重建最近幾天（從該小時開始），None 表示全部
+
+    Returns:
+        重建後該範圍內的彙總筆數
+    """
+    flush()
+    _ensure_db()
+    since_hour = 0 if days is None else _since_ms(days=days) // HOUR_MS
+
+    conn = _connect(isolation_level=None, timeout=30)
+    try:
+        with _transaction(conn):
+            earliest = conn.execute("SELECT MIN(ts) FROM usage").fetchone()[0]
+            if earliest is None:
+                return 0
+            # prune 以整點切割，最早一筆原始紀錄所在的小時之後都是完整的
+            since_hour = max(since_hour, earliest // HOUR_MS)
+            since = since_hour * HOUR_MS
+
+            conn.execute("DELETE FROM usage_hourly WHERE hour >= ?", (since_hour,))
+            conn.execute(_ROLLUP_REBUILD_SQL, (since,))
+            conn.execute("DELETE FROM usage_latency_hist WHERE hour >= ?", (since_hour,))
+            conn.execute(_HIST_REBUILD_SQL, (since, since))
+            return conn.execute(
+                "SELECT COUNT(*) FROM usage_hourly WHERE hour >= ?", (since_hour,)
+            ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _archive_batch(rows: List[sqlite3.Row], archive_dir: Path) -> List[Path]:
+    """
+    把一批資料列依 UTC 月份附加到 usage-YYYY-MM.jsonl.gz
+
+    每批寫成一個完整的 gzip member（多個 member 串接仍是合法的 gzip 檔），
+    fsync 之後才回傳，呼叫端再刪除資料列。
+    """
+    partitions: Dict[str, List[str]] = {}
+    for row in rows:
+        item = _usage_item(row)
+        stamp = datetime.fromtimestamp(item["ts"] / 1000, timezone.utc)
+        item["timestamp"] = stamp.isoformat()
+        partitions.setdefault(stamp.strftime("%Y-%m"), []).append(json.dumps(item, ensure_ascii=False))
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for month, lines in partitions.items():
+        path = archive_dir / f"usage-{month}.jsonl.gz"
+        data = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        paths.append(path)
+    return paths
+
+
+def _incremental_vacuum(conn: sqlite3.Connection) -> int:
+    """
+    歸還空閒頁給檔案系統，回傳減少的頁數
+
+    舊資料庫不是 incremental auto_vacuum 時先轉換（需要一次完整 VACUUM）。
+    WAL 模式下頁面要等 checkpoint 才會真正從主檔案截掉。
+    """
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free:
+            # 分段釋放，每段是一個短 transaction
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP})").fetchall()
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            free = remaining
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return max(0, before - conn.execute("PRAGMA page_count").fetchone()[0])
+
+
+def prune_usage(
+    days: float = DEFAULT_RETENTION_DAYS,
+    archive: bool = True,
+    archive_dir: Union[str, Path] = None,
+) -> Dict[str, Any]:
+    """
+    刪除超過保留期限的原始紀錄（每小時彙總與直方圖保留），並縮小資料庫
+
+    過期的資料列依時間順序分批讀出，先附加到封存檔再刪除；中途中斷時已刪除的
+    都已封存，最多重複封存最後一批。
+
+    Args:
+        days: 保留最近幾天（以整點切割）
+        archive: 刪除前是否封存
+        archive_dir: 封存目錄，預設 ~/.meei/archive
+
+    Returns:
+        {"deleted": 刪除列數, "prompts": 清除的 prompt 數, "files": [封存檔], "freed_pages": 釋放的頁數}
+    """
+    flush()
+    _ensure_db()
+    cutoff = _since_ms(days=days) // HOUR_MS * HOUR_MS
+    archive_dir = Path(archive_dir) if archive_dir else ARCHIVE_DIR
+
+    deleted = 0
+    files: Dict[Path, None] = {}
+    conn = _connect(isolation_level=None, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        while True:
+            rows = conn.execute(
+                _SELECT_USAGE_SQL + " WHERE usage.ts < ? ORDER BY usage.ts LIMIT ?", (cutoff, PRUNE_BATCH)
+            ).fetchall()
+            if not rows:
+                break
+            if archive:
+                files.update(dict.fromkeys(_archive_batch(rows, archive_dir)))
+            with _transaction(conn):
+                conn.executemany("DELETE FROM usage WHERE id = ?", [(row["id"],) for row in rows])
+            deleted += len(rows)
+
+        # 不再被任何紀錄參照的 prompt（NOT IN 的子查詢只建一次暫時索引）
+        with _transaction(conn):
+            prompts = conn.execute("""
+                DELETE FROM prompts WHERE hash NOT IN (
+                    SELECT prompt_hash FROM usage WHERE prompt_hash IS NOT NULL
+                )
+            """).rowcount
+
+        freed = _incremental_vacuum(conn)
+    finally:
+        conn.close()
+
+    return {
+        "deleted": deleted,
+        "prompts": prompts,
+        "files": [str(path) for path in files],
+        "freed_pages": freed,
+    }
+
+
+def get_latency_percentiles(
+    provider: str,
+    model: str = None,
+    days: float = 7,
+    percentiles: Tuple[float, ...] = (50, 95, 99),
+) -> Dict[str, Dict[str, Any]]:
+    """
+    延遲與串流首 token 時間的百分位數（合併每小時直方圖，不讀原始紀錄）
+
+    只計入成功、非快取、沒有被取消的請求；數值是分桶的代表值，相對誤差約 ±4.5%。
+
+    Args:
+        provider: provider 名稱
+        model: 模型名稱，None 表示該 provider 的所有模型
+        days: 最近幾天（起點取整到小時）
+        percentiles: 要計算的百分位
+
+    Returns:
+        {"latency": {"count": n, "p50": ms, ...}, "ttft": {...}}；沒有資料時百分位為 None
+    """
+    flush()
+    since_hour = _since_ms(days=days) // HOUR_MS
+
+    query = """
+        SELECT metric, bucket, SUM(count) FROM usage_latency_hist
+        WHERE provider = ? AND hour >= ?
+    """
+    params: List[Any] = [provider, since_hour]
+    if model is not None:
+        query += " AND model = ?"
+        params.append(model)
+    query += " GROUP BY metric, bucket ORDER BY metric, bucket"
+
+    histograms: Dict[str, List[Tuple[int, int]]] = {"latency": [], "ttft": []}
+    with get_db() as conn:
+        for metric, bucket, count in conn.execute(query, params):
+            histograms[metric].append((bucket, count))
+
+    result = {}
+    for metric, buckets in histograms.items():
+        total = sum(count for _, count in buckets)
+        stats: Dict[str, Any] = {"count": total}
+        for p in percentiles:
+            label = f"p{p:g}"
+            if not total:
+                stats[label] = None
+                continue
+            # nearest-rank：第 ceil(p% * total) 個樣本所在的分桶
+            rank, seen = max(1, math.ceil(p / 100 * total)), 0
+            for bucket, count in buckets:
+                seen += count
+                if seen >= rank:
+                    stats[label] = round(_hist_value(bucket), 1)
+                    break
+        result[metric] = stats
+    return result
+
+
+def get_recent_latencies(hours: float = 24, limit: int = 5000) -> List[tuple]:
+    """
+    取得最近成功且非快取的聊天請求延遲，由舊到新
+
+    Returns:
+        [(provider, model, latency_ms, ttft_ms), ...]；非串流請求的 ttft_ms 為 None
+    """
+    flush()
+    since = _since_ms(hours=hours)
+
+    with get_db() as conn:
+        rows = conn.execute(
+            """
+            SELECT provider, model, latency_ms, ttft_ms FROM usage
+            WHERE ts > ? AND type = 'chat' AND success = 1 AND cached = 0 AND latency_ms > 0
+            ORDER BY ts DESC
+            LIMIT ?
             """,
-            (since,),
+            (since, limit),
         ).fetchall()
 
-        return [dict(row) for row in rows]
+        return [tuple(row) for row in reversed(rows)]
@@ -0,0 +1,17 @@
+"""測試共用的 fixture"""
+
+import pytest
+
+from meei import tracker
+
+
+@pytest.fixture
+def tracker_db(tmp_path, monkeypatch):
+    """把用量資料庫換成暫存目錄中的新檔案（並使用新的寫入執行緒）"""
+    monkeypatch.setattr(tracker, "MEEI_DIR", tmp_path)
+    monkeypatch.setattr(tracker, "DB_FILE", tmp_path / "meei.db")
+    monkeypatch.setattr(tracker, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(tracker, "_db_ready", False)
+    monkeypatch.setattr(tracker, "_writer", tracker._Writer())
+    yield tracker.DB_FILE
+    tracker.flush()
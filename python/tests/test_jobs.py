@@ -0,0 +1,160 @@
+"""批次工作的 checkpoint 與續跑"""
+
+import json
+
+import pytest
+
+from meei import jobs, tracker
+from meei.jobs import Checkpoint, _recover, _to_ranges, run_batch
+from meei.testing import FakeServer
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    with FakeServer(latency=0) as server:
+        server.install(["openai"])
+        yield server
+
+
+def _lines(path):
+    return [json.loads(text) for text in path.read_text(encoding="utf-8").splitlines()]
+
+
+def _write_input(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"r{i}", "prompt": f"第 {i} 筆"}, ensure_ascii=False) + "\n")
+
+
+def test_to_ranges():
+    assert _to_ranges([]) == []
+    assert _to_ranges([1, 2, 3, 7, 9, 10]) == [(1, 3), (7, 7), (9, 10)]
+
+
+def test_checkpoint_watermark_and_round_trip(tmp_path):
+    ckpt = Checkpoint(tmp_path / "out.jsonl.ckpt")
+    for line in (2, 0, 5, 3):
+        ckpt.mark(line)
+    assert ckpt.watermark == 1
+    assert ckpt.done == {2, 3, 5}
+    ckpt.mark(1)
+    assert (ckpt.watermark, ckpt.done) == (4, {5})
+
+    ckpt.done.update({7, 8, 9})
+    ckpt.native = {"batches": [{"id": "b1"}]}
+    ckpt.save(123)
+
+    loaded = Checkpoint.load(ckpt.path)
+    assert (loaded.watermark, loaded.done, loaded.offset) == (4, {5, 7, 8, 9}, 123)
+    assert loaded.native == {"batches": [{"id": "b1"}]}
+    assert [loaded.is_done(line) for line in (0, 3, 4, 5, 6, 9, 10)] == [
+        True, True, False, True, False, True, False,
+    ]
+    # 原子寫入不留下暫存檔
+    assert not ckpt.path.with_name(ckpt.path.name + ".tmp").exists()
+
+
+def test_recover_reads_results_after_checkpoint(tmp_path):
+    out = tmp_path / "out.jsonl"
+    saved = b'{"line": 0, "output": "a"}\n'
+    after = b'{"line": 2, "output": "c"}\n{"line": 1, "error": "x"}\n'
+    out.write_bytes(saved + after + b'{"line": 3, "out')
+
+    ckpt = Checkpoint(tmp_path / "out.jsonl.ckpt")
+    ckpt.mark(0)
+    ckpt.offset = len(saved)
+    _recover(out, ckpt)
+
+    assert ckpt.watermark == 3
+    # 寫到一半的最後一行被截掉
+    assert out.read_bytes() == saved + after
+
+
+def test_recover_rejects_inconsistent_output(tmp_path):
+    out = tmp_path / "out.jsonl"
+    ckpt = Checkpoint(tmp_path / "out.jsonl.ckpt")
+    ckpt.offset = 100
+    with pytest.raises(RuntimeError):
+        _recover(out, ckpt)
+
+    out.write_bytes(b'{"line": 0}\n')
+    with pytest.raises(RuntimeError):
+        _recover(out, ckpt)
+
+
+def test_read_input(tmp_path):
+    path = tmp_path / "in.jsonl"
+    path.write_text('{"prompt": "a"}\n\nnot json\n{"x": 1}\n{"messages": []}\n', encoding="utf-8")
+
+    rows = list(jobs._read_input(path))
+    assert [line for line, _ in rows] == [0, 1, 2, 3, 4]
+    assert rows[0][1] == {"prompt": "a"}
+    assert rows[1][1] is None
+    assert isinstance(rows[2][1], ValueError) and isinstance(rows[3][1], ValueError)
+    assert rows[4][1] == {"messages": []}
+
+
+def test_run_batch_and_rerun(tracker_db, fake_server, tmp_path):
+    source, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, 20)
+    fake_server.reset_stats()
+
+    assert run_batch(str(source), str(out), pv="openai", concurrency=4) == 20
+    results = _lines(out)
+    assert sorted(item["line"] for item in results) == list(range(20))
+    assert all("output" in item and item["id"] == f"r{item['line']}" for item in results)
+
+    # 已完成的工作重跑時不會再送出請求
+    assert run_batch(str(source), str(out), pv="openai") == 0
+    assert fake_server.stats()["requests"] == 20
+    assert len(_lines(out)) == 20
+
+
+def test_run_batch_resumes_after_crash(tracker_db, fake_server, tmp_path):
+    """checkpoint 落後於輸出檔、且最後一行寫到一半時中斷"""
+    source, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_input(source, 12)
+    out.write_text(
+        "".join(json.dumps({"line": line, "output": "done"}) + "\n" for line in (0, 1, 2, 5))
+        + '{"line": 6, "outp',
+        encoding="utf-8",
+    )
+    ckpt = Checkpoint(tmp_path / "out.jsonl.ckpt")
+    ckpt.mark(0)
+    ckpt.save(len(json.dumps({"line": 0, "output": "done"})) + 1)
+    fake_server.reset_stats()
+
+    assert run_batch(str(source), str(out), pv="openai", concurrency=3) == 8
+    assert fake_server.stats()["requests"] == 8
+
+    results = _lines(out)
+    assert sorted(item["line"] for item in results) == list(range(12))
+    assert {item["line"] for item in results if item["output"] == "done"} == {0, 1, 2, 5}
+
+    final = Checkpoint.load(ckpt.path)
+    assert (final.watermark, final.done, final.offset) == (12, set(), out.stat().st_size)
+
+
+def test_input_errors_are_written_as_results(tracker_db, fake_server, tmp_path):
+    source, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    source.write_text('{"prompt": "a"}\n\n{"bad": 1}\n', encoding="utf-8")
+
+    assert run_batch(str(source), str(out), pv="openai") == 2
+    results = sorted(_lines(out), key=lambda item: item["line"])
+    assert [item["line"] for item in results] == [0, 2]
+    assert "output" in results[0] and "error" in results[1]
+    assert Checkpoint.load(tmp_path / "out.jsonl.ckpt").watermark == 3
+
+
+def test_native_batch_tracks_requested_model(tracker_db, fake_server, tmp_path):
+    source, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    source.write_text(
+        '{"id": "a", "prompt": "hi"}\n{"id": "b", "prompt": "yo", "model": "gpt-4o"}\n', encoding="utf-8"
+    )
+
+    assert run_batch(str(source), str(out), pv="openai", native=True, poll_interval=0.01) == 2
+
+    (batch,) = Checkpoint.load(tmp_path / "out.jsonl.ckpt").native["batches"]
+    assert batch["collected"] and batch["models"] == {"1": "gpt-4o"}
+    tracked = sorted(item["model"] for item in tracker.get_recent_requests() if item["type"] == "batch")
+    assert tracked == ["gpt-4o", batch["model"]]
@@ -0,0 +1,169 @@
+"""token bucket 限流"""
+
+import asyncio
+
+import pytest
+
+from meei import ratelimit
+from meei.ratelimit import MemoryBackend, RateLimiter, SQLiteBackend, estimate_tokens
+
+
+class FakeClock:
+    """取代 ratelimit 模組中的 time：sleep 直接推進時間"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", fake)
+    monkeypatch.setattr(ratelimit, "MEEI_DIR", tmp_path)
+    return fake
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, clock, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(tmp_path / "ratelimit.db")
+
+
+def test_estimate_tokens():
+    messages = [{"role": "system", "content": "x" * 40}, {"role": "user", "content": "y" * 9}]
+    expected = 49 // ratelimit.CHARS_PER_TOKEN + 2 * ratelimit.TOKENS_PER_MESSAGE
+    assert estimate_tokens(messages) == expected
+    assert estimate_tokens(messages, max_tokens=100) == expected + 100
+    assert estimate_tokens([{"role": "user", "content": None}]) == ratelimit.TOKENS_PER_MESSAGE
+
+
+def test_take_and_refill(backend, clock):
+    # 容量 60，每秒補 1
+    assert backend.take("k", 60, 50) == 0.0
+    assert backend.take("k", 60, 20) == pytest.approx(10.0)
+    # 沒拿到時不扣額度
+    assert backend.take("k", 60, 20) == pytest.approx(10.0)
+
+    clock.now += 10
+    assert backend.take("k", 60, 20) == 0.0
+    assert backend.take("k", 60, 1) == pytest.approx(1.0)
+
+
+def test_refill_is_capped_at_capacity(backend, clock):
+    assert backend.take("k", 60, 60) == 0.0
+    clock.now += 3600
+    assert backend.take("k", 60, 60) == 0.0
+    assert backend.take("k", 60, 1) == pytest.approx(1.0)
+
+
+def test_oversized_request_waits_for_full_bucket(backend, clock):
+    assert backend.take("k", 60, 30) == 0.0
+    # 超過容量的請求等到 bucket 滿了就放行，之後額度為負
+    assert backend.take("k", 60, 100) == pytest.approx(30.0)
+    clock.now += 30
+    assert backend.take("k", 60, 100) == 0.0
+    assert backend.take("k", 60, 1) == pytest.approx(41.0)
+
+
+def test_adjust(backend, clock):
+    backend.take("k", 60, 60)
+    backend.adjust("k", 60, 15)
+    assert backend.take("k", 60, 15) == 0.0
+    backend.adjust("k", 60, -6)
+    assert backend.take("k", 60, 1) == pytest.approx(7.0)
+    # 歸還不會超過容量
+    backend.adjust("k", 60, 1000)
+    assert backend.take("k", 60, 61) == 0.0
+
+
+def test_limits_lookup(clock):
+    limiter = RateLimiter()
+    assert limiter.acquire("openai", "gpt-4o", 10) is None
+
+    limiter.set_limit("openai", tpm=1000)
+    limiter.set_limit("openai", model="gpt-4o", rpm=10)
+    assert limiter.acquire("openai", "gpt-4o", 10).key == "openai/gpt-4o"
+    assert limiter.acquire("openai", "gpt-4o-mini", 10).key == "openai"
+    assert limiter.acquire("groq", "llama", 10) is None
+
+    limiter.set_limit("openai", model="gpt-4o")
+    assert limiter.acquire("openai", "gpt-4o", 10).key == "openai"
+
+
+def test_acquire_waits_for_rpm(clock):
+    limiter = RateLimiter()
+    limiter.set_limit("openai", rpm=60)
+    for _ in range(60):
+        limiter.acquire("openai", "m", 1)
+    assert clock.slept == []
+
+    limiter.acquire("openai", "m", 1)
+    assert sum(clock.slept) == pytest.approx(1.0)
+
+
+def test_tpm_wait_returns_rpm(clock):
+    limiter = RateLimiter()
+    limiter.set_limit("openai", rpm=2, tpm=60)
+    limiter.acquire("openai", "m", 60)
+    # TPM 不夠時不能吃掉 RPM 額度
+    assert limiter._try("openai", 2, 60, 60) == pytest.approx(60.0)
+    assert limiter._try("openai", 2, 60, 60) == pytest.approx(60.0)
+    assert limiter.backend.take("openai:rpm", 2, 1) == 0.0
+
+
+def test_reconcile(clock):
+    limiter = RateLimiter()
+    limiter.set_limit("openai", tpm=600)
+    reservation = limiter.acquire("openai", "m", 600)
+    assert limiter._try("openai", None, 600, 100) == pytest.approx(10.0)
+
+    # 實際只用了 100，歸還 500
+    limiter.reconcile(reservation, 100)
+    assert limiter._try("openai", None, 600, 500) == 0.0
+
+    # 實際用量超過預估時追加扣除
+    reservation = limiter.acquire("openai", "m", 0)
+    limiter.reconcile(reservation, 60)
+    assert limiter._try("openai", None, 600, 100) == pytest.approx(16.0)
+
+    limiter.reconcile(None, 100)
+
+
+def test_sqlite_state_is_shared(clock, tmp_path):
+    first, second = RateLimiter(), RateLimiter()
+    for limiter in (first, second):
+        limiter.use_sqlite(tmp_path / "shared.db")
+        limiter.set_limit("openai", rpm=60)
+
+    for _ in range(30):
+        first.acquire("openai", "m", 1)
+    for _ in range(30):
+        second.acquire("openai", "m", 1)
+    assert clock.slept == []
+    assert first._try("openai", 60, None, 1) == pytest.approx(1.0)
+
+
+def test_async_acquire_and_reconcile(clock, tmp_path):
+    limiter = RateLimiter()
+    limiter.use_sqlite(tmp_path / "ratelimit.db")
+    limiter.set_limit("openai", tpm=600)
+
+    async def run():
+        reservation = await limiter.acquire_async("openai", "m", 600)
+        await limiter.reconcile_async(reservation, 0)
+        return await limiter.acquire_async("openai", "m", 600)
+
+    assert asyncio.run(run()).tokens == 600
+    assert limiter._try("openai", None, 600, 60) == pytest.approx(6.0)
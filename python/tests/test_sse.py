@@ -0,0 +1,120 @@
+"""增量 SSE 解碼器"""
+
+import asyncio
+import random
+import re
+
+from meei.chat.sse import DONE, SSEDecoder, aiter_sse_data, iter_sse_data
+
+STREAM = (
+    b": keep-alive\r\n"
+    b"event: message\r\n"
+    b'data: {"a": 1}\r\n'
+    b"\r\n"
+    b"id: 7\n"
+    b"data: first\n"
+    b"data:second\n"
+    b"\n"
+    b"data: cr only\r"
+    b"\r"
+    b"data: [DONE]\n"
+    b"\n"
+)
+EXPECTED = [b'{"a": 1}', b"first\nsecond", b"cr only", DONE]
+
+
+def _reference(data):
+    """依 SSE 規格逐行切割的參考實作"""
+    events, current = [], []
+    for line in re.split(rb"\r\n|\r|\n", data):
+        if not line:
+            if current:
+                events.append(b"\n".join(current))
+                current = []
+        elif line.startswith(b"data:"):
+            value = line[5:]
+            current.append(value[1:] if value.startswith(b" ") else value)
+    if current:
+        events.append(b"\n".join(current))
+    return events
+
+
+def _decode(chunks):
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events += decoder.feed(chunk)
+    return events + decoder.flush()
+
+
+def test_whole_stream():
+    assert _decode([STREAM]) == EXPECTED
+
+
+def test_every_split_point():
+    for i in range(len(STREAM) + 1):
+        assert _decode([STREAM[:i], STREAM[i:]]) == EXPECTED, i
+
+
+def test_byte_at_a_time():
+    assert _decode([STREAM[i:i + 1] for i in range(len(STREAM))]) == EXPECTED
+
+
+def test_crlf_split_across_chunks():
+    # CR 在一段的結尾、LF 在下一段的開頭，仍是同一個行尾
+    assert _decode([b"data: x\r", b"\ndata: y\r", b"\n\r", b"\n"]) == [b"x\ny"]
+
+
+def test_empty_chunks_are_ignored():
+    assert _decode([b"", b"data: x\r", b"", b"\n\n", b""]) == [b"x"]
+
+
+def test_flush_emits_unterminated_event():
+    assert _decode([b"data: a\n\ndata: b"]) == [b"a", b"b"]
+    assert _decode([b"data: a\n"]) == [b"a"]
+    assert _decode([b": comment only"]) == []
+
+
+def test_long_line_in_small_chunks():
+    payload = b"x" * 100_000
+    data = b"data: " + payload + b"\n\n"
+    assert _decode([data[i:i + 1000] for i in range(0, len(data), 1000)]) == [payload]
+
+
+def test_random_splits_match_reference():
+    rng = random.Random(1)
+    endings = [b"\r\n", b"\r", b"\n"]
+    for _ in range(2000):
+        parts = []
+        for _ in range(rng.randint(1, 6)):
+            for _ in range(rng.randint(1, 3)):
+                field = rng.choice([b"data: ", b"data:", b": c", b"event: x", b"id: 1"])
+                value = bytes(rng.choice(b'ab {}"') for _ in range(rng.randint(0, 5)))
+                parts.append(field + value + rng.choice(endings))
+            parts.append(rng.choice(endings))
+        data = b"".join(parts)
+        if rng.random() < 0.3:
+            data = data.rstrip(b"\r\n")
+
+        chunks, i = [], 0
+        while i < len(data):
+            j = i + rng.randint(0, 6)
+            chunks.append(data[i:j])
+            i = j
+        assert _decode(chunks) == _reference(data), data
+
+
+def test_iter_sse_data():
+    chunks = [STREAM[i:i + 5] for i in range(0, len(STREAM), 5)]
+    assert list(iter_sse_data(iter(chunks))) == EXPECTED
+
+
+def test_aiter_sse_data():
+    async def source():
+        for i in range(0, len(STREAM), 5):
+            yield STREAM[i:i + 5]
+
+    async def collect():
+        return [data async for data in aiter_sse_data(source())]
+
+    assert asyncio.run(collect()) == EXPECTED
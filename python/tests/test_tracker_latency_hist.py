@@ -0,0 +1,88 @@
+"""延遲直方圖與百分位數"""
+
+import math
+import random
+import sqlite3
+
+import pytest
+
+from meei import tracker
+
+
+def _exact(values, p):
+    """nearest-rank 百分位"""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+
+def test_bucket_relative_error():
+    previous = 0
+    for ms in [1, 1.5, 2, 3, 7, 10, 99, 100, 101, 1234, 59_999, 60_000, 3_599_999]:
+        bucket = tracker._hist_bucket(ms)
+        assert bucket >= previous
+        previous = bucket
+        assert abs(tracker._hist_value(bucket) - ms) / ms <= 0.045
+
+
+def test_bucket_edges():
+    assert tracker._hist_bucket(None) == 0
+    assert tracker._hist_bucket(0) == 0
+    assert tracker._hist_value(0) == 0.0
+    # 超過上限的值都在最後一個分桶
+    assert tracker._hist_bucket(10 ** 9) == tracker.HIST_BUCKETS - 1
+
+
+def test_percentiles_match_raw_samples(tracker_db):
+    rng = random.Random(7)
+    latencies = [int(rng.lognormvariate(6.5, 0.6)) + 1 for _ in range(500)]
+    ttfts = [int(rng.lognormvariate(5, 0.4)) + 1 for _ in range(200)]
+    for ms in latencies:
+        tracker.track("openai", "chat", model="gpt-4o", latency_ms=ms)
+    for ms in ttfts:
+        tracker.track("openai", "chat", model="gpt-4o-mini", latency_ms=2000, ttft_ms=ms)
+
+    stats = tracker.get_latency_percentiles("openai", "gpt-4o", percentiles=(50, 95, 99))
+    assert stats["latency"]["count"] == 500
+    for p in (50, 95, 99):
+        assert stats["latency"][f"p{p}"] == pytest.approx(_exact(latencies, p), rel=0.05)
+    assert stats["ttft"] == {"count": 0, "p50": None, "p95": None, "p99": None}
+
+    # model=None 合併該 provider 的所有模型
+    stats = tracker.get_latency_percentiles("openai", percentiles=(50,))
+    assert stats["latency"]["count"] == 700
+    assert stats["ttft"]["count"] == 200
+    assert stats["ttft"]["p50"] == pytest.approx(_exact(ttfts, 50), rel=0.05)
+
+
+def test_only_successful_uncached_requests_are_counted(tracker_db):
+    tracker.track("groq", "chat", model="m", latency_ms=100)
+    tracker.track("groq", "chat", model="m", latency_ms=5000, success=False)
+    tracker.track("groq", "chat", model="m", latency_ms=0, cached=True)
+    tracker.track("groq", "chat", model="m", latency_ms=9000, wasted=True)
+
+    stats = tracker.get_latency_percentiles("groq", "m", percentiles=(99,))
+    assert stats["latency"]["count"] == 1
+    assert stats["latency"]["p99"] == pytest.approx(100, rel=0.05)
+
+
+def test_incremental_histograms_match_rebuild(tracker_db):
+    rng = random.Random(3)
+    for i in range(300):
+        tracker.track(
+            rng.choice(["openai", "groq"]),
+            "chat",
+            model=rng.choice(["a", "b", None]),
+            latency_ms=rng.randint(1, 20_000),
+            ttft_ms=rng.choice([None, rng.randint(1, 2000)]),
+            success=rng.random() > 0.1,
+            cached=rng.random() < 0.1,
+        )
+    assert tracker.flush()
+
+    def histograms():
+        conn = sqlite3.connect(tracker_db)
+        return conn.execute("SELECT * FROM usage_latency_hist ORDER BY 1, 2, 3, 4, 5").fetchall()
+
+    incremental = histograms()
+    tracker.rebuild_rollups()
+    assert histograms() == incremental
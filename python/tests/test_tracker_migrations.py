@@ -0,0 +1,166 @@
+"""tracker 資料表版本與 migration"""
+
+import sqlite3
+from datetime import datetime
+
+from meei import tracker
+
+# 第 1 版之前（沒有 schema_version 表）的 usage 表
+LEGACY_SCHEMA = """
+    CREATE TABLE usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        model TEXT,
+        type TEXT NOT NULL,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        total_tokens INTEGER DEFAULT 0,
+        cost REAL DEFAULT 0,
+        success INTEGER DEFAULT 1,
+        latency_ms INTEGER DEFAULT 0,
+        prompt TEXT,
+        error TEXT
+    )
+"""
+
+LEGACY_ROWS = [
+    # (timestamp, provider, model, input, output, cost, success, latency_ms, prompt)
+    ("2024-03-01T10:15:00.250000", "openai", "gpt-4o-mini", 10, 20, 0.01, 1, 800, "翻譯: hello"),
+    ("2024-03-01T10:45:00", "openai", "gpt-4o-mini", 5, 5, 0.02, 1, 1200, "翻譯: hello"),
+    ("2024-03-01T11:05:00", "openai", "gpt-4o-mini", 7, 0, 0.0, 0, 300, "其他"),
+    ("2024-03-02T09:00:00", "deepseek", None, 3, 4, 0.005, 1, 500, None),
+]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany(
+        """
+        INSERT INTO usage (timestamp, provider, model, type, input_tokens, output_tokens,
+                           total_tokens, cost, success, latency_ms, prompt)
+        VALUES (?, ?, ?, 'chat', ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (ts, provider, model, i, o, i + o, cost, success, latency_ms, prompt)
+            for ts, provider, model, i, o, cost, success, latency_ms, prompt in LEGACY_ROWS
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_new_database_is_latest_version(tracker_db):
+    tracker._ensure_db()
+
+    conn = sqlite3.connect(tracker_db)
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == list(range(1, tracker.SCHEMA_VERSION + 1))
+    assert {"ts", "prompt_hash", "response_model", "wasted"} <= _columns(conn, "usage")
+    assert "timestamp" not in _columns(conn, "usage")
+    # 新資料庫一開始就是 incremental auto_vacuum
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_legacy_database_is_upgraded_in_place(tracker_db):
+    _legacy_db(tracker_db)
+    tracker._ensure_db()
+
+    conn = sqlite3.connect(tracker_db)
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == tracker.SCHEMA_VERSION
+    assert "timestamp" not in _columns(conn, "usage")
+    assert {"cached", "ttft_ms", "retries", "prompt_hash", "response_model"} <= _columns(conn, "usage")
+
+    rows = conn.execute("SELECT ts, provider, cost, prompt, prompt_hash FROM usage ORDER BY id").fetchall()
+    assert len(rows) == len(LEGACY_ROWS)
+    for (ts, provider, cost, prompt, prompt_hash), legacy in zip(rows, LEGACY_ROWS):
+        # 舊的 timestamp 是本地時間
+        assert ts == round(datetime.fromisoformat(legacy[0]).timestamp() * 1000)
+        assert (provider, cost) == (legacy[1], legacy[5])
+        # prompt 搬到 prompts 表，usage 只留參照
+        assert prompt is None
+        assert (prompt_hash is None) == (legacy[8] is None)
+
+    # 相同的 prompt 只存一份
+    assert conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0] == 2
+
+
+def test_legacy_prompts_are_readable_after_upgrade(tracker_db):
+    _legacy_db(tracker_db)
+
+    prompts = [item["prompt"] for item in reversed(tracker.get_recent_requests(10))]
+    assert prompts == [row[8] for row in LEGACY_ROWS]
+
+
+def test_upgrade_backfills_rollups_and_histograms(tracker_db):
+    _legacy_db(tracker_db)
+    tracker._ensure_db()
+
+    conn = sqlite3.connect(tracker_db)
+    hourly = conn.execute(
+        "SELECT provider, model, SUM(requests), SUM(success_count), SUM(cost) FROM usage_hourly "
+        "GROUP BY provider, model ORDER BY provider"
+    ).fetchall()
+    assert [row[:4] for row in hourly] == [("deepseek", "", 1, 1), ("openai", "gpt-4o-mini", 3, 2)]
+    assert abs(hourly[1][4] - 0.03) < 1e-9
+    # 2024-03-01 的 openai 紀錄分在兩個小時
+    assert conn.execute("SELECT COUNT(*) FROM usage_hourly WHERE provider = 'openai'").fetchone()[0] == 2
+
+    # 直方圖只計入成功的請求
+    counts = conn.execute(
+        "SELECT provider, SUM(count) FROM usage_latency_hist WHERE metric = 'latency' GROUP BY provider"
+    ).fetchall()
+    assert dict(counts) == {"deepseek": 1, "openai": 2}
+
+
+def test_migrate_is_idempotent(tracker_db):
+    _legacy_db(tracker_db)
+    tracker._ensure_db()
+
+    conn = tracker._connect(isolation_level=None)
+    before = conn.execute("SELECT COUNT(*), SUM(requests) FROM usage_hourly").fetchone()
+    tracker._migrate(conn)
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == tracker.SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*), SUM(requests) FROM usage_hourly").fetchone() == before
+    conn.close()
+
+
+def test_partially_migrated_database_continues(tracker_db):
+    """停在中間版本的資料庫只套用之後的 migration"""
+    conn = tracker._connect(isolation_level=None)
+    conn.execute("CREATE TABLE schema_version (version INTEGER PRIMARY KEY, applied_at INTEGER NOT NULL)")
+    for version, migration in tracker._MIGRATIONS[:4]:
+        migration(conn)
+        conn.execute("INSERT INTO schema_version VALUES (?, 0)", (version,))
+    conn.execute(
+        "INSERT INTO usage (ts, provider, model, type, prompt) VALUES (?, 'openai', 'm', 'chat', 'hi')",
+        (tracker._now_ms(),),
+    )
+    conn.close()
+
+    tracker._ensure_db()
+
+    conn = sqlite3.connect(tracker_db)
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == tracker.SCHEMA_VERSION
+    row = conn.execute("SELECT prompt, prompt_hash FROM usage").fetchone()
+    assert row == (None, tracker._prompt_hash("hi"))
+    assert [item["prompt"] for item in tracker.get_recent_requests()] == ["hi"]
+
+
+def test_tracked_rows_round_trip(tracker_db):
+    tracker.track("openai", "chat", model="gpt-4o", input_tokens=3, output_tokens=4, prompt="x" * 1000,
+                  response_model="gpt-4o-2024-08-06")
+    assert tracker.flush()
+
+    (item,) = tracker.get_recent_requests()
+    assert item["prompt"] == "x" * tracker.PROMPT_MAX_CHARS
+    assert item["model"] == "gpt-4o"
+    assert item["response_model"] == "gpt-4o-2024-08-06"
+    assert item["total_tokens"] == 7
+    assert tracker.get_dropped_count() == 0
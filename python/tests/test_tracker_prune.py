@@ -0,0 +1,106 @@
+"""tracker 的保留期限、封存與壓縮"""
+
+import gzip
+import json
+import sqlite3
+
+from meei import tracker
+
+DAY = tracker.DAY_MS
+
+
+def _track_at(monkeypatch, ts, **kwargs):
+    with monkeypatch.context() as m:
+        m.setattr(tracker, "_now_ms", lambda: ts)
+        tracker.track("openai", "chat", model="gpt-4o-mini", **kwargs)
+
+
+def _seed(monkeypatch):
+    """40 天前的 3 筆與現在的 2 筆"""
+    now = tracker._now_ms()
+    old = now - 40 * DAY
+    _track_at(monkeypatch, old, input_tokens=1, cost=0.1, prompt="只在舊紀錄")
+    _track_at(monkeypatch, old + 1000, input_tokens=2, cost=0.2, prompt="共用")
+    _track_at(monkeypatch, old + 2000, input_tokens=3, cost=0.3, prompt=None)
+    _track_at(monkeypatch, now, input_tokens=4, cost=0.4, prompt="共用")
+    _track_at(monkeypatch, now, input_tokens=5, cost=0.5, prompt="新的")
+    assert tracker.flush()
+    return old
+
+
+def test_prune_archives_and_deletes_expired_rows(tracker_db, tmp_path, monkeypatch):
+    old = _seed(monkeypatch)
+
+    result = tracker.prune_usage(days=30, archive_dir=tmp_path / "out")
+
+    assert result["deleted"] == 3
+    assert [item["input_tokens"] for item in tracker.get_recent_requests()] == [5, 4]
+
+    (path,) = result["files"]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [item["input_tokens"] for item in archived] == [1, 2, 3]
+    # 封存檔中是 prompt 的內容，不是雜湊
+    assert [item["prompt"] for item in archived] == ["只在舊紀錄", "共用", None]
+    assert archived[0]["ts"] == old
+    assert path.endswith(f"usage-{archived[0]['timestamp'][:7]}.jsonl.gz")
+
+
+def test_prune_keeps_rollups_and_collects_unreferenced_prompts(tracker_db, tmp_path, monkeypatch):
+    _seed(monkeypatch)
+    before = tracker.get_usage_summary(days=60)
+
+    result = tracker.prune_usage(days=30, archive=False)
+
+    assert result["files"] == []
+    assert result["prompts"] == 1
+    conn = sqlite3.connect(tracker_db)
+    rows = conn.execute("SELECT content, compressed FROM prompts")
+    prompts = {tracker._decode_prompt(content, compressed) for content, compressed in rows}
+    assert prompts == {"共用", "新的"}
+
+    # 彙總不受影響
+    after = tracker.get_usage_summary(days=60)
+    assert after["total_requests"] == before["total_requests"] == 5
+    assert abs(after["total_cost"] - 1.5) < 1e-9
+
+
+def test_prune_is_idempotent(tracker_db, tmp_path, monkeypatch):
+    _seed(monkeypatch)
+
+    tracker.prune_usage(days=30, archive_dir=tmp_path)
+    again = tracker.prune_usage(days=30, archive_dir=tmp_path)
+
+    assert again["deleted"] == 0
+    assert again["prompts"] == 0
+    assert again["files"] == []
+
+
+def test_prune_in_batches(tracker_db, tmp_path, monkeypatch):
+    old = tracker._now_ms() - 40 * DAY
+    for i in range(25):
+        _track_at(monkeypatch, old + i, input_tokens=i)
+    assert tracker.flush()
+    monkeypatch.setattr(tracker, "PRUNE_BATCH", 10)
+
+    result = tracker.prune_usage(days=30, archive_dir=tmp_path)
+
+    assert result["deleted"] == 25
+    with gzip.open(result["files"][0], "rt", encoding="utf-8") as f:
+        # 每批一個 gzip member，依序串接
+        assert [json.loads(line)["input_tokens"] for line in f] == list(range(25))
+
+
+def test_prune_frees_pages(tracker_db, tmp_path, monkeypatch):
+    old = tracker._now_ms() - 40 * DAY
+    for i in range(2000):
+        _track_at(monkeypatch, old + i, prompt=f"prompt {i} " + "x" * 300)
+    assert tracker.flush()
+
+    result = tracker.prune_usage(days=30, archive=False)
+
+    assert result["deleted"] == 2000
+    assert result["prompts"] == 2000
+    assert result["freed_pages"] > 0
+    conn = sqlite3.connect(tracker_db)
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
@@ -0,0 +1,102 @@
+"""每小時彙總與原始紀錄的一致性"""
+
+import sqlite3
+
+import pytest
+
+from meei import tracker
+
+HOUR = tracker.HOUR_MS
+
+
+def _track_at(monkeypatch, ts, provider="openai", **kwargs):
+    with monkeypatch.context() as m:
+        m.setattr(tracker, "_now_ms", lambda: ts)
+        tracker.track(provider, "chat", **kwargs)
+
+
+def _seed(monkeypatch):
+    """跨三個小時、兩個 provider，含失敗、快取、串流、重試與被丟棄的請求"""
+    base = (tracker._now_ms() // HOUR - 2) * HOUR
+    rows = [
+        (base + 10, dict(model="gpt-4o", input_tokens=10, output_tokens=20, cost=0.01, latency_ms=900)),
+        (base + 20, dict(model="gpt-4o", input_tokens=5, output_tokens=50, cost=0.02, latency_ms=1500,
+                         ttft_ms=300, retries=2, retry_wait_ms=700)),
+        (base + 30, dict(model="gpt-4o", success=False, latency_ms=100, error="boom")),
+        (base + HOUR, dict(model="gpt-4o", input_tokens=10, output_tokens=20, cached=True)),
+        (base + HOUR + 5, dict(model="gpt-4o", input_tokens=8, cost=0.03, latency_ms=400, wasted=True)),
+        (base + 2 * HOUR, dict(provider="deepseek", input_tokens=1, output_tokens=2, cost=0.001,
+                                latency_ms=50)),
+    ]
+    for ts, kwargs in rows:
+        _track_at(monkeypatch, ts, **kwargs)
+    assert tracker.flush()
+
+
+def _hourly(db):
+    conn = sqlite3.connect(db)
+    return conn.execute("SELECT * FROM usage_hourly ORDER BY hour, provider, model, type").fetchall()
+
+
+def _assert_rows_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a == pytest.approx(e)
+
+
+def test_incremental_rollups_match_rebuild(tracker_db, monkeypatch):
+    _seed(monkeypatch)
+    incremental = _hourly(tracker_db)
+
+    assert tracker.rebuild_rollups() == len(incremental)
+    _assert_rows_equal(_hourly(tracker_db), incremental)
+
+
+def test_rollup_columns(tracker_db, monkeypatch):
+    _seed(monkeypatch)
+    conn = sqlite3.connect(tracker_db)
+    conn.row_factory = sqlite3.Row
+    first, second = conn.execute(
+        "SELECT * FROM usage_hourly WHERE provider = 'openai' ORDER BY hour"
+    ).fetchall()
+
+    assert (first["requests"], first["success_count"]) == (3, 2)
+    assert (first["input_tokens"], first["output_tokens"], first["total_tokens"]) == (15, 70, 85)
+    assert first["latency_sum"] == 2500 and first["latency_count"] == 3
+    assert (first["ttft_sum"], first["ttft_count"]) == (300, 1)
+    assert (first["retries"], first["retry_wait_ms"]) == (2, 700)
+
+    # 快取命中不計入延遲；被丟棄的請求另外記錄花費
+    assert (second["cache_hits"], second["latency_count"]) == (1, 1)
+    assert second["wasted"] == 1
+    assert second["wasted_cost"] == pytest.approx(0.03)
+
+
+def test_summary_reads_rollups(tracker_db, monkeypatch):
+    _seed(monkeypatch)
+
+    summary = tracker.get_usage_summary(days=1)
+    assert summary["total_requests"] == 6
+    assert summary["total_cost"] == pytest.approx(0.061)
+    (openai,) = [row for row in summary["providers"] if row["provider"] == "openai"]
+    assert openai["avg_latency"] == pytest.approx((900 + 1500 + 100 + 400) / 4)
+    assert openai["wasted_requests"] == 1
+
+    daily = tracker.get_daily_usage(days=1)
+    assert sum(day["requests"] for day in daily) == 6
+    assert sum(day["tokens"] for day in daily) == 126
+
+
+def test_rebuild_restores_deleted_rollups(tracker_db, monkeypatch):
+    _seed(monkeypatch)
+    expected = _hourly(tracker_db)
+
+    conn = sqlite3.connect(tracker_db)
+    conn.execute("DELETE FROM usage_hourly")
+    conn.execute("UPDATE usage_latency_hist SET count = count + 100")
+    conn.commit()
+
+    tracker.rebuild_rollups(days=1)
+    _assert_rows_equal(_hourly(tracker_db), expected)
+    total = conn.execute("SELECT SUM(count) FROM usage_latency_hist WHERE metric = 'latency'").fetchone()[0]
+    assert total == 3